@@ -1,61 +1,534 @@
 # app/backup_manager.py
+"""
+Backup del database: copie complete e incrementali organizzate in catene.
+
+Una catena parte da un backup completo (.bak / .bak.gz, un normale file SQLite) ed
+è seguita da backup incrementali (.incr.gz) che contengono solo le pagine del database
+cambiate rispetto al backup precedente. Per confrontare le pagine senza rileggere i
+backup, l'impronta (hash) di ogni pagina dell'ultimo backup è salvata in CHAIN_STATE_FILE.
+Un nuovo backup completo viene creato periodicamente, o quando la catena è troppo lunga.
+La conservazione dei backup si basa su età e spazio occupato, eliminando catene intere.
+"""
 import os
+import gzip
+import hashlib
+import json
 import shutil
+import sqlite3
+import struct
 import logging
-from datetime import datetime
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import database
 
-DB_FILE = "verifiche.db"
 BACKUP_DIR = "backups"
-BACKUP_RETENTION_COUNT = 10  # Numero di backup da conservare
+FULL_BACKUP_EXTENSIONS = (".bak", ".bak.gz")
+INCREMENTAL_EXTENSION = ".incr.gz"
+BACKUP_EXTENSIONS = FULL_BACKUP_EXTENSIONS + (INCREMENTAL_EXTENSION,)
+CHAIN_STATE_FILE = "chain_state.dat"
+
+# Conservazione: le catene più vecchie di BACKUP_RETENTION_DAYS vengono eliminate, e anche
+# quelle più recenti se i backup superano BACKUP_MAX_TOTAL_MB. L'ultima catena resta sempre.
+BACKUP_RETENTION_DAYS = 90
+BACKUP_MAX_TOTAL_MB = 2048
+# Nuovo backup completo dopo questi giorni, dopo questo numero di incrementali, o se
+# è cambiata più di questa frazione delle pagine
+FULL_BACKUP_INTERVAL_DAYS = 7
+MAX_INCREMENTAL_BACKUPS = 50
+FULL_BACKUP_CHANGED_RATIO = 0.5
+
+BACKUP_FULL = "full"
+BACKUP_INCREMENTAL = "incremental"
+BACKUP_AUTO = "auto"
+
+# Pagine copiate per ogni passo del backup online: tra un passo e l'altro il database
+# resta libero per le scritture degli altri thread (4096 pagine = 16 MB con pagine da 4 KB).
+BACKUP_PAGES_PER_STEP = 4096
+BACKUP_STEP_SLEEP_SECONDS = 0.005
+GZIP_MAGIC = b'\x1f\x8b'
+INCREMENTAL_FORMAT = "verifiche-incremental-1"
+PAGE_DIGEST_SIZE = 16
+_PAGE_NUMBER = struct.Struct(">I")
+
+
+class BackupCancelled(Exception):
+    """Sollevata dalla callback di avanzamento per interrompere un backup in corso."""
+
+
+class BackupChainError(Exception):
+    """Un backup incrementale non può essere ricostruito (anello mancante o dati non coerenti)."""
+
+
+@dataclass
+class BackupResult:
+    path: str
+    size_bytes: int          # dimensione del file prodotto (compresso, se richiesto)
+    database_bytes: int      # dimensione del database copiato
+    copy_seconds: float
+    verify_seconds: float = 0.0
+    compress_seconds: float = 0.0   # confronto delle pagine, compressione e scrittura del file
+    kind: str = BACKUP_FULL
+    changed_pages: int = 0   # pagine salvate (tutte, per un backup completo)
+
+    @property
+    def total_seconds(self):
+        return self.copy_seconds + self.verify_seconds + self.compress_seconds
+
+
+def verify_database_file(path):
+    """Controlla l'integrità di un file di database; restituisce l'elenco dei problemi (vuoto se integro)."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        problems = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as e:
+        problems = [str(e)]   # ad es. "file is not a database"
+    finally:
+        conn.close()
+    return [] if problems == ["ok"] else problems
+
+
+def _online_copy(target_path, progress_callback=None):
+    """
+    Copia il database con l'API di backup di SQLite, a passi di BACKUP_PAGES_PER_STEP pagine.
+    La connessione di origine tiene aperta una transazione di lettura per tutta la copia:
+    con il journal WAL gli altri thread continuano a leggere e scrivere, mentre la copia
+    resta un'istantanea coerente (senza, ogni scrittura farebbe ripartire il backup da capo).
+    `progress_callback(copiate, totali)` riceve le pagine; può sollevare BackupCancelled
+    per interrompere la copia.
+    """
+    source = sqlite3.connect(database.DB_FILE, timeout=database.BUSY_TIMEOUT_SECONDS, isolation_level=None)
+    target = sqlite3.connect(target_path)
+    try:
+        def on_progress(status, remaining, total):
+            if progress_callback is not None:
+                progress_callback(total - remaining, total)
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()  # Avvia l'istantanea di lettura
+        try:
+            source.backup(target, pages=BACKUP_PAGES_PER_STEP, progress=on_progress, sleep=BACKUP_STEP_SLEEP_SECONDS)
+        finally:
+            source.execute("COMMIT")
+        # La copia eredita la modalità WAL: la riportiamo a un file unico, autosufficiente
+        target.execute("PRAGMA journal_mode = DELETE")
+        # Le pagine del WAL sono già nella copia: un checkpoint passivo lo riporta nel
+        # file principale senza attendere lettori e scrittori
+        source.execute("PRAGMA wal_checkpoint(PASSIVE)")
+    finally:
+        target.close()
+        source.close()
+
+
+def _gzip_file(source_path, target_path):
+    with open(source_path, 'rb') as src, gzip.open(target_path, 'wb', compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+
+
+def _is_gzip(path):
+    with open(path, 'rb') as f:
+        return f.read(2) == GZIP_MAGIC
+
+
+def _page_size(path):
+    """Dimensione delle pagine di un file SQLite, letta dall'intestazione (offset 16)."""
+    with open(path, 'rb') as f:
+        header = f.read(100)
+    size = int.from_bytes(header[16:18], 'big')
+    return 65536 if size == 1 else size
+
+
+def _page_digests(path, page_size):
+    """Impronte delle pagine del file, concatenate (PAGE_DIGEST_SIZE byte ciascuna)."""
+    digests = bytearray()
+    with open(path, 'rb') as f:
+        while True:
+            page = f.read(page_size)
+            if not page:
+                break
+            digests += hashlib.blake2b(page, digest_size=PAGE_DIGEST_SIZE).digest()
+    return bytes(digests)
+
+
+def _state_digest(page_digests):
+    """Impronta dell'intero database, ricavata da quelle delle pagine."""
+    return hashlib.blake2b(page_digests, digest_size=32).hexdigest()
+
+
+# --- Stato della catena (impronte delle pagine dell'ultimo backup) ---
+
+def _load_chain_state():
+    path = os.path.join(BACKUP_DIR, CHAIN_STATE_FILE)
+    try:
+        with open(path, 'rb') as f:
+            state = json.loads(f.readline())
+            state['digests'] = f.read()
+    except (OSError, ValueError):
+        return None
+    if len(state['digests']) != state.get('page_count', -1) * PAGE_DIGEST_SIZE:
+        return None
+    return state
+
+
+def _save_chain_state(state, digests):
+    path = os.path.join(BACKUP_DIR, CHAIN_STATE_FILE)
+    temp_path = path + ".tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(json.dumps(state).encode('utf-8') + b"\n")
+        f.write(digests)
+    os.replace(temp_path, path)
+
+
+def _choose_backup_kind(mode, state, page_size, digests):
+    """Decide se il nuovo backup sarà completo o incrementale; restituisce (tipo, pagine cambiate)."""
+    page_count = len(digests) // PAGE_DIGEST_SIZE
+    all_pages = list(range(1, page_count + 1))
+    if mode == BACKUP_FULL or state is None or state['page_size'] != page_size:
+        return BACKUP_FULL, all_pages
+    if not os.path.exists(os.path.join(BACKUP_DIR, state['backup'])) or not os.path.exists(os.path.join(BACKUP_DIR, state['base'])):
+        return BACKUP_FULL, all_pages
+    old = state['digests']
+    changed = [n for n in all_pages
+               if digests[(n - 1) * PAGE_DIGEST_SIZE:n * PAGE_DIGEST_SIZE] != old[(n - 1) * PAGE_DIGEST_SIZE:n * PAGE_DIGEST_SIZE]]
+    if mode == BACKUP_INCREMENTAL:
+        return BACKUP_INCREMENTAL, changed
+    base_age = datetime.now() - datetime.fromisoformat(state['base_created'])
+    if (base_age > timedelta(days=FULL_BACKUP_INTERVAL_DAYS) or state['chain_length'] >= MAX_INCREMENTAL_BACKUPS
+            or len(changed) > FULL_BACKUP_CHANGED_RATIO * page_count):
+        return BACKUP_FULL, all_pages
+    return BACKUP_INCREMENTAL, changed
+
+
+def _unique_backup_path_with_prefix(prefix, timestamp, extension):
+    path = os.path.join(BACKUP_DIR, f"{prefix}_{timestamp}{extension}")
+    counter = 1
+    while os.path.exists(path):
+        counter += 1
+        path = os.path.join(BACKUP_DIR, f"{prefix}_{timestamp}_{counter}{extension}")
+    return path
+
+
+def _unique_backup_path(timestamp, extension):
+    return _unique_backup_path_with_prefix("verifiche_backup", timestamp, extension)
 
-def create_backup():
-    """Crea un backup del file del database con un timestamp."""
-    if not os.path.exists(DB_FILE):
-        logging.warning(f"File database '{DB_FILE}' non trovato. Backup saltato.")
-        return
 
+def _write_incremental(copy_path, target_path, header, changed_pages):
+    page_size = header['page_size']
+    with open(copy_path, 'rb') as src, gzip.open(target_path, 'wb', compresslevel=6) as dst:
+        dst.write(json.dumps(header).encode('utf-8') + b"\n")
+        for page_number in changed_pages:
+            src.seek((page_number - 1) * page_size)
+            dst.write(_PAGE_NUMBER.pack(page_number))
+            dst.write(src.read(page_size))
+
+
+def create_backup(compress=False, verify=True, progress_callback=None, mode=BACKUP_AUTO):
+    """
+    Crea un backup del database con un timestamp, senza bloccare chi lo sta usando.
+
+    La copia avviene con l'API di backup di SQLite (coerente anche con scritture in corso)
+    e viene verificata con PRAGMA integrity_check. Con mode=BACKUP_AUTO viene salvato un
+    backup incrementale (solo le pagine cambiate) se la catena corrente lo permette,
+    altrimenti un backup completo, compresso con gzip (.bak.gz) se richiesto.
+    Il file finale compare solo a backup completato e verificato. Pensata per essere
+    eseguita in un thread in background (vedi BackupWorker).
+    Restituisce un BackupResult con i tempi delle varie fasi, o None in caso di errore.
+    """
+    if not os.path.exists(database.DB_FILE):
+        logging.warning(f"File database '{database.DB_FILE}' non trovato. Backup saltato.")
+        return None
+
+    temp_paths = []
     try:
         # Crea la cartella dei backup se non esiste
         os.makedirs(BACKUP_DIR, exist_ok=True)
 
-        # Definisci il nome del file di backup
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        backup_filename = f"verifiche_backup_{timestamp}.db.bak"
-        backup_filepath = os.path.join(BACKUP_DIR, backup_filename)
+        now = datetime.now()
+        timestamp = now.strftime("%Y-%m-%d_%H-%M-%S")
+        copy_path = os.path.join(BACKUP_DIR, f"verifiche_backup_{timestamp}.db.tmp")
+        temp_paths.append(copy_path)
+
+        start = time.perf_counter()
+        _online_copy(copy_path, progress_callback)
+        result = BackupResult(None, 0, os.path.getsize(copy_path), time.perf_counter() - start)
 
-        # Copia il file del database nella cartella dei backup
-        shutil.copy2(DB_FILE, backup_filepath)
-        logging.info(f"Backup del database creato con successo: {backup_filepath}")
+        if verify:
+            start = time.perf_counter()
+            problems = verify_database_file(copy_path)
+            result.verify_seconds = time.perf_counter() - start
+            if problems:
+                logging.error(f"Backup non valido, scartato: {problems[:5]}")
+                return None
+
+        start = time.perf_counter()
+        page_size = _page_size(copy_path)
+        digests = _page_digests(copy_path, page_size)
+        state = _load_chain_state()
+        result.kind, changed_pages = _choose_backup_kind(mode, state, page_size, digests)
+        result.changed_pages = len(changed_pages)
+
+        if result.kind == BACKUP_FULL:
+            backup_filepath = _unique_backup_path(timestamp, ".db.bak.gz" if compress else ".db.bak")
+            final_source = copy_path
+            if compress:
+                final_source = copy_path + ".gz"
+                temp_paths.append(final_source)
+                _gzip_file(copy_path, final_source)
+            new_state = {'base': os.path.basename(backup_filepath), 'base_created': now.isoformat(), 'chain_length': 0}
+        else:
+            backup_filepath = _unique_backup_path(timestamp, INCREMENTAL_EXTENSION)
+            final_source = backup_filepath + ".tmp"
+            temp_paths.append(final_source)
+            header = {
+                'format': INCREMENTAL_FORMAT, 'created': now.isoformat(),
+                'base': state['base'], 'previous': state['backup'],
+                'page_size': page_size, 'page_count': len(digests) // PAGE_DIGEST_SIZE,
+                'changed_pages': len(changed_pages), 'digest': _state_digest(digests),
+            }
+            _write_incremental(copy_path, final_source, header, changed_pages)
+            new_state = {'base': state['base'], 'base_created': state['base_created'], 'chain_length': state['chain_length'] + 1}
+        result.compress_seconds = time.perf_counter() - start
+
+        os.replace(final_source, backup_filepath)
+        new_state.update(backup=os.path.basename(backup_filepath), page_size=page_size, page_count=len(digests) // PAGE_DIGEST_SIZE)
+        _save_chain_state(new_state, digests)
+        result.path = backup_filepath
+        result.size_bytes = os.path.getsize(backup_filepath)
+        logging.info(
+            f"Backup {'incrementale' if result.kind == BACKUP_INCREMENTAL else 'completo'} del database creato con successo: "
+            f"{backup_filepath} ({result.database_bytes / 1048576:.1f} MB copiati in {result.copy_seconds:.2f} s, "
+            f"verifica {result.verify_seconds:.2f} s, {result.changed_pages} pagine salvate in {result.compress_seconds:.2f} s, "
+            f"file di {result.size_bytes / 1048576:.1f} MB)"
+        )
 
         # Pulisci i vecchi backup
         rotate_backups()
+        return result
 
-    except Exception as e:
+    except BackupCancelled:
+        logging.warning("Backup del database annullato.")
+        return None
+    except Exception:
         logging.error("Errore durante la creazione del backup del database.", exc_info=True)
+        return None
+    finally:
+        for path in temp_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+# --- Lettura delle catene ---
+
+def _read_incremental_header(path):
+    with gzip.open(path, 'rb') as f:
+        header = json.loads(f.readline())
+    if header.get('format') != INCREMENTAL_FORMAT:
+        raise BackupChainError(f"Formato di backup incrementale non riconosciuto: {path}")
+    return header
+
+
+def _iter_incremental_pages(path, page_size):
+    with gzip.open(path, 'rb') as f:
+        f.readline()
+        while True:
+            number = f.read(_PAGE_NUMBER.size)
+            if not number:
+                break
+            page = f.read(page_size)
+            if len(number) != _PAGE_NUMBER.size or len(page) != page_size:
+                raise BackupChainError(f"Backup incrementale troncato: {path}")
+            yield _PAGE_NUMBER.unpack(number)[0], page
+
+
+def backup_chain(backup_path):
+    """
+    Restituisce i file da applicare, in ordine, per ricostruire il backup indicato:
+    il backup completo di partenza seguito dagli incrementali fino a quello richiesto.
+    """
+    chain = [backup_path]
+    while chain[0].endswith(INCREMENTAL_EXTENSION):
+        header = _read_incremental_header(chain[0])
+        previous = os.path.join(os.path.dirname(chain[0]), header['previous'])
+        if not os.path.exists(previous):
+            raise BackupChainError(f"Manca il backup {header['previous']}, necessario per ricostruire {os.path.basename(backup_path)}.")
+        chain.insert(0, previous)
+    return chain
+
+
+def materialize_backup(backup_path, output_path):
+    """
+    Ricostruisce in output_path il database salvato in un backup di qualsiasi tipo:
+    copia (o decomprime) il backup completo e riapplica in ordine le pagine degli incrementali.
+    Per gli incrementali controlla che il risultato corrisponda all'impronta registrata.
+    """
+    chain = backup_chain(backup_path)
+    if _is_gzip(chain[0]):
+        with gzip.open(chain[0], 'rb') as src, open(output_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+    else:
+        shutil.copyfile(chain[0], output_path)
+
+    header = None
+    for incremental in chain[1:]:
+        header = _read_incremental_header(incremental)
+        page_size = header['page_size']
+        with open(output_path, 'r+b') as f:
+            for page_number, page in _iter_incremental_pages(incremental, page_size):
+                f.seek((page_number - 1) * page_size)
+                f.write(page)
+            f.truncate(header['page_count'] * page_size)
+    if header is not None and _state_digest(_page_digests(output_path, header['page_size'])) != header['digest']:
+        raise BackupChainError(f"Il database ricostruito da {os.path.basename(backup_path)} non corrisponde all'originale.")
+
+
+# --- Conservazione ---
+
+def _list_chains():
+    """Raggruppa i backup della cartella in catene: {backup completo: [file della catena]}."""
+    chains = {}
+    orphans = []
+    for name in os.listdir(BACKUP_DIR):
+        path = os.path.join(BACKUP_DIR, name)
+        if name.endswith(FULL_BACKUP_EXTENSIONS):
+            chains.setdefault(name, []).append(path)
+        elif name.endswith(INCREMENTAL_EXTENSION):
+            try:
+                chains.setdefault(_read_incremental_header(path)['base'], []).append(path)
+            except (OSError, ValueError, BackupChainError):
+                orphans.append(path)
+    for base, paths in list(chains.items()):
+        if not os.path.exists(os.path.join(BACKUP_DIR, base)):
+            orphans.extend(paths)
+            del chains[base]
+    return chains, orphans
+
 
 def rotate_backups():
-    """Elimina i backup più vecchi, conservando solo il numero definito in BACKUP_RETENTION_COUNT."""
+    """
+    Elimina i backup più vecchi di BACKUP_RETENTION_DAYS e, se lo spazio occupato supera
+    BACKUP_MAX_TOTAL_MB, anche le catene meno recenti. Le catene vengono eliminate per
+    intero (un incrementale non serve senza il completo da cui parte); l'ultima resta sempre.
+    """
     try:
-        backups = sorted(
-            [os.path.join(BACKUP_DIR, f) for f in os.listdir(BACKUP_DIR) if f.endswith(".bak")],
-            key=os.path.getmtime
-        )
-        
-        if len(backups) > BACKUP_RETENTION_COUNT:
-            num_to_delete = len(backups) - BACKUP_RETENTION_COUNT
-            logging.info(f"Trovati {len(backups)} backup. Rimuovendo i {num_to_delete} più vecchi.")
-            for f in backups[:num_to_delete]:
-                os.remove(f)
-                logging.info(f"Vecchio backup rimosso: {f}")
-    except Exception as e:
+        chains, orphans = _list_chains()
+        for path in orphans:
+            os.remove(path)
+            logging.info(f"Backup incrementale senza backup completo di partenza rimosso: {path}")
+
+        # Dalla catena più vecchia alla più recente, in base all'ultimo file di ciascuna
+        ordered = sorted(chains.values(), key=lambda paths: max(os.path.getmtime(p) for p in paths))
+        cutoff = time.time() - BACKUP_RETENTION_DAYS * 86400
+        total_bytes = sum(os.path.getsize(p) for paths in ordered for p in paths)
+        while len(ordered) > 1:
+            oldest = ordered[0]
+            expired = max(os.path.getmtime(p) for p in oldest) < cutoff
+            if not expired and total_bytes <= BACKUP_MAX_TOTAL_MB * 1048576:
+                break
+            logging.info(f"Rimozione della catena di backup {os.path.basename(min(oldest, key=os.path.getmtime))} "
+                         f"({len(oldest)} file, {'scaduta' if expired else 'spazio massimo superato'}).")
+            for path in oldest:
+                total_bytes -= os.path.getsize(path)
+                os.remove(path)
+            ordered.pop(0)
+    except Exception:
         logging.error("Errore durante la rotazione dei vecchi backup.", exc_info=True)
 
+
+@dataclass
+class RestoreResult:
+    ok: bool
+    error: str = ""
+    schema_version: int = 0
+    snapshot_path: str = None       # copia del database sostituito
+    prepare_seconds: float = 0.0    # ricostruzione del backup nel file temporaneo
+    verify_seconds: float = 0.0
+    snapshot_seconds: float = 0.0
+    swap_seconds: float = 0.0
+
+    @property
+    def total_seconds(self):
+        return self.prepare_seconds + self.verify_seconds + self.snapshot_seconds + self.swap_seconds
+
+
+def _backup_schema_version(path):
+    """Versione dello schema registrata nel file di database, o None se manca schema_version."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.DatabaseError:
+        return None
+    finally:
+        conn.close()
+    return row[0] or 0
+
+
 def restore_from_backup(backup_path):
-    """Ripristina il database da un file di backup, sovrascrivendo quello corrente."""
+    """
+    Ripristina il database da un file di backup (completo, compresso o incrementale).
+
+    1. Il backup viene ricostruito in un file temporaneo accanto al database, leggendo e
+       scrivendo a blocchi (nessun file viene caricato interamente in memoria).
+    2. Il file viene verificato: PRAGMA integrity_check e versione dello schema non più
+       recente dell'ultima migrazione disponibile (quelle mancanti vengono applicate
+       al successivo avvio).
+    3. Il database corrente viene copiato in backups/ (verifiche_prerestore_<data>.db.bak).
+    4. Il file temporaneo sostituisce il database con os.replace, in modo atomico.
+    Se un passo fallisce il database corrente non viene toccato.
+    Restituisce un RestoreResult con l'esito, il motivo di un eventuale errore e i tempi.
+    """
+    result = RestoreResult(ok=False)
+    temp_path = database.DB_FILE + ".restore.tmp"
     try:
-        shutil.copy2(backup_path, DB_FILE)
-        logging.warning(f"Database ripristinato con successo dal file: {backup_path}")
-        return True
+        start = time.perf_counter()
+        materialize_backup(backup_path, temp_path)
+        result.prepare_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        problems = verify_database_file(temp_path)
+        if problems:
+            result.error = f"Il backup non supera il controllo di integrità: {'; '.join(problems[:3])}"
+            return result
+        result.schema_version = _backup_schema_version(temp_path)
+        latest_version = database.latest_schema_version()
+        if result.schema_version is None:
+            result.error = "Il file non è un database dell'applicazione (manca la tabella schema_version)."
+            return result
+        if result.schema_version > latest_version:
+            result.error = (f"Il backup ha lo schema versione {result.schema_version}, più recente di quello supportato "
+                            f"da questa versione del programma ({latest_version}).")
+            return result
+        result.verify_seconds = time.perf_counter() - start
+
+        if os.path.exists(database.DB_FILE):
+            start = time.perf_counter()
+            os.makedirs(BACKUP_DIR, exist_ok=True)
+            snapshot_path = _unique_backup_path_with_prefix("verifiche_prerestore", datetime.now().strftime("%Y-%m-%d_%H-%M-%S"), ".db.bak")
+            _online_copy(snapshot_path)
+            result.snapshot_path = snapshot_path
+            result.snapshot_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        # Chiude le connessioni: alla chiusura dell'ultima SQLite riporta il WAL nel file e lo elimina.
+        # Eventuali WAL/SHM rimasti appartengono al database sostituito e vanno rimossi prima dello scambio.
+        database.close_all_connections()
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(database.DB_FILE + suffix):
+                os.remove(database.DB_FILE + suffix)
+        os.replace(temp_path, database.DB_FILE)
+        result.swap_seconds = time.perf_counter() - start
+        result.ok = True
+        logging.warning(
+            f"Database ripristinato con successo dal file: {backup_path} (schema versione {result.schema_version}; "
+            f"preparazione {result.prepare_seconds:.2f} s, verifica {result.verify_seconds:.2f} s, "
+            f"copia del database sostituito {result.snapshot_seconds:.2f} s in {result.snapshot_path}, "
+            f"sostituzione {result.swap_seconds:.2f} s)"
+        )
+        return result
     except Exception as e:
         logging.critical(f"Errore critico durante il ripristino dal backup: {backup_path}", exc_info=True)
-        return False
\ No newline at end of file
+        result.error = str(e)
+        return result
+    finally:
+        if not result.ok and result.error:
+            logging.error(f"Ripristino da {backup_path} non eseguito: {result.error}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
@@ -0,0 +1,151 @@
+# app/batch_jobs.py
+"""
+Job (app.jobs) per le operazioni lunghe dell'applicazione, indipendenti da Qt.
+
+Ogni job riusa la logica già esistente (app.device_import, app.stm_archive,
+app.backup_manager, app.report_batch) e solleva JobError con un messaggio per
+l'utente. Le importazioni condividono la chiave esclusiva DATABASE_WRITE: scrivono
+in un'unica lunga transazione e due insieme si bloccherebbero a vicenda, mentre
+esportazioni e report (sola lettura) possono girare in parallelo a un'importazione.
+"""
+import logging
+from concurrent.futures.process import BrokenProcessPool
+
+import database
+from app import backup_manager
+from app.jobs import PRIORITY_LOW, Job, JobError
+
+DATABASE_WRITE = "database-write"
+BACKUP = "backup"
+
+
+class DeviceImportJob(Job):
+    """
+    Importa i dispositivi di un file Excel/CSV; restituisce un DeviceImportResult (con
+    `cancelled` se interrotta: i dispositivi già salvati restano).
+    """
+    name = "Importazione dispositivi"
+    exclusive_key = DATABASE_WRITE
+
+    def __init__(self, filename, mapping, customer_id):
+        self.filename = filename
+        self.mapping = mapping
+        self.customer_id = customer_id
+
+    def run(self, context):
+        from app.device_import import DeviceImportError, import_devices
+        try:
+            result = import_devices(self.filename, self.mapping, self.customer_id,
+                                    progress_callback=context.report_progress, is_cancelled=context.is_cancelled)
+        except DeviceImportError as e:
+            raise JobError(str(e)) from e
+        return result
+
+
+class StmImportJob(Job):
+    """Importa un archivio .stm; restituisce le StmImportStats (con `cancelled` se interrotta)."""
+    name = "Importazione archivio"
+    exclusive_key = DATABASE_WRITE
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+
+    def run(self, context):
+        from app.stm_archive import STM_IMPORT_BATCH_SIZE, StmArchiveImporter, StmArchiveReader, StmFormatError
+
+        def on_read_progress(bytes_read, total_bytes):
+            context.report_progress(bytes_read / total_bytes * 100 if total_bytes else 100)
+
+        logging.info(f"Avvio importazione dall'archivio: {self.filepath}")
+        # Il file viene letto in streaming e importato a blocchi, in un'unica transazione:
+        # in caso di errore nessuna modifica viene salvata, con l'annullamento restano i blocchi già scritti.
+        try:
+            reader = StmArchiveReader(self.filepath, progress_callback=on_read_progress)
+            return StmArchiveImporter().import_packages(reader, batch_size=STM_IMPORT_BATCH_SIZE,
+                                                        is_cancelled=context.is_cancelled)
+        except (OSError, StmFormatError) as e:
+            logging.error(f"Impossibile leggere l'archivio {self.filepath}.", exc_info=True)
+            raise JobError(f"Impossibile leggere o parsare il file .stm: {e}") from e
+        except Exception as e:
+            logging.error("Errore durante l'importazione dall'archivio. Nessuna modifica salvata.", exc_info=True)
+            raise JobError(f"Errore durante l'importazione dall'archivio. Nessuna modifica è stata salvata.\n\n{e}") from e
+
+
+class StmExportJob(Job):
+    """Esporta le verifiche in un archivio .stm; restituisce il numero di verifiche scritte."""
+    name = "Esportazione verifiche"
+
+    def __init__(self, date_from, output_path, date_to=None, customer_id=None, compress=False):
+        self.date_from = date_from
+        self.date_to = date_to or date_from
+        self.output_path = output_path
+        self.customer_id = customer_id
+        self.compress = compress
+
+    def run(self, context):
+        from app.stm_archive import export_verifications
+        try:
+            return export_verifications(self.date_from, self.output_path, self.date_to, self.customer_id, compress=self.compress)
+        except Exception as e:
+            logging.error("Errore durante l'esportazione delle verifiche.", exc_info=True)
+            raise JobError(f"Si è verificato un errore imprevisto durante l'esportazione:\n{e}") from e
+
+
+class BackupJob(Job):
+    """Backup online del database; restituisce il BackupResult, o None se il backup non è riuscito."""
+    name = "Backup database"
+    priority = PRIORITY_LOW
+    exclusive_key = BACKUP
+
+    def __init__(self, compress=False, verify=True):
+        self.compress = compress
+        self.verify = verify
+
+    def run(self, context):
+        def on_progress(copied_pages, total_pages):
+            if context.is_cancelled():
+                raise backup_manager.BackupCancelled()
+            context.report_progress(copied_pages / total_pages * 100 if total_pages else 100)
+
+        result = backup_manager.create_backup(compress=self.compress, verify=self.verify, progress_callback=on_progress)
+        if result is None:
+            context.check_cancelled()
+        return result
+
+
+class ReportBatchJob(Job):
+    """
+    Genera i report PDF di una selezione di verifiche sul pool di processi condiviso;
+    restituisce le ReportBatchStats (con `cancelled` se interrotta: i PDF già prodotti restano).
+    """
+    name = "Generazione report"
+    priority = PRIORITY_LOW
+
+    def __init__(self, output_dir, report_settings, date_from=None, date_to=None, customer_id=None, device_ids=None, max_workers=None):
+        self.output_dir = output_dir
+        self.report_settings = report_settings
+        self.date_from = date_from
+        self.date_to = date_to
+        self.customer_id = customer_id
+        self.device_ids = device_ids
+        self.max_workers = max_workers
+
+    def run(self, context):
+        from app.report_batch import ReportBatchStats, build_report_tasks, generate_reports
+
+        pool = None
+        try:
+            rows = database.get_report_rows(self.date_from, self.date_to, self.customer_id, self.device_ids)
+            if not rows:
+                return ReportBatchStats()
+            logging.info(f"Avvio generazione di {len(rows)} report PDF in {self.output_dir}")
+            tasks = build_report_tasks(rows, self.output_dir, self.report_settings)
+            pool = context.process_pool
+            return generate_reports(tasks, self.max_workers or context.process_workers,
+                                    progress_callback=lambda completed, total: context.report_progress(completed / total * 100),
+                                    is_cancelled=context.is_cancelled, executor=pool)
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool) and pool is not None:
+                context.discard_process_pool(pool)
+            logging.error("Errore durante la generazione dei report.", exc_info=True)
+            raise JobError(f"Errore durante la generazione dei report:\n{e}") from e
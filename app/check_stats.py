@@ -0,0 +1,40 @@
+# app/check_stats.py
+"""
+Controllo di coerenza delle statistiche della dashboard (global_stats, customer_stats).
+
+Ricalcola i contatori da zero e li confronta con quelli mantenuti dai trigger.
+Termina con codice 1 se trova differenze non riparate.
+
+Uso:  python -m app.check_stats [--db verifiche.db] [--repair]
+"""
+import argparse
+import sys
+
+import database
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Controllo di coerenza delle statistiche della dashboard.")
+    parser.add_argument("--db", help="Percorso del database (predefinito: quello dell'applicazione)")
+    parser.add_argument("--repair", action="store_true", help="Ricostruisce le statistiche se non sono coerenti")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.set_database_path(args.db)
+        database.migrate_database()
+
+    differences = database.check_stats_consistency(repair=args.repair)
+    for difference in differences:
+        print(difference)
+    if not differences:
+        print("Statistiche coerenti con i dati.")
+        return 0
+    if args.repair:
+        print(f"{len(differences)} differenze corrette: statistiche ricostruite.")
+        return 0
+    print(f"{len(differences)} differenze trovate. Eseguire con --repair per ricostruire le statistiche.")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+# app/cli.py
+"""
+Modalità batch da riga di comando, senza interfaccia grafica (nessuna QApplication).
+
+Ogni comando usa la stessa logica dei worker dell'interfaccia (app.device_import,
+app.stm_archive, app.backup_manager, app.report_batch) e stampa su stdout un unico
+oggetto JSON con comando, esito, durata in secondi e contatori, da leggere da uno
+scheduler; i messaggi di log vanno su stderr e nei file di log.
+
+Codice di uscita: 0 riuscito, 1 errore, 2 argomenti non validi, 3 completato con
+elementi non riusciti (es. alcuni report non generati).
+
+Il comando restore va eseguito solo ad applicazione chiusa: sostituisce il file del
+database, e le connessioni aperte da un altro processo (con eventuali transazioni in
+corso) non possono essere chiuse da qui.
+
+Uso:  python -m app.cli [--db verifiche.db] <comando> [opzioni]
+  import-devices FILE --customer ID [--map campo=colonna ...]
+  import-stm FILE
+  export-stm --from AAAA-MM-GG [--to AAAA-MM-GG] [--customer ID] [--gzip] --output FILE
+  backup [--compress] [--full | --incremental] [--no-verify]
+  restore FILE
+  generate-reports --output-dir DIR [--from ...] [--to ...] [--customer ID] [--device ID ...] [--logo FILE] [--workers N]
+  recompute-schedules
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from dataclasses import asdict
+from datetime import datetime
+
+import database
+from app import backup_manager
+from app.logging_config import setup_logging
+
+STATUS_OK = "ok"
+STATUS_PARTIAL = "partial"
+STATUS_ERROR = "error"
+_EXIT_CODES = {STATUS_OK: 0, STATUS_ERROR: 1, STATUS_PARTIAL: 3}
+
+
+class CommandError(Exception):
+    """Errore di un comando: il messaggio finisce nel campo "error" dell'output."""
+
+
+def _iso_date(value):
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data non valida: {value} (formato AAAA-MM-GG)")
+    return value
+
+
+def _require_customer(customer_id):
+    if customer_id is not None and database.get_customer_by_id(customer_id) is None:
+        raise CommandError(f"Cliente con ID {customer_id} non trovato.")
+
+
+# --- Comandi: ognuno restituisce i campi da aggiungere all'output ---
+
+def _import_devices(args):
+    from app import device_import
+
+    _require_customer(args.customer)
+    try:
+        file_columns = device_import.read_import_file(args.file, header_only=True).columns.tolist()
+    except Exception as e:
+        raise CommandError(f"Impossibile leggere le intestazioni dal file:\n{e}") from e
+
+    # Mappatura automatica come nella finestra di importazione, corretta con --map
+    mapping = device_import.auto_mapping(file_columns)
+    for item in args.map:
+        key, _, column = item.partition("=")
+        if key not in device_import.IMPORT_FIELDS:
+            raise CommandError(f"Campo sconosciuto in --map: {key} (validi: {', '.join(device_import.IMPORT_FIELDS)})")
+        if column not in file_columns:
+            raise CommandError(f"Colonna '{column}' non presente nel file.")
+        mapping[key] = column
+    missing = [key for key in device_import.REQUIRED_IMPORT_FIELDS if key not in mapping]
+    if missing:
+        raise CommandError(f"Campi obbligatori senza colonna: {', '.join(missing)}. Indicarli con --map campo=colonna.")
+
+    try:
+        result = device_import.import_devices(args.file, mapping, args.customer)
+    except device_import.DeviceImportError as e:
+        raise CommandError(str(e)) from e
+    return {"mapping": mapping, "added": result.added, "skipped": len(result.skipped),
+            "skipped_rows": result.skipped}
+
+
+def _import_stm(args):
+    from app.stm_archive import STM_IMPORT_BATCH_SIZE, StmArchiveImporter, StmArchiveReader, StmFormatError
+
+    logging.info(f"Avvio importazione dall'archivio: {args.file}")
+    try:
+        stats = StmArchiveImporter().import_packages(StmArchiveReader(args.file), batch_size=STM_IMPORT_BATCH_SIZE)
+    except (OSError, StmFormatError) as e:
+        raise CommandError(f"Impossibile leggere o parsare il file .stm: {e}") from e
+    return asdict(stats)
+
+
+def _export_stm(args):
+    from app.stm_archive import export_verifications
+
+    _require_customer(args.customer)
+    count = export_verifications(args.date_from, args.output, args.date_to, args.customer, compress=args.gzip)
+    if not count:
+        logging.warning(f"Nessuna verifica trovata per il periodo {args.date_from} - {args.date_to or args.date_from}.")
+    return {"verifications": count, "output": args.output if count else None}
+
+
+def _backup(args):
+    result = backup_manager.create_backup(compress=args.compress, verify=args.verify, mode=args.mode)
+    if result is None:
+        raise CommandError("Backup non riuscito: vedere il file di log per i dettagli.")
+    return {"path": result.path, "kind": result.kind, "size_bytes": result.size_bytes,
+            "database_bytes": result.database_bytes, "changed_pages": result.changed_pages,
+            "copy_seconds": round(result.copy_seconds, 3), "verify_seconds": round(result.verify_seconds, 3),
+            "compress_seconds": round(result.compress_seconds, 3)}
+
+
+def _restore(args):
+    result = backup_manager.restore_from_backup(args.file)
+    if not result.ok:
+        raise CommandError(result.error)
+    return {"schema_version": result.schema_version, "snapshot_path": result.snapshot_path,
+            "prepare_seconds": round(result.prepare_seconds, 3), "verify_seconds": round(result.verify_seconds, 3),
+            "snapshot_seconds": round(result.snapshot_seconds, 3), "swap_seconds": round(result.swap_seconds, 3)}
+
+
+def _generate_reports(args):
+    from app.report_batch import build_report_tasks, generate_reports
+
+    _require_customer(args.customer)
+    rows = database.get_report_rows(args.date_from, args.date_to, args.customer, args.device or None)
+    os.makedirs(args.output_dir, exist_ok=True)
+    tasks = build_report_tasks(rows, args.output_dir, {"logo_path": args.logo or ""})
+    logging.info(f"Avvio generazione di {len(tasks)} report PDF in {args.output_dir}")
+    stats = generate_reports(tasks, args.workers)
+    output = {"total": stats.total, "generated": stats.generated, "failed": len(stats.failed),
+              "failures": [{"file": filename, "error": error} for filename, error in stats.failed]}
+    if stats.failed:
+        output["status"] = STATUS_PARTIAL
+    return output
+
+
+def _recompute_schedules(args):
+    return {"updated_devices": database.recompute_next_verification_dates()}
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m app.cli",
+        description="Operazioni batch senza interfaccia grafica; il risultato è un oggetto JSON su stdout.")
+    parser.add_argument("--db", help="Percorso del database (predefinito: quello dell'applicazione)")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="comando")
+
+    cmd = commands.add_parser("import-devices", help="Importa dispositivi da un file Excel/CSV")
+    cmd.add_argument("file", help="File .xlsx o .csv (separatore ';')")
+    cmd.add_argument("--customer", type=int, required=True, help="ID del cliente a cui assegnare i dispositivi")
+    cmd.add_argument("--map", action="append", default=[], metavar="CAMPO=COLONNA",
+                     help="Associa un campo (matricola, descrizione, ...) a una colonna del file; ripetibile")
+    cmd.set_defaults(handler=_import_devices)
+
+    cmd = commands.add_parser("import-stm", help="Importa un archivio di verifiche .stm")
+    cmd.add_argument("file", help="File .stm o .stm.gz")
+    cmd.set_defaults(handler=_import_stm)
+
+    cmd = commands.add_parser("export-stm", help="Esporta le verifiche in un archivio .stm")
+    cmd.add_argument("--from", dest="date_from", type=_iso_date, required=True, help="Data iniziale (AAAA-MM-GG)")
+    cmd.add_argument("--to", dest="date_to", type=_iso_date, help="Data finale (predefinita: uguale a --from)")
+    cmd.add_argument("--customer", type=int, help="Solo le verifiche di questo cliente")
+    cmd.add_argument("--gzip", action="store_true", help="Comprime l'archivio con gzip")
+    cmd.add_argument("--output", required=True, help="File di destinazione")
+    cmd.set_defaults(handler=_export_stm)
+
+    cmd = commands.add_parser("backup", help="Crea un backup del database")
+    cmd.add_argument("--compress", action="store_true", help="Comprime i backup completi con gzip")
+    cmd.add_argument("--no-verify", dest="verify", action="store_false", help="Salta il controllo di integrità della copia")
+    kind = cmd.add_mutually_exclusive_group()
+    kind.add_argument("--full", dest="mode", action="store_const", const=backup_manager.BACKUP_FULL, help="Forza un backup completo")
+    kind.add_argument("--incremental", dest="mode", action="store_const", const=backup_manager.BACKUP_INCREMENTAL,
+                      help="Forza un backup incrementale (se la catena lo permette)")
+    cmd.set_defaults(handler=_backup, mode=backup_manager.BACKUP_AUTO)
+
+    cmd = commands.add_parser("restore", help="Ripristina il database da un backup (solo ad applicazione chiusa)")
+    cmd.add_argument("file", help="File di backup (.bak, .bak.gz o .incr.gz)")
+    cmd.set_defaults(handler=_restore)
+
+    cmd = commands.add_parser("generate-reports", help="Genera i report PDF di una selezione di verifiche")
+    cmd.add_argument("--output-dir", required=True, help="Cartella in cui salvare i PDF")
+    cmd.add_argument("--from", dest="date_from", type=_iso_date, help="Data iniziale (AAAA-MM-GG)")
+    cmd.add_argument("--to", dest="date_to", type=_iso_date, help="Data finale (AAAA-MM-GG)")
+    cmd.add_argument("--customer", type=int, help="Solo le verifiche di questo cliente")
+    cmd.add_argument("--device", type=int, action="append", default=[], help="Solo questo dispositivo (ripetibile)")
+    cmd.add_argument("--logo", help="Logo da inserire nei report")
+    cmd.add_argument("--workers", type=int, help="Numero di processi (predefinito: uno per core)")
+    cmd.set_defaults(handler=_generate_reports)
+
+    cmd = commands.add_parser("recompute-schedules", help="Ricalcola le date della prossima verifica")
+    cmd.set_defaults(handler=_recompute_schedules)
+    return parser
+
+
+def main(argv=None):
+    args = _build_parser().parse_args(argv)
+    setup_logging(console_stream=sys.stderr)
+
+    output = {"command": args.command, "status": STATUS_OK}
+    start = time.perf_counter()
+    try:
+        if args.db:
+            database.set_database_path(args.db)
+        # Il ripristino controlla da sé la versione dello schema del backup
+        if args.command != "restore":
+            database.migrate_database()
+        output.update(args.handler(args))
+    except (CommandError, database.MigrationError) as e:
+        logging.error(f"Comando {args.command} non riuscito: {e}")
+        output.update(status=STATUS_ERROR, error=str(e))
+    except Exception as e:
+        logging.error(f"Errore imprevisto durante il comando {args.command}.", exc_info=True)
+        output.update(status=STATUS_ERROR, error=f"{type(e).__name__}: {e}")
+    output["seconds"] = round(time.perf_counter() - start, 3)
+
+    print(json.dumps(output, ensure_ascii=False))
+    return _EXIT_CODES[output["status"]]
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -1,7 +1,6 @@
 # app/config.py
 import json
-from PySide6.QtWidgets import QMessageBox
-from .data_models import Limit, Test, VerificationProfile
+from . import profile_engine
 import logging
 
 PROFILES = {}
@@ -76,23 +75,14 @@ STYLESHEET = """
 """
 
 def load_verification_profiles(file_path="profiles.json"):
+    """
+    Carica i profili di verifica compilati (app.profile_engine) in PROFILES.
+    La compilazione viene rifatta solo se profiles.json è cambiato dall'ultimo avvio.
+    """
     global PROFILES
     PROFILES = {}
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            profiles_data = json.load(f)
-        for p_data in profiles_data:
-            tests = []
-            for t_data in p_data.get("tests", []):
-                limits = {}
-                for key, l_data in t_data.get("limits", {}).items():
-                    limits[key] = Limit(**l_data)
-                t_data["limits"] = limits
-                tests.append(Test(**t_data))
-            PROFILES[p_data["profile_key"]] = VerificationProfile(
-                name=p_data["profile_name"],
-                tests=tests
-            )
+        PROFILES = profile_engine.load_profiles(file_path)
         if not PROFILES:
             # Lancia un errore se il file JSON è valido ma non contiene profili
             raise ValueError("Il file profiles.json è vuoto o non contiene profili validi.")
@@ -0,0 +1,166 @@
+# app/device_import.py
+"""
+Importazione di dispositivi da file Excel/CSV, indipendente da Qt.
+
+Usata dall'ImportWorker (interfaccia) e dalla riga di comando (app.cli).
+pandas viene importato solo quando serve, per non rallentare l'avvio.
+"""
+import logging
+from dataclasses import dataclass, field
+
+import database
+
+# Numero di righe inserite per ogni executemany: tra un blocco e l'altro
+# vengono aggiornati l'avanzamento e il controllo di annullamento.
+INSERT_CHUNK_SIZE = 1000
+
+# Campi del programma a cui associare le colonne del file (chiave -> etichetta)
+IMPORT_FIELDS = {
+    'matricola': 'Matricola (S/N)',
+    'descrizione': 'Descrizione',
+    'costruttore': 'Costruttore',
+    'modello': 'Modello',
+    'reparto': 'Reparto (Opzionale)',
+    'inv_cliente': 'Inventario Cliente (Opzionale)',
+    'inv_ams': 'Inventario AMS (Opzionale)',
+    'verification_interval': 'Intervallo Verifica (Mesi, Opzionale)'
+}
+REQUIRED_IMPORT_FIELDS = ('matricola', 'descrizione')
+
+
+class DeviceImportError(Exception):
+    """Errore di lettura, validazione o salvataggio; il messaggio è pronto per l'utente."""
+
+
+@dataclass
+class DeviceImportResult:
+    added: int = 0
+    skipped: list = field(default_factory=list)     # "Riga N: motivo"
+    cancelled: bool = False     # interrotta dall'utente: `added` conta i dispositivi già salvati
+
+
+def read_import_file(filename, header_only=False):
+    """Legge il file (CSV con separatore ';' o Excel) come DataFrame di stringhe."""
+    import pandas as pd
+    nrows = 0 if header_only else None
+    if filename.endswith('.csv'):
+        df = pd.read_csv(filename, sep=';', dtype=str, nrows=nrows)
+    else:
+        df = pd.read_excel(filename, dtype=str, nrows=nrows)
+    return df.fillna('')
+
+
+def auto_mapping(file_columns):
+    """Associa ogni campo alla prima colonna del file che ne contiene il nome."""
+    mapping = {}
+    for key in IMPORT_FIELDS:
+        for col_name in file_columns:
+            if key.replace("_", "") in col_name.lower().replace(" ", "").replace("/", ""):
+                mapping[key] = col_name
+                break
+    return mapping
+
+
+def _column(df, mapping, key):
+    """Restituisce la colonna mappata per il campo `key`, o una colonna vuota se non mappata."""
+    import pandas as pd
+    col_name = mapping.get(key)
+    if col_name in df.columns:
+        return df[col_name]
+    return pd.Series('', index=df.index, dtype=str)
+
+
+def prepare_device_rows(df, mapping, customer_id, existing_serials):
+    """
+    Valida e normalizza l'intero DataFrame in forma vettoriale.
+    Restituisce (righe da inserire, dettagli delle righe ignorate) con la stessa
+    semantica dell'importazione riga per riga: matricola mancante, matricola già
+    presente (nel database o in una riga precedente del file), descrizione mancante.
+    """
+    import pandas as pd
+    df = df.reset_index(drop=True)
+    serials = _column(df, mapping, 'matricola')
+    descriptions = _column(df, mapping, 'descrizione')
+
+    has_serial = serials != ''
+    in_db = serials.isin(existing_serials)
+    has_desc = descriptions != ''
+
+    # Solo la prima riga valida di ogni matricola viene inserita; le successive
+    # risultano "già esistenti", come accadeva controllando il DB riga per riga.
+    eligible = has_serial & ~in_db & has_desc
+    first_rows = serials[eligible].drop_duplicates(keep='first')
+    first_pos = serials.map(pd.Series(first_rows.index, index=first_rows.values))
+    seen_before = first_pos.notna() & (first_pos < df.index.to_series())
+
+    missing_serial = ~has_serial
+    already_exists = has_serial & (in_db | seen_before)
+    missing_desc = has_serial & ~already_exists & ~has_desc
+    to_insert = ~(missing_serial | already_exists | missing_desc)
+
+    reasons = pd.Series('', index=df.index, dtype=object)
+    reasons[missing_desc] = "Descrizione mancante."
+    reasons[already_exists] = "Matricola '" + serials[already_exists] + "' esiste già nel database."
+    reasons[missing_serial] = "Matricola mancante."
+    skipped = reasons[reasons != '']
+    skipped_rows_details = [f"Riga {index + 2}: {reason}" for index, reason in skipped.items()]
+
+    department = _column(df, mapping, 'reparto')
+    full_description = descriptions.where(department == '', descriptions + " (" + department + ")")
+    intervals = pd.to_numeric(_column(df, mapping, 'verification_interval').str.strip(), errors='coerce')
+    intervals = intervals.where(intervals == intervals.round())  # Solo mesi interi, altrimenti nessun intervallo
+
+    columns = [serials, full_description, _column(df, mapping, 'costruttore'), _column(df, mapping, 'modello'),
+               _column(df, mapping, 'inv_cliente'), _column(df, mapping, 'inv_ams')]
+    serial_l, desc_l, mfg_l, model_l, cust_inv_l, ams_inv_l = (col[to_insert].tolist() for col in columns)
+    interval_l = [None if pd.isna(v) else int(v) for v in intervals[to_insert].tolist()]
+    rows = [
+        (customer_id, serial, desc, mfg, model, '[]', cust_inv, ams_inv, interval)
+        for serial, desc, mfg, model, cust_inv, ams_inv, interval
+        in zip(serial_l, desc_l, mfg_l, model_l, cust_inv_l, ams_inv_l, interval_l)
+    ]
+    return rows, skipped_rows_details
+
+
+def import_devices(filename, mapping, customer_id, progress_callback=None, is_cancelled=None):
+    """
+    Importa i dispositivi del file per il cliente indicato e restituisce un DeviceImportResult.
+    Tutte le righe valide vengono scritte in un'unica transazione, a blocchi: in caso di
+    errore nessun dispositivo viene importato. Con l'annullamento (`is_cancelled()` vera)
+    l'importazione si ferma prima del blocco successivo e i blocchi già scritti vengono
+    salvati, come nell'importazione riga per riga.
+    `progress_callback(percentuale)` viene chiamata dopo ogni blocco.
+    Solleva DeviceImportError con un messaggio per l'utente.
+    """
+    try:
+        df = read_import_file(filename)
+    except Exception as e:
+        raise DeviceImportError(f"Impossibile leggere il file:\n{e}") from e
+
+    try:
+        rows, skipped_rows_details = prepare_device_rows(df, mapping, customer_id, database.get_all_device_serials())
+    except Exception as e:
+        logging.error("Errore durante la validazione del file di importazione.", exc_info=True)
+        raise DeviceImportError(f"Errore durante la validazione dei dati:\n{e}") from e
+
+    result = DeviceImportResult(skipped=skipped_rows_details)
+    total_rows = len(rows)
+    try:
+        with database.transaction():
+            for start in range(0, total_rows, INSERT_CHUNK_SIZE):
+                if is_cancelled is not None and is_cancelled():
+                    result.cancelled = True
+                    break
+                chunk = rows[start:start + INSERT_CHUNK_SIZE]
+                database.add_devices_bulk(chunk)
+                result.added += len(chunk)
+                if progress_callback is not None:
+                    progress_callback(int(result.added / total_rows * 100))
+            # I nuovi dispositivi con intervallo di verifica ricevono subito una scadenza
+            database.recompute_next_verification_dates()
+    except Exception as e:
+        logging.error("Errore durante l'inserimento dei dispositivi importati.", exc_info=True)
+        raise DeviceImportError(f"Errore durante il salvataggio dei dispositivi:\n{e}") from e
+
+    logging.info(f"Importazione {'annullata' if result.cancelled else 'terminata'}: {result.added} dispositivi aggiunti, {len(result.skipped)} righe ignorate.")
+    return result
@@ -0,0 +1,337 @@
+# app/jobs.py
+"""
+Esecuzione dei lavori in background (importazioni, esportazioni, report, backup), indipendente da Qt.
+
+Un Job implementa run(context) e restituisce il risultato; il context (JobHandle) offre
+avanzamento, annullamento e il pool di processi condiviso per il lavoro CPU. Il
+JobScheduler esegue i job su un numero limitato di thread, in ordine di priorità e di
+arrivo; quelli in eccesso restano in coda. I job con la stessa `exclusive_key` (es.
+le scritture massive sul database) non vengono mai eseguiti insieme.
+
+L'interfaccia usa lo scheduler condiviso (get_scheduler) tramite gli adattatori Qt di
+app.workers.job_adapter, che traducono l'esito nei segnali dei worker.
+"""
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Priorità: valori più bassi vengono eseguiti prima
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 20
+
+# Thread dello scheduler: bastano pochi job contemporanei, il lavoro CPU va nel pool di processi
+DEFAULT_MAX_WORKERS = 4
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+_job_ids = itertools.count(1)
+
+
+class JobCancelled(Exception):
+    """Sollevata da un job (o da context.check_cancelled) per terminare dopo un annullamento."""
+
+
+class JobError(Exception):
+    """Errore previsto di un job; il messaggio è pronto per l'utente."""
+
+
+class Job:
+    """
+    Lavoro da eseguire in background. Le sottoclassi implementano run(context) e ne
+    restituiscono il risultato; durante il lavoro chiamano context.report_progress(percentuale)
+    e controllano context.is_cancelled().
+    """
+    name = "Job"
+    priority = PRIORITY_NORMAL
+    exclusive_key = None    # i job con la stessa chiave vengono eseguiti uno alla volta
+
+    def run(self, context):
+        raise NotImplementedError
+
+
+class JobHandle:
+    """
+    Stato di un job inviato allo scheduler, ed è il `context` passato a Job.run().
+    `progress_callback(percentuale)` viene chiamata solo quando la percentuale cambia;
+    `done_callback(handle)` una volta al termine, qualunque sia l'esito. Entrambe
+    vengono chiamate dal thread che esegue il job.
+    """
+
+    def __init__(self, job, priority=None, progress_callback=None, done_callback=None, scheduler=None):
+        self.id = next(_job_ids)
+        self.job = job
+        self.priority = job.priority if priority is None else priority
+        self.state = JOB_QUEUED
+        self.progress = -1
+        self.result = None
+        self.error = None
+        self.submitted_at = time.perf_counter()
+        self.wait_seconds = 0.0     # tempo passato in coda
+        self.run_seconds = 0.0
+        self._progress_callback = progress_callback
+        self._done_callback = done_callback
+        self._scheduler = scheduler
+        self._lock = threading.Lock()
+        self._cancel_requested = threading.Event()
+        self._finished = threading.Event()
+
+    def __repr__(self):
+        return f"<JobHandle {self.id} {self.job.name!r} {self.state}>"
+
+    # --- Lato job ---
+
+    def is_cancelled(self):
+        return self._cancel_requested.is_set()
+
+    def check_cancelled(self):
+        if self._cancel_requested.is_set():
+            raise JobCancelled()
+
+    def report_progress(self, percent):
+        percent = max(0, min(100, int(percent)))
+        if percent != self.progress:
+            self.progress = percent
+            if self._progress_callback is not None:
+                self._progress_callback(percent)
+
+    @property
+    def process_pool(self):
+        """Pool di processi condiviso dello scheduler (None se il job è eseguito fuori dallo scheduler)."""
+        return self._scheduler.process_pool if self._scheduler is not None else None
+
+    @property
+    def process_workers(self):
+        return self._scheduler.process_workers if self._scheduler is not None else None
+
+    def discard_process_pool(self, pool):
+        """Da chiamare se il pool si è rotto (es. un processo terminato): il prossimo job ne avrà uno nuovo."""
+        if self._scheduler is not None:
+            self._scheduler.discard_process_pool(pool)
+
+    # --- Lato chiamante ---
+
+    @property
+    def done(self):
+        return self._finished.is_set()
+
+    def cancel(self):
+        """
+        Richiede l'annullamento. Un job in coda viene scartato subito; uno in esecuzione
+        termina al prossimo controllo. Restituisce False se il job era già terminato.
+        """
+        with self._lock:
+            if self.state in (JOB_DONE, JOB_FAILED, JOB_CANCELLED):
+                return False
+            self._cancel_requested.set()
+            if self.state != JOB_QUEUED:
+                return True
+            self.state = JOB_CANCELLED
+        logging.info(f"Job {self.id} ({self.job.name}) annullato prima dell'avvio.")
+        self._notify_done()
+        return True
+
+    def wait(self, timeout=None):
+        """Attende la fine del job; restituisce False se scade il timeout."""
+        return self._finished.wait(timeout)
+
+    def get_result(self, timeout=None):
+        """Restituisce il risultato; solleva l'errore del job o JobCancelled se è stato annullato."""
+        if not self._finished.wait(timeout):
+            raise TimeoutError(f"Job {self.id} ({self.job.name}) non terminato entro {timeout} s.")
+        if self.state == JOB_CANCELLED:
+            raise JobCancelled()
+        if self.state == JOB_FAILED:
+            raise self.error
+        return self.result
+
+    # --- Esecuzione ---
+
+    def execute(self):
+        """Esegue il job nel thread corrente (lo scheduler la chiama dai propri thread)."""
+        with self._lock:
+            if self.state != JOB_QUEUED:
+                return
+            self.state = JOB_RUNNING
+        self.wait_seconds = time.perf_counter() - self.submitted_at
+        start = time.perf_counter()
+        try:
+            self.result = self.job.run(self)
+            state = JOB_DONE
+        except JobCancelled:
+            state = JOB_CANCELLED
+        except JobError as e:
+            logging.error(f"Job {self.id} ({self.job.name}) non riuscito: {e}")
+            self.error, state = e, JOB_FAILED
+        except Exception as e:
+            logging.error(f"Errore imprevisto nel job {self.id} ({self.job.name}).", exc_info=True)
+            self.error, state = e, JOB_FAILED
+        self.run_seconds = time.perf_counter() - start
+        with self._lock:
+            self.state = state
+        logging.info(f"Job {self.id} ({self.job.name}): {state} in {self.run_seconds:.2f} s "
+                     f"(in coda per {self.wait_seconds:.2f} s).")
+        self._notify_done()
+
+    def _notify_done(self):
+        self._finished.set()
+        if self._done_callback is not None:
+            try:
+                self._done_callback(self)
+            except Exception:
+                logging.error(f"Errore nella notifica di fine del job {self.id}.", exc_info=True)
+
+
+class JobScheduler:
+    """
+    Esegue i job su al massimo `max_workers` thread, creati solo quando servono.
+    Il pool di processi (`process_workers` processi, predefinito uno per core) viene
+    creato al primo utilizzo ed è condiviso: più lotti di report si dividono gli stessi
+    core invece di avviare ciascuno un processo per core.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, process_workers=None):
+        self.max_workers = max_workers
+        self.process_workers = process_workers or os.cpu_count() or 1
+        self._condition = threading.Condition()
+        self._queue = []            # (priorità, progressivo, handle), ordinata
+        self._running = set()
+        self._busy_keys = set()     # exclusive_key dei job in esecuzione
+        self._threads = []
+        self._idle_threads = 0
+        self._sequence = itertools.count()
+        self._process_pool = None
+        self._process_pool_lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, job, priority=None, progress_callback=None, done_callback=None):
+        """Mette in coda un job e restituisce il suo JobHandle."""
+        handle = JobHandle(job, priority, progress_callback, done_callback, scheduler=self)
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Lo scheduler dei job è già stato chiuso.")
+            self._queue.append((handle.priority, next(self._sequence), handle))
+            self._queue.sort(key=lambda entry: entry[:2])
+            # Un thread svegliato risulta inattivo finché non riprende il lock: si confronta
+            # con i job in coda, così più submit ravvicinati avviano più thread
+            queued = sum(1 for _, _, queued_handle in self._queue if queued_handle.state == JOB_QUEUED)
+            if queued > self._idle_threads and len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._worker_loop, name=f"JobScheduler-{len(self._threads) + 1}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._condition.notify()
+        logging.info(f"Job {handle.id} ({job.name}) in coda con priorità {handle.priority}.")
+        return handle
+
+    def pending(self):
+        """Job in coda, nell'ordine in cui verranno avviati."""
+        with self._condition:
+            return [handle for _, _, handle in self._queue if handle.state == JOB_QUEUED]
+
+    def running(self):
+        with self._condition:
+            return list(self._running)
+
+    def _take_next(self):
+        """Primo job in coda la cui exclusive_key è libera (chiamata con il lock acquisito)."""
+        for index, (_, _, handle) in enumerate(self._queue):
+            if handle.state != JOB_QUEUED:
+                continue
+            if handle.job.exclusive_key is None or handle.job.exclusive_key not in self._busy_keys:
+                del self._queue[index]
+                return handle
+        # Scarta i job annullati mentre erano in coda
+        self._queue = [entry for entry in self._queue if entry[2].state == JOB_QUEUED]
+        return None
+
+    def _worker_loop(self):
+        while True:
+            with self._condition:
+                handle = self._take_next()
+                while handle is None:
+                    if self._shutdown:
+                        self._threads.remove(threading.current_thread())
+                        return
+                    self._idle_threads += 1
+                    self._condition.wait()
+                    self._idle_threads -= 1
+                    handle = self._take_next()
+                self._running.add(handle)
+                if handle.job.exclusive_key is not None:
+                    self._busy_keys.add(handle.job.exclusive_key)
+            try:
+                handle.execute()
+            finally:
+                with self._condition:
+                    self._running.discard(handle)
+                    self._busy_keys.discard(handle.job.exclusive_key)
+                    # Un job in attesa della stessa chiave può ora partire
+                    self._condition.notify_all()
+
+    @property
+    def process_pool(self):
+        with self._process_pool_lock:
+            if self._process_pool is None:
+                # "spawn": non si esegue il fork di un processo con thread, connessioni SQLite e
+                # Qt attivi; i processi figli reimportano solo quanto serve a generare i report
+                self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers,
+                                                         mp_context=multiprocessing.get_context("spawn"))
+            return self._process_pool
+
+    def discard_process_pool(self, pool):
+        with self._process_pool_lock:
+            if self._process_pool is pool:
+                self._process_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self, cancel=True, wait=True, timeout=None):
+        """
+        Chiude lo scheduler: con `cancel` annulla i job in coda e chiede l'annullamento
+        di quelli in esecuzione; con `wait` attende (al massimo `timeout` s per thread)
+        che i thread terminino.
+        """
+        with self._condition:
+            self._shutdown = True
+            handles = [handle for _, _, handle in self._queue] + list(self._running)
+            threads = list(self._threads)
+            self._condition.notify_all()
+        if cancel:
+            for handle in handles:
+                handle.cancel()
+        if wait:
+            for thread in threads:
+                thread.join(timeout)
+        with self._process_pool_lock:
+            pool, self._process_pool = self._process_pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Scheduler condiviso dall'applicazione, creato al primo utilizzo."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = JobScheduler()
+        return _scheduler
+
+
+def shutdown_scheduler(cancel=True, wait=True, timeout=None):
+    """Chiude lo scheduler condiviso, se è stato creato (es. all'uscita dell'applicazione)."""
+    global _scheduler
+    with _scheduler_lock:
+        scheduler, _scheduler = _scheduler, None
+    if scheduler is not None:
+        scheduler.shutdown(cancel=cancel, wait=wait, timeout=timeout)
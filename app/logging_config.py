@@ -7,8 +7,12 @@ from datetime import datetime
 
 LOG_DIR = "logs"
 
-def setup_logging():
-    """Configura il sistema di logging per salvare su file e mostrare in console."""
+def setup_logging(console_stream=None):
+    """
+    Configura il sistema di logging per salvare su file e mostrare in console.
+    `console_stream` sostituisce stdout per i messaggi in console (la riga di comando
+    usa stderr, così stdout resta riservato al risultato in JSON).
+    """
     
     # Crea la cartella dei log se non esiste
     if not os.path.exists(LOG_DIR):
@@ -32,7 +36,7 @@ def setup_logging():
     file_handler.setLevel(logging.INFO)  # Salva nel file solo i messaggi da INFO in su
 
     # 2. Handler per mostrare i log nella console (utile durante lo sviluppo)
-    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler = logging.StreamHandler(console_stream or sys.stdout)
     console_handler.setFormatter(log_formatter)
     console_handler.setLevel(logging.DEBUG) # Mostra tutto in console
 
@@ -0,0 +1,49 @@
+# app/migrate.py
+"""
+Aggiornamento dello schema del database da riga di comando.
+
+Con --dry-run mostra le migrazioni in attesa senza modificare il database.
+Termina con codice 1 se una migrazione fallisce (lo schema resta alla versione precedente).
+
+Uso:  python -m app.migrate [--db verifiche.db] [--dry-run]
+"""
+import argparse
+import sys
+
+import database
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggiornamento dello schema del database.")
+    parser.add_argument("--db", help="Percorso del database (predefinito: quello dell'applicazione)")
+    parser.add_argument("--dry-run", action="store_true", help="Mostra le migrazioni da applicare senza eseguirle")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.set_database_path(args.db)
+
+    if args.dry_run:
+        plan = database.migration_plan()
+        for migration in plan.modified:
+            print(f"ATTENZIONE: {migration.name} è cambiato dopo essere stato applicato.")
+        if not plan.pending:
+            print(f"Schema alla versione {plan.current_version}: nessuna migrazione da applicare.")
+            return 0
+        print(f"Schema alla versione {plan.current_version}, migrazioni da applicare:")
+        for migration in plan.pending:
+            print(f"  {migration.name}  (sha256 {migration.checksum[:12]})")
+        return 0
+
+    try:
+        plan = database.migrate_database()
+    except database.MigrationError as e:
+        print(e)
+        return 1
+    for migration in plan.applied:
+        print(f"Applicata {migration.name}")
+    print(f"Schema alla versione {plan.latest_version} ({plan.seconds * 1000:.1f} ms).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
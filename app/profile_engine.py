@@ -0,0 +1,207 @@
+# app/profile_engine.py
+"""
+Profili di verifica compilati e valutazione delle misure, indipendenti da Qt.
+
+profiles.json viene compilato una volta in oggetti immutabili: per ogni test i limiti
+sono già risolti per tipo di parte applicata, con unità e testi da mostrare pronti.
+CompiledProfile.plan(parti_applicate) restituisce la sequenza dei passi di una verifica
+(test × parti applicate); evaluate() valuta in un colpo solo un vettore di misure.
+Lo usano il TestRunnerWidget, le importazioni e la rivalutazione delle verifiche.
+
+Il risultato della compilazione è salvato su disco (PROFILE_CACHE_SUFFIX accanto al file
+dei profili) insieme all'hash di profiles.json: se il file non cambia, agli avvii
+successivi i profili vengono letti dalla cache senza ricostruirli.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+from dataclasses import dataclass
+
+from app.data_models import Limit, Test
+
+# Da incrementare quando cambia la struttura degli oggetti compilati (invalida le cache)
+ENGINE_VERSION = 1
+PROFILE_CACHE_SUFFIX = ".cache"
+
+# Chiave dei limiti dei test generali (non su parte applicata) in profiles.json
+ST_LIMIT_KEY = "::ST"
+
+STATUS_PASSED = "PASSATO"
+STATUS_FAILED = "FALLITO"
+
+
+@dataclass(frozen=True, slots=True)
+class ResolvedLimit:
+    unit: str
+    high_value: float
+    text: str       # testo nella tabella dei risultati e nel report
+    label: str      # testo (HTML) mostrato durante la misura
+
+
+NO_LIMIT = ResolvedLimit(None, None, "N/A", "<b>Limite:</b> Non specificato")
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledTest:
+    index: int
+    name: str
+    parameter: str
+    is_applied_part_test: bool
+    limits: dict    # chiave di profiles.json ("::ST", "::B", ...) -> ResolvedLimit
+
+    def limit_for(self, part_type=None):
+        key = ST_LIMIT_KEY if part_type is None else f"::{part_type}"
+        return self.limits.get(key, NO_LIMIT)
+
+
+@dataclass(frozen=True, slots=True)
+class ProfileStep:
+    """Una misura da eseguire: un test generale o un test su una parte applicata."""
+    test: CompiledTest
+    applied_part: str       # nome della parte applicata (None per i test generali)
+    part_type: str
+    result_name: str        # nome nella tabella dei risultati
+    prompt: str             # testo mostrato al tecnico
+    limit: ResolvedLimit
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledProfile:
+    key: str
+    name: str
+    tests: tuple
+
+    @property
+    def needs_applied_parts(self):
+        return any(test.is_applied_part_test for test in self.tests)
+
+    def plan(self, applied_parts):
+        """
+        Sequenza dei passi per un dispositivo: i test su parte applicata vengono ripetuti
+        per ogni parte (e saltati se il dispositivo non ne ha).
+        `applied_parts` contiene oggetti AppliedPart o dizionari con name e part_type.
+        """
+        parts = [(pa['name'], pa['part_type']) if isinstance(pa, dict) else (pa.name, pa.part_type) for pa in applied_parts]
+        steps = []
+        for test in self.tests:
+            if not test.is_applied_part_test:
+                steps.append(ProfileStep(test, None, None, f"{test.name} ({test.parameter})",
+                                         f"{test.name}\n{test.parameter}", test.limit_for()))
+                continue
+            for pa_name, part_type in parts:
+                steps.append(ProfileStep(test, pa_name, part_type, f"{test.name} - {pa_name}",
+                                         f"{test.name}\nParte Applicata: {pa_name} (Tipo {part_type})",
+                                         test.limit_for(part_type)))
+        return tuple(steps)
+
+
+@dataclass(slots=True)
+class Evaluation:
+    results: list           # un dizionario per passo, nel formato salvato in results_json
+    overall_status: str
+    failed_count: int
+
+
+def _resolve_limit(limit):
+    if limit.high_value is not None:
+        text = f"≤ {limit.high_value} {limit.unit}"
+    else:
+        text = f"N/A (misura in {limit.unit})"
+    return ResolvedLimit(limit.unit, limit.high_value, text, f"<b>Limite:</b> {text}")
+
+
+def compile_profiles(profiles_data):
+    """Compila il contenuto di profiles.json (lista di profili) in {profile_key: CompiledProfile}."""
+    profiles = {}
+    for p_data in profiles_data:
+        tests = []
+        for index, t_data in enumerate(p_data.get("tests", [])):
+            limits = {key: Limit(**l_data) for key, l_data in t_data.get("limits", {}).items()}
+            test = Test(**{**t_data, "limits": limits})
+            tests.append(CompiledTest(
+                index=index, name=test.name, parameter=test.parameter,
+                is_applied_part_test=test.is_applied_part_test,
+                limits={key: _resolve_limit(limit) for key, limit in limits.items()},
+            ))
+        profiles[p_data["profile_key"]] = CompiledProfile(p_data["profile_key"], p_data["profile_name"], tuple(tests))
+    return profiles
+
+
+def _cache_digest(raw_data):
+    return hashlib.sha256(f"{ENGINE_VERSION}:".encode() + raw_data).hexdigest()
+
+
+def _read_cache(cache_path, digest):
+    try:
+        with open(cache_path, 'rb') as f:
+            cached_digest, profiles = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError, ImportError):
+        return None
+    return profiles if cached_digest == digest else None
+
+
+def _write_cache(cache_path, digest, profiles):
+    """Scrive la cache; se la cartella non è scrivibile i profili verranno ricompilati al prossimo avvio."""
+    temp_path = cache_path + ".tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            pickle.dump((digest, profiles), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        logging.warning(f"Impossibile scrivere la cache dei profili: {cache_path}", exc_info=True)
+
+
+def load_profiles(file_path):
+    """
+    Carica i profili compilati, dalla cache se profiles.json non è cambiato.
+    Solleva FileNotFoundError se il file manca, ValueError se il JSON non è valido.
+    """
+    with open(file_path, 'rb') as f:
+        raw_data = f.read()
+    digest = _cache_digest(raw_data)
+    cache_path = file_path + PROFILE_CACHE_SUFFIX
+    profiles = _read_cache(cache_path, digest)
+    if profiles is not None:
+        logging.info(f"Profili letti dalla cache: {cache_path}")
+        return profiles
+
+    profiles = compile_profiles(json.loads(raw_data.decode('utf-8')))
+    _write_cache(cache_path, digest, profiles)
+    return profiles
+
+
+def normalize_measurement(value):
+    """Valore misurato come testo normalizzato (virgola decimale accettata) e come float; ValueError se non numerico."""
+    value_str = str(value).strip().replace(',', '.')
+    if not value_str:
+        raise ValueError("Valore mancante")
+    return value_str, float(value_str)
+
+
+def evaluate_step(step, value):
+    """Valuta una misura (testo o numero) su un passo; restituisce il risultato da salvare."""
+    value_str, value_float = normalize_measurement(value)
+    limit = step.limit
+    is_passed = limit.high_value is None or value_float <= limit.high_value
+    # I campi strutturati alimentano la tabella verification_results; name/limit/value restano per i report
+    return {"name": step.result_name, "limit": limit.text, "value": value_str, "passed": is_passed,
+            "test": step.test.name, "parameter": None if step.test.is_applied_part_test else step.test.parameter,
+            "applied_part": step.applied_part, "unit": limit.unit, "limit_value": limit.high_value}
+
+
+def overall_status(results):
+    return STATUS_PASSED if all(r['passed'] for r in results) else STATUS_FAILED
+
+
+def evaluate(steps, values):
+    """
+    Valuta un'intera verifica: una misura per ogni passo di CompiledProfile.plan(), nello stesso ordine.
+    Solleva ValueError se il numero di misure non corrisponde o una misura non è numerica.
+    """
+    if len(values) != len(steps):
+        raise ValueError(f"Attese {len(steps)} misure, ricevute {len(values)}")
+    results = [evaluate_step(step, value) for step, value in zip(steps, values)]
+    failed_count = sum(1 for r in results if not r['passed'])
+    return Evaluation(results, STATUS_FAILED if failed_count else STATUS_PASSED, failed_count)
@@ -0,0 +1,264 @@
+# app/reevaluation.py
+"""
+Rivalutazione delle verifiche già eseguite con i limiti di un profiles.json aggiornato.
+
+Le misure vengono lette da verification_results in blocchi e trasformate in colonne
+NumPy; per ogni combinazione (profilo, test, tipo di parte applicata) il limite nuovo
+viene risolto una volta sola con app.profile_engine, poi confronto ed esito per
+verifica sono calcolati sull'intero vettore. Il risultato è l'elenco delle verifiche
+che cambierebbero esito, esportabile in CSV.
+
+Le misure che non si possono rivalutare mantengono l'esito registrato: valore non
+numerico, profilo non più presente, parte applicata non più associata al dispositivo.
+
+Uso:  python -m app.reevaluation --profiles profiles.json --output differenze.csv [--db verifiche.db]
+"""
+import argparse
+import csv
+import logging
+import sys
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+import database
+from app import profile_engine
+
+
+@dataclass
+class StatusChange:
+    verification_id: int
+    verification_date: str
+    profile_name: str
+    serial_number: str
+    description: str
+    customer_name: str
+    old_status: str
+    new_status: str
+    changed_tests: list     # misure il cui esito cambia, es. "Dispersione paziente - ECG: 12 (≤ 10 uA)"
+
+
+@dataclass
+class ReevaluationReport:
+    verifications: int = 0
+    measurements: int = 0
+    not_evaluated: int = 0      # misure lasciate con l'esito registrato
+    changes: list = field(default_factory=list)     # StatusChange, prima quelle che diventano fallite
+    seconds: float = 0.0
+
+    @property
+    def newly_failed(self):
+        return [c for c in self.changes if c.new_status == profile_engine.STATUS_FAILED]
+
+    @property
+    def newly_passed(self):
+        return [c for c in self.changes if c.new_status == profile_engine.STATUS_PASSED]
+
+
+def _load_results(date_from, date_to, progress_callback):
+    """
+    Legge le misure come colonne NumPy, in ordine di verifica e posizione:
+    id verifica, posizione, codice della misura, valore, esito registrato.
+    Il codice identifica la combinazione (test, parametro, parte applicata): le
+    combinazioni distinte sono poche e vengono risolte una volta sola.
+    """
+    measure_codes = {}
+    columns = [[] for _ in range(5)]
+    loaded = 0
+    for rows in database.iter_results_for_reevaluation(date_from, date_to):
+        verification_ids, positions, tests, parameters, parts, values, flags = zip(*rows)
+        count = len(rows)
+        columns[0].append(np.fromiter(verification_ids, dtype=np.int64, count=count))
+        columns[1].append(np.fromiter(positions, dtype=np.int64, count=count))
+        columns[2].append(np.fromiter(
+            (measure_codes.setdefault(key, len(measure_codes)) for key in zip(tests, parameters, parts)),
+            dtype=np.int64, count=count))
+        columns[3].append(np.array(values, dtype=np.float64))      # None -> nan
+        columns[4].append(np.fromiter(flags, dtype=bool, count=count))
+        loaded += count
+        if progress_callback is not None:
+            progress_callback(loaded)
+    if not loaded:
+        return measure_codes, None
+    return measure_codes, [np.concatenate(column) for column in columns]
+
+
+def _part_type_codes(measure_keys, row_measures, row_devices, device_ids):
+    """
+    Tipo della parte applicata di ogni misura (codice in part_type_names, -1 per i test
+    generali e per le parti non più associate al dispositivo).
+    """
+    part_names = sorted({key[2] for key in measure_keys if key[2] is not None})
+    name_code = {name: code for code, name in enumerate(part_names)}
+    measure_part = np.array([name_code.get(key[2], -1) for key in measure_keys], dtype=np.int64)
+    row_part = measure_part[row_measures]
+    codes = np.full(len(row_measures), -1, dtype=np.int64)
+    part_type_names = []
+    mask = row_part >= 0
+    if mask.any():
+        # Una ricerca per coppia dispositivo/parte distinta, non per misura
+        pairs, inverse = np.unique(row_devices[mask] * len(part_names) + row_part[mask], return_inverse=True)
+        part_types = database.get_applied_part_types()
+        type_code = {}
+        pair_codes = np.full(len(pairs), -1, dtype=np.int64)
+        for i, pair in enumerate(pairs.tolist()):
+            part_type = part_types.get((device_ids[pair // len(part_names)], part_names[pair % len(part_names)]))
+            if part_type is not None:
+                if part_type not in type_code:
+                    type_code[part_type] = len(part_type_names)
+                    part_type_names.append(part_type)
+                pair_codes[i] = type_code[part_type]
+        codes[mask] = pair_codes[inverse]
+    return codes, part_type_names
+
+
+def _resolve_limit(profile, measure_key, part_type):
+    """Limite nuovo di una misura, o None se non è rivalutabile con il profilo."""
+    test_name, parameter, applied_part = measure_key
+    if profile is None or (applied_part is not None and part_type is None):
+        return None
+    for test in profile.tests:
+        if test.name != test_name or test.is_applied_part_test != (applied_part is not None):
+            continue
+        # Più test con lo stesso nome si distinguono per il parametro (es. NC / SFC)
+        if applied_part is None and (test.parameter or "") != (parameter or ""):
+            continue
+        return test.limit_for(part_type)
+    return None
+
+
+def reevaluate_verifications(profiles, date_from=None, date_to=None, progress_callback=None):
+    """
+    Rivaluta le verifiche (opzionalmente in un intervallo di date) con i profili compilati
+    `profiles` ({profile_key: CompiledProfile}); restituisce un ReevaluationReport.
+    `progress_callback(misure lette)` viene chiamata dopo ogni blocco letto dal database.
+    """
+    start = time.perf_counter()
+    report = ReevaluationReport()
+    verifications = database.get_verifications_for_reevaluation(date_from, date_to)
+    measure_codes, columns = _load_results(date_from, date_to, progress_callback)
+    if columns is None or not verifications:
+        return report
+
+    # Colonne per verifica (ordinate per id) e indice della verifica di ogni misura
+    verification_ids, profile_names, statuses, device_ids = zip(*verifications)
+    verification_ids = np.array(verification_ids, dtype=np.int64)
+    profile_list = sorted(set(profile_names))
+    profile_index = {name: code for code, name in enumerate(profile_list)}
+    verification_profile = np.array([profile_index[name] for name in profile_names], dtype=np.int64)
+    old_verification_passed = np.array([s == profile_engine.STATUS_PASSED for s in statuses], dtype=bool)
+    device_list = sorted(set(device_ids))
+    device_index = {device_id: code for code, device_id in enumerate(device_list)}
+    verification_device = np.array([device_index[d] for d in device_ids], dtype=np.int64)
+    row_verification = np.minimum(np.searchsorted(verification_ids, columns[0]), len(verification_ids) - 1)
+    # Le due letture non sono atomiche: si scartano le misure di verifiche salvate nel frattempo
+    known = verification_ids[row_verification] == columns[0]
+    row_verification_ids, positions, row_measures, values, passed = (column[known] for column in columns)
+    row_verification = row_verification[known]
+
+    measure_keys = list(measure_codes)
+    row_part_types, part_type_names = _part_type_codes(
+        measure_keys, row_measures, verification_device[row_verification], device_list)
+
+    # Limite per combinazione distinta (profilo, misura, tipo di parte), poi esteso a tutte le misure
+    n_measures, n_types = len(measure_keys), len(part_type_names) + 1
+    combos, inverse = np.unique(
+        (verification_profile[row_verification] * n_measures + row_measures) * n_types + row_part_types + 1,
+        return_inverse=True)
+    combo_limits = np.full(len(combos), np.nan)
+    combo_texts = [None] * len(combos)
+    for i, combo in enumerate(combos.tolist()):
+        type_code = combo % n_types - 1
+        measure = combo // n_types % n_measures
+        limit = _resolve_limit(profiles.get(profile_list[combo // n_types // n_measures]), measure_keys[measure],
+                               part_type_names[type_code] if type_code >= 0 else None)
+        if limit is not None:
+            # Senza soglia la misura è sempre conforme
+            combo_limits[i] = np.inf if limit.high_value is None else limit.high_value
+            combo_texts[i] = limit.text
+    limits = combo_limits[inverse]
+
+    evaluable = ~np.isnan(limits) & ~np.isnan(values)
+    new_passed = np.where(evaluable, values <= limits, passed)
+
+    # Esito per verifica: fallita se almeno una misura fallisce
+    failed_count = np.bincount(row_verification, weights=~new_passed, minlength=len(verification_ids))
+    has_results = np.bincount(row_verification, minlength=len(verification_ids)) > 0
+    new_verification_passed = failed_count == 0
+    changed = np.flatnonzero(has_results & (new_verification_passed != old_verification_passed))
+
+    report.verifications = int(np.count_nonzero(has_results))
+    report.measurements = len(row_measures)
+    report.not_evaluated = int(np.count_nonzero(~evaluable))
+
+    if len(changed):
+        # Dettagli (nome, valore, limite nuovo) solo per le misure delle verifiche che cambiano esito
+        changed_ids = verification_ids[changed].tolist()
+        changed_rows = np.flatnonzero(np.isin(row_verification, changed) & (new_passed != passed))
+        results = database.get_results_for_verifications(changed_ids)
+        summaries = database.get_verification_summaries(changed_ids)
+        changed_tests = {}
+        for row in changed_rows.tolist():
+            verification_id = int(row_verification_ids[row])
+            result = results[(verification_id, int(positions[row]))]
+            changed_tests.setdefault(verification_id, []).append(
+                f"{result['name']}: {result['value_text']} ({combo_texts[inverse[row]]})")
+        for position in changed.tolist():
+            verification_id = int(verification_ids[position])
+            summary = summaries[verification_id]
+            report.changes.append(StatusChange(
+                verification_id=verification_id, verification_date=summary['verification_date'],
+                profile_name=summary['profile_name'], serial_number=summary['serial_number'],
+                description=summary['description'], customer_name=summary['customer_name'],
+                old_status=summary['overall_status'],
+                new_status=profile_engine.STATUS_PASSED if new_verification_passed[position] else profile_engine.STATUS_FAILED,
+                changed_tests=changed_tests.get(verification_id, []),
+            ))
+        report.changes.sort(key=lambda c: (c.new_status != profile_engine.STATUS_FAILED, c.verification_date, c.verification_id))
+
+    report.seconds = time.perf_counter() - start
+    logging.info(
+        f"Rivalutazione completata: {report.verifications} verifiche, {report.measurements} misure "
+        f"({report.not_evaluated} non rivalutabili), {len(report.newly_failed)} diventano fallite, "
+        f"{len(report.newly_passed)} diventano superate, in {report.seconds:.2f} s."
+    )
+    return report
+
+
+def write_changes_csv(report, path):
+    """Scrive le verifiche che cambiano esito in un CSV (separatore ';', leggibile da Excel)."""
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(["ID verifica", "Data", "Profilo", "Cliente", "Matricola", "Descrizione",
+                         "Esito registrato", "Nuovo esito", "Misure con esito diverso"])
+        for change in report.changes:
+            writer.writerow([change.verification_id, change.verification_date, change.profile_name,
+                             change.customer_name, change.serial_number, change.description,
+                             change.old_status, change.new_status, " | ".join(change.changed_tests)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rivalutazione delle verifiche con i limiti di un file dei profili.")
+    parser.add_argument("--profiles", default="profiles.json", help="File dei profili con i limiti aggiornati")
+    parser.add_argument("--output", help="File CSV in cui scrivere le verifiche che cambiano esito")
+    parser.add_argument("--db", help="Percorso del database (predefinito: quello dell'applicazione)")
+    parser.add_argument("--from", dest="date_from", help="Solo verifiche da questa data (AAAA-MM-GG)")
+    parser.add_argument("--to", dest="date_to", help="Solo verifiche fino a questa data (AAAA-MM-GG)")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.set_database_path(args.db)
+    profiles = profile_engine.load_profiles(args.profiles)
+    report = reevaluate_verifications(profiles, args.date_from, args.date_to)
+    print(f"{report.verifications} verifiche, {report.measurements} misure rivalutate in {report.seconds:.2f} s "
+          f"({report.not_evaluated} misure non rivalutabili mantengono l'esito registrato).")
+    print(f"Diventano FALLITE: {len(report.newly_failed)}  -  diventano PASSATE: {len(report.newly_passed)}")
+    if args.output:
+        write_changes_csv(report, args.output)
+        print(f"Differenze scritte in {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+# app/report_batch.py
+"""
+Generazione in blocco dei report PDF, indipendente dall'interfaccia Qt.
+
+I PDF vengono prodotti in parallelo da un ProcessPoolExecutor (un processo per core).
+Questo modulo non importa `database` né Qt: i processi figli lo reimportano e
+devono solo poter caricare `report_generator`. In un eseguibile congelato
+(PyInstaller) il punto di ingresso deve chiamare multiprocessing.freeze_support().
+"""
+import json
+import logging
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+
+# Report in coda per ogni processo: tiene occupati i processi senza accodare
+# l'intero lotto, così l'annullamento ha effetto in fretta.
+TASKS_PER_WORKER = 2
+# Intervallo (s) con cui viene controllata la richiesta di annullamento
+CANCEL_POLL_SECONDS = 0.2
+
+_UNSAFE_FILENAME_CHARS = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+@dataclass
+class ReportTask:
+    """Tutto il necessario per generare un report in un processo separato (serializzabile)."""
+    filename: str
+    device_info: dict
+    customer_info: dict
+    mti_info: dict
+    report_settings: dict
+    verification: dict     # date, profilo, esito e campi JSON ancora da decodificare
+    technician_name: str
+
+
+@dataclass
+class ReportBatchStats:
+    total: int = 0
+    generated: int = 0
+    failed: list = field(default_factory=list)   # (file, messaggio di errore)
+    cancelled: bool = False
+
+
+def _safe_filename_part(value):
+    return _UNSAFE_FILENAME_CHARS.sub('_', str(value)).strip('_')
+
+
+def build_report_tasks(rows, output_dir, report_settings):
+    """
+    Prepara un ReportTask per ogni riga di database.get_report_rows().
+    I file si chiamano come quelli del report singolo (Report_<matricola>_<data>.pdf);
+    se più verifiche darebbero lo stesso nome viene aggiunto un numero progressivo.
+    """
+    tasks = []
+    used_names = set()
+    for row in rows:
+        serial = _safe_filename_part(row['serial_number'] or f"ID{row['device_id']}")
+        base_name = f"Report_{serial}_{_safe_filename_part(row['verification_date'])}"
+        name, counter = base_name, 1
+        while name.lower() in used_names:
+            counter += 1
+            name = f"{base_name}_{counter}"
+        used_names.add(name.lower())
+
+        tasks.append(ReportTask(
+            filename=os.path.join(output_dir, f"{name}.pdf"),
+            device_info={
+                'id': row['device_id'], 'customer_id': row['customer_id'],
+                'serial_number': row['serial_number'], 'description': row['description'],
+                'manufacturer': row['manufacturer'], 'model': row['model'],
+                'applied_parts_json': row['applied_parts_json'],
+                'customer_inventory': row['customer_inventory'], 'ams_inventory': row['ams_inventory'],
+                'verification_interval': row['verification_interval'],
+            },
+            customer_info={'id': row['customer_id'], 'name': row['customer_name'], 'address': row['customer_address']},
+            mti_info={
+                'instrument': row['mti_instrument'], 'serial': row['mti_serial'],
+                'version': row['mti_version'], 'cal_date': row['mti_cal_date'],
+            },
+            report_settings=report_settings,
+            verification={
+                'verification_date': row['verification_date'], 'profile_name': row['profile_name'],
+                'overall_status': row['overall_status'], 'results_json': row['results_json'],
+                'visual_inspection_json': row['visual_inspection_json'],
+            },
+            technician_name=row['technician_name'] or "N/D",
+        ))
+    return tasks
+
+
+def render_report(task):
+    """Genera un singolo PDF. Eseguita nei processi figli; restituisce il nome del file."""
+    import report_generator
+
+    verification = task.verification
+    verification_data = {
+        'date': verification['verification_date'],
+        'profile_name': verification['profile_name'],
+        'overall_status': verification['overall_status'],
+        'results': json.loads(verification['results_json']) if verification['results_json'] else [],
+        'visual_inspection_data': json.loads(verification['visual_inspection_json']) if verification['visual_inspection_json'] else {},
+    }
+    report_generator.create_report(task.filename, task.device_info, task.customer_info, task.mti_info,
+                                   task.report_settings, verification_data, task.technician_name)
+    return task.filename
+
+
+def generate_reports(tasks, max_workers=None, progress_callback=None, is_cancelled=None, executor=None):
+    """
+    Genera i report in parallelo e restituisce le statistiche (ReportBatchStats).
+    Con `executor` i report vengono inviati a un pool di processi esistente (es. quello
+    condiviso di app.jobs), che non viene chiuso; altrimenti ne viene creato uno apposta.
+    `progress_callback(completati, totale)` viene chiamata dopo ogni report (riuscito o no);
+    se `is_cancelled()` diventa vera non vengono avviati altri report e quelli in coda
+    vengono scartati: i PDF già in generazione vengono comunque completati.
+    Un errore su un report non interrompe gli altri: finisce in `failed`.
+    """
+    stats = ReportBatchStats(total=len(tasks))
+    if not tasks:
+        return stats
+    max_workers = min(max_workers or os.cpu_count() or 1, len(tasks))
+    pending = iter(tasks)
+    running = {}
+
+    with nullcontext(executor) if executor is not None else ProcessPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            if not stats.cancelled and is_cancelled is not None and is_cancelled():
+                stats.cancelled = True
+                for future in [f for f in running if f.cancel()]:
+                    del running[future]
+            while not stats.cancelled and len(running) < max_workers * TASKS_PER_WORKER:
+                task = next(pending, None)
+                if task is None:
+                    break
+                running[executor.submit(render_report, task)] = task
+            if not running:
+                break
+
+            done, _ = wait(running, timeout=CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                try:
+                    future.result()
+                    stats.generated += 1
+                except Exception as e:
+                    logging.error(f"Errore durante la generazione del report {task.filename}.", exc_info=True)
+                    stats.failed.append((task.filename, str(e)))
+                if progress_callback is not None:
+                    progress_callback(stats.generated + len(stats.failed), stats.total)
+
+    logging.info(
+        f"Generazione report terminata: {stats.generated} generati, {len(stats.failed)} errori"
+        f"{' (annullata)' if stats.cancelled else ''} su {stats.total}."
+    )
+    return stats
@@ -0,0 +1,100 @@
+# app/startup.py
+"""
+Avvio dell'applicazione in fasi misurate.
+
+run_application() è il punto di ingresso della GUI: configura il logging, crea la
+QApplication, applica le migrazioni del database (una sola volta, qui), carica i
+profili di verifica, importa l'interfaccia e mostra la finestra principale.
+I moduli pesanti (pandas, openpyxl, report_generator) non vengono importati
+all'avvio ma al primo utilizzo (importazione da file, generazione dei report).
+
+Con --startup-timing viene stampato, e scritto nel log, il tempo di ogni fase con
+i moduli importati; per il dettaglio modulo per modulo: python -X importtime.
+
+Uso:  python -m app.startup [--startup-timing]
+"""
+import logging
+import multiprocessing
+import sys
+import time
+from contextlib import contextmanager
+
+STARTUP_TIMING_FLAG = "--startup-timing"
+PROFILES_FILE = "profiles.json"
+
+
+class StartupTimer:
+    """Misura le fasi dell'avvio: durata e moduli importati in ciascuna."""
+
+    def __init__(self):
+        self.phases = []    # (nome, secondi, moduli importati, pacchetti di primo livello nuovi)
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        modules_before = set(sys.modules)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            new_modules = set(sys.modules) - modules_before
+            packages = sorted({m.split('.')[0] for m in new_modules if not m.startswith('_')})
+            self.phases.append((name, elapsed, len(new_modules), packages))
+
+    def report(self):
+        lines = [f"{'fase':<24}{'ms':>9}{'moduli':>8}  pacchetti importati"]
+        for name, seconds, module_count, packages in self.phases:
+            shown = ", ".join(packages[:6]) + (f" (+{len(packages) - 6})" if len(packages) > 6 else "")
+            lines.append(f"{name:<24}{seconds * 1000:>9.1f}{module_count:>8}  {shown}")
+        lines.append(f"{'totale':<24}{(time.perf_counter() - self._start) * 1000:>9.1f}")
+        return "\n".join(lines)
+
+
+def run_application(argv=None):
+    """Avvia la GUI e restituisce il codice di uscita dell'applicazione."""
+    argv = list(sys.argv if argv is None else argv)
+    show_timing = STARTUP_TIMING_FLAG in argv
+    if show_timing:
+        argv.remove(STARTUP_TIMING_FLAG)
+    # Necessario per la generazione dei report su più processi in un eseguibile congelato
+    multiprocessing.freeze_support()
+    timer = StartupTimer()
+
+    with timer.phase("logging"):
+        from app.logging_config import setup_logging
+        setup_logging()
+
+    with timer.phase("Qt"):
+        from PySide6.QtWidgets import QApplication, QMessageBox
+        from app import config
+        app = QApplication(argv)
+        app.setStyleSheet(config.STYLESHEET)
+
+    try:
+        with timer.phase("database e migrazioni"):
+            import database
+            database.migrate_database()
+        with timer.phase("profili di verifica"):
+            config.load_verification_profiles(PROFILES_FILE)
+    except Exception as e:
+        logging.critical("Errore durante l'avvio dell'applicazione.", exc_info=True)
+        QMessageBox.critical(None, "Errore di Avvio", f"Impossibile avviare l'applicazione:\n\n{e}")
+        return 1
+
+    with timer.phase("import interfaccia"):
+        from app.ui.main_window import MainWindow
+
+    with timer.phase("finestra principale"):
+        window = MainWindow()
+        window.show()
+
+    if show_timing:
+        report = timer.report()
+        print(report, flush=True)
+        logging.info(f"Tempi di avvio:\n{report}")
+    return app.exec()
+
+
+if __name__ == "__main__":
+    sys.exit(run_application())
@@ -0,0 +1,384 @@
+# app/stm_archive.py
+"""Lettura, scrittura e importazione degli archivi .stm (formato 1.0), indipendenti dall'interfaccia Qt."""
+import codecs
+import gzip
+import itertools
+import json
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+
+import database
+
+STM_FORMAT_VERSION = "1.0"
+# Numero di pacchetti risolti in memoria prima di essere scritti nel database
+STM_IMPORT_BATCH_SIZE = 1000
+# Gli archivi compressi sono normali file gzip (estensione consigliata .stm.gz)
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class StmFormatError(ValueError):
+    """Il file non è un archivio .stm valido o leggibile."""
+
+
+class StmArchiveReader:
+    """
+    Legge un archivio .stm in modo incrementale.
+
+    Iterando sul reader si ottengono i pacchetti dell'array "verifications" uno alla
+    volta, senza caricare l'intero file in memoria. Gli altri campi di primo livello
+    (versione, data di creazione, ...) sono disponibili in `header` man mano che vengono letti.
+    Gli archivi compressi con gzip vengono riconosciuti automaticamente.
+    `progress_callback(bytes_letti, bytes_totali)` viene chiamata dopo ogni blocco letto
+    (per i file compressi i byte sono quelli del file su disco).
+    """
+    CHUNK_SIZE = 64 * 1024
+    # Oltre questa dimensione un singolo valore JSON è considerato malformato
+    MAX_VALUE_CHARS = 32 * 1024 * 1024
+    _WHITESPACE = ' \t\r\n'
+
+    def __init__(self, filepath, progress_callback=None, chunk_size=CHUNK_SIZE):
+        self.filepath = filepath
+        self.progress_callback = progress_callback
+        self.chunk_size = chunk_size
+        self.header = {}
+        self.total_bytes = os.path.getsize(filepath)
+        self.bytes_read = 0
+        self._json = json.JSONDecoder()
+
+    def __iter__(self):
+        with open(self.filepath, 'rb') as raw_file:
+            is_gzip = raw_file.read(2) == GZIP_MAGIC
+            raw_file.seek(0)
+            self._raw_file = raw_file
+            self._file = gzip.GzipFile(fileobj=raw_file, mode='rb') if is_gzip else raw_file
+            self._decoder = codecs.getincrementaldecoder('utf-8-sig')()
+            self._buf = ''
+            self._pos = 0
+            self._eof = False
+            try:
+                yield from self._parse_document()
+            finally:
+                self._file.close()
+
+    # --- Gestione del buffer ---
+
+    def _fill(self):
+        """Legge il blocco successivo nel buffer, scartando la parte già consumata."""
+        if self._eof:
+            return False
+        try:
+            data = self._file.read(self.chunk_size)
+        except (OSError, EOFError) as e:  # es. archivio gzip danneggiato o troncato
+            raise StmFormatError(f"Impossibile leggere l'archivio compresso: {e}") from e
+        self.bytes_read = self._raw_file.tell()
+        if self.progress_callback:
+            self.progress_callback(self.bytes_read, self.total_bytes)
+        try:
+            text = self._decoder.decode(data, final=not data)
+        except UnicodeDecodeError as e:
+            raise StmFormatError(f"Codifica del file non valida: {e}") from e
+        self._eof = not data
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        return not self._eof
+
+    def _peek(self):
+        """Restituisce il prossimo carattere significativo ('' a fine file)."""
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in self._WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill() and self._pos >= len(self._buf):
+                return ''
+
+    def _expect(self, char):
+        found = self._peek()
+        if found != char:
+            raise StmFormatError(f"Atteso '{char}' ma trovato '{found or 'fine del file'}' (byte ~{self.bytes_read}).")
+        self._pos += 1
+
+    def _decode_value(self):
+        """Decodifica il prossimo valore JSON completo presente nel flusso."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buf, self._pos)
+                # Un valore che termina esattamente a fine buffer (es. un numero) potrebbe essere troncato
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self._eof:
+                    raise StmFormatError(f"JSON non valido nell'archivio: {e}") from e
+            if len(self._buf) - self._pos > self.MAX_VALUE_CHARS:
+                raise StmFormatError("Record troppo grande o JSON malformato nell'archivio.")
+            self._fill()
+
+    # --- Struttura del documento ---
+
+    def _parse_document(self):
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._decode_value()
+            if not isinstance(key, str):
+                raise StmFormatError("Chiave di primo livello non valida nell'archivio.")
+            self._expect(':')
+            if key == "verifications":
+                self._check_version()
+                yield from self._parse_array()
+            else:
+                self.header[key] = self._decode_value()
+            separator = self._peek()
+            self._pos += 1
+            if separator == '}':
+                return
+            if separator != ',':
+                raise StmFormatError(f"Separatore non valido '{separator or 'fine del file'}' nell'archivio.")
+
+    def _parse_array(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._decode_value()
+            separator = self._peek()
+            self._pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise StmFormatError(f"Separatore non valido '{separator or 'fine del file'}' nell'elenco delle verifiche.")
+
+    def _check_version(self):
+        version = self.header.get("export_format_version")
+        if version is not None and version != STM_FORMAT_VERSION:
+            raise StmFormatError(f"Versione del formato .stm non supportata: {version} (attesa {STM_FORMAT_VERSION}).")
+
+
+def write_stm_archive(output_path, packages, header=None, compress=False):
+    """
+    Scrive un archivio .stm in streaming: ogni pacchetto viene serializzato e scritto
+    appena prodotto, quindi la memoria usata non dipende dal numero di verifiche.
+    Il file viene scritto in "<output_path>.part" e rinominato solo al termine.
+    Restituisce il numero di pacchetti scritti; se non ce ne sono il file non viene creato.
+    """
+    packages = iter(packages)
+    first_package = next(packages, None)
+    if first_package is None:
+        return 0
+
+    full_header = {
+        "export_format_version": STM_FORMAT_VERSION,
+        "export_creation_date": datetime.now().isoformat(),
+        **(header or {})
+    }
+    temp_path = output_path + ".part"
+    count = 0
+    try:
+        if compress:
+            f = gzip.open(temp_path, 'wt', encoding='utf-8', compresslevel=6)
+        else:
+            f = open(temp_path, 'w', encoding='utf-8')
+        with f:
+            # Stessa impaginazione di json.dump(..., indent=4) usata dalle versioni precedenti
+            f.write("{\n")
+            for key, value in full_header.items():
+                f.write(f"    {json.dumps(key)}: {json.dumps(value)},\n")
+            f.write('    "verifications": [\n')
+            for package in itertools.chain([first_package], packages):
+                if count:
+                    f.write(",\n")
+                f.write("        " + json.dumps(package, indent=4).replace("\n", "\n        "))
+                count += 1
+            f.write("\n    ]\n}")
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return count
+
+
+def export_verifications(date_from, output_path, date_to=None, customer_id=None, compress=False):
+    """
+    Esporta in un archivio .stm le verifiche di una data o di un intervallo di date,
+    opzionalmente di un solo cliente. Restituisce il numero di verifiche esportate
+    (0 se non ce ne sono: in quel caso il file non viene creato).
+    """
+    date_to = date_to or date_from
+    if date_to == date_from:
+        header = {"verifications_for_date": date_from}
+    else:
+        header = {"verifications_date_from": date_from, "verifications_date_to": date_to}
+    if customer_id is not None:
+        customer = database.get_customer_by_id(customer_id)
+        header["customer_filter"] = customer['name'] if customer else customer_id
+
+    logging.info(f"Avvio esportazione in formato STM per il periodo: {date_from} - {date_to} (cliente: {customer_id or 'tutti'})")
+    # Le verifiche vengono lette dal cursore e scritte nel file una alla volta
+    packages = database.iter_verification_packages(date_from, date_to, customer_id)
+    return write_stm_archive(output_path, packages, header, compress=compress)
+
+
+@dataclass
+class StmImportStats:
+    verifications_imported: int = 0
+    verifications_skipped: int = 0
+    devices_created: int = 0
+    customers_created: int = 0
+    cancelled: bool = False     # interrotta dall'utente: i conteggi sono quelli dei blocchi salvati
+
+
+def _as_json_text(value):
+    """I campi *_json dell'archivio sono già testo JSON; altri tipi vengono serializzati."""
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+class StmArchiveImporter:
+    """
+    Importa i pacchetti di verifica di un archivio .stm.
+
+    Clienti, dispositivi e chiavi delle verifiche esistenti vengono caricati una sola
+    volta in dizionari; i pacchetti sono risolti in memoria e i nuovi record scritti
+    con executemany, tutto in un'unica transazione (rollback completo in caso di errore).
+    """
+
+    def __init__(self):
+        self.stats = StmImportStats()
+        self.customer_ids = {}       # nome cliente -> id
+        self.device_ids = {}         # matricola -> id dispositivo
+        self.verification_keys = set()  # (device_id, verification_date, profile_name)
+        self._touched_device_ids = set()  # dispositivi con nuove verifiche o appena creati
+        self._reset_batch()
+
+    def _reset_batch(self):
+        self._new_customers = {}     # nome -> indirizzo
+        self._new_devices = {}       # matricola -> (nome cliente, campi dispositivo)
+        self._pending = []           # (matricola, data, profilo, altri campi della verifica)
+        self._pending_keys = set()   # (matricola, data, profilo) in attesa di scrittura
+        self._staged = 0
+
+    def import_packages(self, packages, batch_size=None, is_cancelled=None):
+        """
+        Importa tutti i pacchetti e restituisce le statistiche (StmImportStats).
+        Con `batch_size` i pacchetti vengono scritti a blocchi (sempre nella stessa
+        transazione), così un iterabile in streaming non viene mai accumulato in memoria.
+        Dopo ogni blocco viene controllato `is_cancelled()`: se vera l'importazione si ferma
+        e i blocchi già scritti vengono salvati (stats.cancelled).
+        """
+        with database.transaction():
+            self._preload()
+            for package in packages:
+                self._stage(package)
+                if batch_size and self._staged >= batch_size:
+                    self._flush()
+                    if is_cancelled is not None and is_cancelled():
+                        self.stats.cancelled = True
+                        break
+            self._flush()
+            # Le scadenze seguono le verifiche appena importate
+            database.recompute_next_verification_dates(self._touched_device_ids)
+        logging.info(
+            f"Importazione archivio {'annullata' if self.stats.cancelled else 'completata'}: "
+            f"{self.stats.verifications_imported} verifiche importate, "
+            f"{self.stats.verifications_skipped} saltate, {self.stats.devices_created} nuovi dispositivi, "
+            f"{self.stats.customers_created} nuovi clienti."
+        )
+        return self.stats
+
+    def _preload(self):
+        self.customer_ids = database.get_customer_ids_by_name()
+        self.device_ids = database.get_device_ids_by_serial()
+        self.verification_keys = database.get_verification_keys()
+
+    def _stage(self, package):
+        """Risolve un pacchetto rispetto alle mappe in memoria, senza scrivere nel database."""
+        self._staged += 1
+        try:
+            customer_data = package['customer']
+            device_data = package['device']
+            details = package['verification_details']
+            customer_name = customer_data['name']
+            serial = device_data['serial_number']
+            verif_date = details['verification_date']
+            verif_profile = details['profile_name']
+            if not customer_name or not serial:
+                raise ValueError("Nome cliente o matricola mancante.")
+            mti_info = details.get('mti_info') or {}
+            verification_fields = (
+                _as_json_text(details['results_json']),
+                details['overall_status'],
+                _as_json_text(details.get('visual_inspection_json')),
+                mti_info.get('instrument'),
+                mti_info.get('serial'),
+                mti_info.get('version'),
+                mti_info.get('cal_date'),
+                details.get('technician_name'),
+            )
+            device_fields = (
+                device_data.get('description'),
+                device_data.get('manufacturer'),
+                device_data.get('model'),
+                _as_json_text(device_data.get('applied_parts_json')) or '[]',
+                device_data.get('customer_inventory'),
+                device_data.get('ams_inventory'),
+                device_data.get('verification_interval'),
+            )
+        except (KeyError, TypeError, AttributeError, ValueError):
+            logging.error("Record di verifica non valido nell'archivio: saltato.", exc_info=True)
+            self.stats.verifications_skipped += 1
+            return
+
+        # --- 1. Gestione Cliente ---
+        if customer_name not in self.customer_ids and customer_name not in self._new_customers:
+            self._new_customers[customer_name] = customer_data.get('address', '')
+
+        # --- 2. Gestione Dispositivo ---
+        device_id = self.device_ids.get(serial)
+        if device_id is None and serial not in self._new_devices:
+            self._new_devices[serial] = (customer_name, device_fields)
+
+        # --- 3. Gestione Verifica ---
+        pending_key = (serial, verif_date, verif_profile)
+        if pending_key in self._pending_keys or (device_id is not None and (device_id, verif_date, verif_profile) in self.verification_keys):
+            self.stats.verifications_skipped += 1
+            logging.debug(f"Verifica del {verif_date} per S/N {serial} già esistente. Saltata.")
+            return
+        self._pending_keys.add(pending_key)
+        self._pending.append((serial, verif_date, verif_profile, verification_fields))
+
+    def _flush(self):
+        """Scrive in blocco clienti, dispositivi e verifiche risolti finora."""
+        if self._new_customers:
+            database.add_customers_bulk(list(self._new_customers.items()))
+            self.customer_ids.update(database.get_customer_ids_by_name(self._new_customers))
+            self.stats.customers_created += len(self._new_customers)
+
+        if self._new_devices:
+            database.add_devices_bulk([
+                (self.customer_ids[customer_name], serial, *device_fields)
+                for serial, (customer_name, device_fields) in self._new_devices.items()
+            ])
+            self.device_ids.update(database.get_device_ids_by_serial(self._new_devices))
+            self._touched_device_ids.update(self.device_ids[serial] for serial in self._new_devices)
+            self.stats.devices_created += len(self._new_devices)
+
+        if self._pending:
+            rows = []
+            for serial, verif_date, verif_profile, verification_fields in self._pending:
+                device_id = self.device_ids[serial]
+                self.verification_keys.add((device_id, verif_date, verif_profile))
+                self._touched_device_ids.add(device_id)
+                rows.append((device_id, verif_date, verif_profile, *verification_fields))
+            database.add_verifications_bulk(rows)
+            self.stats.verifications_imported += len(rows)
+
+        self._reset_batch()
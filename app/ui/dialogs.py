@@ -1,36 +1,40 @@
 # app/ui/dialogs.py
 import json
 import logging
-import pandas as pd
 from datetime import datetime
 
 from PySide6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QLineEdit, QComboBox, QTableWidget, QTableWidgetItem,
     QGroupBox, QFormLayout, QDialog, QDialogButtonBox, QMessageBox,
     QAbstractItemView, QFileDialog, QCheckBox, QTextEdit, QStyle, QHeaderView,
-    QProgressDialog, QCalendarWidget)
-from PySide6.QtCore import Qt, QThread, QDate, QSettings
+    QProgressDialog, QDateEdit, QTableView)
+from PySide6.QtCore import Qt, QThread, QDate, QSettings, QTimer, Signal
 from PySide6.QtGui import QColor
 
 # Import locali dai nuovi moduli
 from app.data_models import AppliedPart
+from app.device_import import IMPORT_FIELDS, REQUIRED_IMPORT_FIELDS, auto_mapping, read_import_file
+from app.ui.table_models import LazyRowTableModel, TABLE_PAGE_SIZE
 # Assumiamo che i worker siano in file separati come definito
-from app.workers.import_worker import ImportWorker
 from app.workers.export_worker import DailyExportWorker
+from app.workers.report_batch_worker import ReportBatchWorker
 from app.workers.stm_import_worker import StmImportWorker # Modificheremo questo per gestire entrambi i casi
+from app.workers.search_worker import SearchWorker, SEARCH_CUSTOMERS, SEARCH_DEVICES
 import database
-import report_generator
+
+# Attesa dopo l'ultima digitazione prima di avviare una ricerca (ms)
+SEARCH_DEBOUNCE_MS = 250
 
 # --- Finestre di Dialogo di Supporto ---
 
 class ImportReportDialog(QDialog):
     """Finestra che mostra un report dettagliato (es. righe ignorate)."""
-    def __init__(self, title, report_details, parent=None):
+    def __init__(self, title, report_details, parent=None, message="Le seguenti righe del file non sono state importate:"):
         super().__init__(parent)
         self.setWindowTitle(title)
         self.setMinimumSize(600, 400)
         layout = QVBoxLayout(self)
-        label = QLabel("Le seguenti righe del file non sono state importate:")
+        label = QLabel(message)
         layout.addWidget(label)
         text_edit = QTextEdit()
         text_edit.setReadOnly(True)
@@ -40,23 +44,71 @@ class ImportReportDialog(QDialog):
         close_button.clicked.connect(self.accept)
         layout.addWidget(close_button, 0, Qt.AlignRight)
 
-class DateSelectionDialog(QDialog):
-    """Finestra di dialogo per la selezione di una singola data."""
-    def __init__(self, parent=None):
+class ExportOptionsDialog(QDialog):
+    """Finestra di dialogo per scegliere intervallo di date, cliente e compressione dell'esportazione."""
+    def __init__(self, customer_name=None, parent=None):
         super().__init__(parent)
-        self.setWindowTitle("Seleziona Data")
-        layout = QVBoxLayout(self)
-        self.calendar = QCalendarWidget(self)
-        self.calendar.setGridVisible(True)
-        self.calendar.setSelectedDate(QDate.currentDate())
-        layout.addWidget(self.calendar)
+        self.setWindowTitle("Opzioni Esportazione Verifiche")
+        layout = QFormLayout(self)
+        self.date_from_edit = QDateEdit(QDate.currentDate()); self.date_from_edit.setCalendarPopup(True); self.date_from_edit.setDisplayFormat("dd/MM/yyyy")
+        self.date_to_edit = QDateEdit(QDate.currentDate()); self.date_to_edit.setCalendarPopup(True); self.date_to_edit.setDisplayFormat("dd/MM/yyyy")
+        self.date_from_edit.dateChanged.connect(lambda d: self.date_to_edit.setMinimumDate(d))
+        layout.addRow("Dal:", self.date_from_edit)
+        layout.addRow("Al:", self.date_to_edit)
+        self.customer_checkbox = QCheckBox(f"Solo il cliente '{customer_name}'" if customer_name else "Solo il cliente selezionato")
+        self.customer_checkbox.setEnabled(customer_name is not None)
+        layout.addRow(self.customer_checkbox)
+        self.compress_checkbox = QCheckBox("Comprimi il file (.stm.gz)")
+        layout.addRow(self.compress_checkbox)
         buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
         buttons.accepted.connect(self.accept)
         buttons.rejected.connect(self.reject)
-        layout.addWidget(buttons)
-    
-    def getSelectedDate(self):
-        return self.calendar.selectedDate().toString("yyyy-MM-dd")
+        layout.addRow(buttons)
+
+    def get_options(self):
+        return {
+            "date_from": self.date_from_edit.date().toString("yyyy-MM-dd"),
+            "date_to": self.date_to_edit.date().toString("yyyy-MM-dd"),
+            "only_customer": self.customer_checkbox.isChecked(),
+            "compress": self.compress_checkbox.isChecked()
+        }
+
+class ReportBatchOptionsDialog(QDialog):
+    """Finestra di dialogo per scegliere le verifiche di cui generare i report PDF in blocco."""
+    def __init__(self, customer_name=None, device_description=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Genera Report in Blocco")
+        layout = QFormLayout(self)
+        self.date_checkbox = QCheckBox("Solo le verifiche del periodo")
+        self.date_checkbox.setChecked(True)
+        layout.addRow(self.date_checkbox)
+        self.date_from_edit = QDateEdit(QDate.currentDate()); self.date_from_edit.setCalendarPopup(True); self.date_from_edit.setDisplayFormat("dd/MM/yyyy")
+        self.date_to_edit = QDateEdit(QDate.currentDate()); self.date_to_edit.setCalendarPopup(True); self.date_to_edit.setDisplayFormat("dd/MM/yyyy")
+        self.date_from_edit.dateChanged.connect(lambda d: self.date_to_edit.setMinimumDate(d))
+        self.date_checkbox.toggled.connect(self.date_from_edit.setEnabled)
+        self.date_checkbox.toggled.connect(self.date_to_edit.setEnabled)
+        layout.addRow("Dal:", self.date_from_edit)
+        layout.addRow("Al:", self.date_to_edit)
+        self.customer_checkbox = QCheckBox(f"Solo il cliente '{customer_name}'" if customer_name else "Solo il cliente selezionato")
+        self.customer_checkbox.setEnabled(customer_name is not None)
+        self.customer_checkbox.setChecked(customer_name is not None)
+        layout.addRow(self.customer_checkbox)
+        self.device_checkbox = QCheckBox(f"Solo il dispositivo '{device_description}'" if device_description else "Solo il dispositivo selezionato")
+        self.device_checkbox.setEnabled(device_description is not None)
+        layout.addRow(self.device_checkbox)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def get_options(self):
+        use_dates = self.date_checkbox.isChecked()
+        return {
+            "date_from": self.date_from_edit.date().toString("yyyy-MM-dd") if use_dates else None,
+            "date_to": self.date_to_edit.date().toString("yyyy-MM-dd") if use_dates else None,
+            "only_customer": self.customer_checkbox.isChecked(),
+            "only_device": self.device_checkbox.isChecked()
+        }
 
 class MappingDialog(QDialog):
     """Finestra di dialogo per mappare le colonne del file con i campi del DB."""
@@ -64,16 +116,7 @@ class MappingDialog(QDialog):
         super().__init__(parent)
         self.setWindowTitle("Mappatura Colonne Importazione")
         self.setMinimumWidth(450)
-        self.required_fields = {
-            'matricola': 'Matricola (S/N)', 
-            'descrizione': 'Descrizione',
-            'costruttore': 'Costruttore', 
-            'modello': 'Modello',
-            'reparto': 'Reparto (Opzionale)', 
-            'inv_cliente': 'Inventario Cliente (Opzionale)',
-            'inv_ams': 'Inventario AMS (Opzionale)',
-            'verification_interval': 'Intervallo Verifica (Mesi, Opzionale)'
-        }
+        self.required_fields = IMPORT_FIELDS
         self.file_columns = ["<Nessuna>"] + file_columns
         self.combo_boxes = {}
         layout = QVBoxLayout(self)
@@ -95,17 +138,15 @@ class MappingDialog(QDialog):
         self.try_auto_mapping()
 
     def try_auto_mapping(self):
-        for key, combo in self.combo_boxes.items():
-            for i, col_name in enumerate(self.file_columns):
-                if key.replace("_", "") in col_name.lower().replace(" ", "").replace("/", ""):
-                    combo.setCurrentIndex(i); break
+        for key, col_name in auto_mapping(self.file_columns[1:]).items():
+            self.combo_boxes[key].setCurrentText(col_name)
 
     def get_mapping(self):
         mapping = {}
         for key, combo in self.combo_boxes.items():
             selected_col = combo.currentText()
             if selected_col != "<Nessuna>": mapping[key] = selected_col
-        if 'matricola' not in mapping or 'descrizione' not in mapping:
+        if any(key not in mapping for key in REQUIRED_IMPORT_FIELDS):
             QMessageBox.warning(self, "Campi Mancanti", "Assicurati di aver mappato almeno i campi Matricola e Descrizione.")
             return None
         return mapping
@@ -267,11 +308,15 @@ class VerificationViewerDialog(QDialog):
             if visual_data.get('notes'): visual_layout.addWidget(QLabel(f"\n<b>Note:</b> {visual_data['notes']}"))
             visual_group.setLayout(visual_layout); layout.addWidget(visual_group)
         results_table = QTableWidget(); results_table.setColumnCount(4); results_table.setHorizontalHeaderLabels(["Test / P.A.", "Limite", "Valore", "Esito"]); layout.addWidget(results_table)
-        results = json.loads(verification_data['results_json'])
+        # Risultati dalla tabella normalizzata; results_json solo se non ci sono righe
+        results = [{'name': r['name'], 'limit': r['limit_text'], 'value': r['value_text'], 'passed': bool(r['passed'])}
+                   for r in database.get_verification_results(verification_data['id'])]
+        if not results and verification_data['results_json']:
+            results = json.loads(verification_data['results_json'])
         for res in results:
             row = results_table.rowCount(); results_table.insertRow(row)
             results_table.setItem(row, 0, QTableWidgetItem(res['name'])); results_table.setItem(row, 1, QTableWidgetItem(res['limit']))
-            results_table.setItem(row, 2, QTableWidgetItem(res['value']))
+            results_table.setItem(row, 2, QTableWidgetItem(str(res['value'])))
             is_passed = res['passed']; passed_item = QTableWidgetItem("PASSATO" if is_passed else "FALLITO")
             passed_item.setBackground(QColor('#D4EDDA') if is_passed else QColor('#F8D7DA')); results_table.setItem(row, 3, passed_item)
         results_table.resizeColumnsToContents()
@@ -279,11 +324,21 @@ class VerificationViewerDialog(QDialog):
 
 
 # --- CLASSE DB MANAGER ---
+def verification_status_color(verification, key):
+    """Colore di sfondo della colonna esito nello storico verifiche."""
+    if key == 'overall_status':
+        return '#D4EDDA' if verification['overall_status'] == 'PASSATO' else '#F8D7DA'
+    return None
+
 class DbManagerDialog(QDialog):
+    # Richiesta di ricerca al SearchWorker: (tipo, id richiesta, testo, id cliente o 0)
+    search_requested = Signal(str, int, str, int)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.main_window = parent
         self.setWindowTitle("Gestione Anagrafiche")
+        self._active_workers = set()    # worker avviati con start_worker e non ancora terminati
     
         main_layout = QVBoxLayout(self)
         main_layout.setContentsMargins(15, 15, 15, 15)
@@ -310,6 +365,11 @@ class DbManagerDialog(QDialog):
         self.export_daily_button.setIcon(QApplication.style().standardIcon(QStyle.SP_DialogSaveButton))
         self.export_daily_button.clicked.connect(self.export_daily_verifications)
         top_actions_layout.addWidget(self.export_daily_button)
+
+        self.report_batch_button = QPushButton("Genera Report in Blocco...")
+        self.report_batch_button.setIcon(QApplication.style().standardIcon(QStyle.SP_FileDialogDetailedView))
+        self.report_batch_button.clicked.connect(self.generate_batch_reports)
+        top_actions_layout.addWidget(self.report_batch_button)
         
         top_actions_layout.addStretch()
         main_layout.addLayout(top_actions_layout)
@@ -322,11 +382,15 @@ class DbManagerDialog(QDialog):
         self.customer_search_box = QLineEdit()
         self.customer_search_box.setPlaceholderText("Cerca cliente per nome...")
         self.customer_search_box.textChanged.connect(self.filter_customers)
-        self.customer_table = QTableWidget(0, 5)
-        self.customer_table.setHorizontalHeaderLabels(["ID", "Nome", "Indirizzo", "Telefono", "Email"])
+        # Le tabelle sono viste su modelli che leggono il database a pagine durante lo scorrimento
+        self.customer_model = LazyRowTableModel([('id', "ID"), ('name', "Nome"), ('address', "Indirizzo"), ('phone', "Telefono"), ('email', "Email")], parent=self)
+        self.customer_table = QTableView()
+        self.customer_table.setModel(self.customer_model)
         self.customer_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.customer_table.setSelectionMode(QAbstractItemView.SingleSelection)
         self.customer_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
-        self.customer_table.itemSelectionChanged.connect(self.customer_selected)
+        self.customer_table.verticalHeader().setVisible(False)
+        self.customer_table.selectionModel().selectionChanged.connect(self.customer_selected)
         header_clienti = self.customer_table.horizontalHeader()
         header_clienti.setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents) # ID
         header_clienti.setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)         # Nome
@@ -356,11 +420,15 @@ class DbManagerDialog(QDialog):
         self.device_search_box = QLineEdit()
         self.device_search_box.setPlaceholderText("Cerca per descrizione, S/N, modello...")
         self.device_search_box.textChanged.connect(self.filter_devices)
-        self.device_table = QTableWidget(0, 7)
-        self.device_table.setHorizontalHeaderLabels(["ID", "Descrizione", "S/N", "Costruttore", "Modello", "Inv. Cliente", "Inv. AMS"])
+        self.device_model = LazyRowTableModel([('id', "ID"), ('description', "Descrizione"), ('serial_number', "S/N"), ('manufacturer', "Costruttore"),
+                                               ('model', "Modello"), ('customer_inventory', "Inv. Cliente"), ('ams_inventory', "Inv. AMS")], parent=self)
+        self.device_table = QTableView()
+        self.device_table.setModel(self.device_model)
         self.device_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.device_table.setSelectionMode(QAbstractItemView.SingleSelection)
         self.device_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
-        self.device_table.itemSelectionChanged.connect(self.device_selected)
+        self.device_table.verticalHeader().setVisible(False)
+        self.device_table.selectionModel().selectionChanged.connect(self.device_selected)
         header_dispositivi = self.device_table.horizontalHeader()
         header_dispositivi.setSectionResizeMode(0, QHeaderView.ResizeMode.Interactive)
         header_dispositivi.setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents)
@@ -381,10 +449,14 @@ class DbManagerDialog(QDialog):
 
         self.verifications_group = QGroupBox("Storico Verifiche")
         verif_layout = QVBoxLayout()
-        self.verifications_table = QTableWidget(0, 3)
-        self.verifications_table.setHorizontalHeaderLabels(["ID", "Data", "Esito Globale"])
+        self.verifications_model = LazyRowTableModel([('id', "ID"), ('verification_date', "Data"), ('overall_status', "Esito Globale")],
+                                                     background=verification_status_color, parent=self)
+        self.verifications_table = QTableView()
+        self.verifications_table.setModel(self.verifications_model)
         self.verifications_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.verifications_table.setSelectionMode(QAbstractItemView.SingleSelection)
         self.verifications_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.verifications_table.verticalHeader().setVisible(False)
         verif_buttons_layout = QHBoxLayout()
         self.view_verif_btn = QPushButton("Visualizza Dettagli")
         self.view_verif_btn.setIcon(QApplication.style().standardIcon(QStyle.SP_FileDialogInfoView))
@@ -399,8 +471,109 @@ class DbManagerDialog(QDialog):
         verif_layout.addLayout(verif_buttons_layout)
         self.verifications_group.setLayout(verif_layout)
         main_layout.addWidget(self.verifications_group)
+        self.setup_search_worker()
         self.load_customers_table()
 
+    def setup_search_worker(self):
+        """
+        Le ricerche digitate nei campi di filtro girano in un thread dedicato: un timer
+        di debounce attende la fine della digitazione e solo i risultati dell'ultima
+        richiesta vengono applicati alle tabelle.
+        """
+        self._search_ids = {SEARCH_CUSTOMERS: 0, SEARCH_DEVICES: 0}
+        self._search_params = {SEARCH_CUSTOMERS: ('', None), SEARCH_DEVICES: ('', None)}
+        self.search_thread = QThread(self)
+        self.search_worker = SearchWorker(page_size=TABLE_PAGE_SIZE)
+        self.search_worker.moveToThread(self.search_thread)
+        self.search_requested.connect(self.search_worker.search)
+        self.search_worker.results_ready.connect(self.on_search_results)
+        self.search_worker.error.connect(self.on_search_error)
+        self.search_thread.finished.connect(self.search_worker.deleteLater)
+        self.search_thread.start()
+        self.finished.connect(self.stop_search_worker)
+
+        self.customer_search_timer = QTimer(self)
+        self.customer_search_timer.setSingleShot(True)
+        self.customer_search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.customer_search_timer.timeout.connect(self.start_customer_search)
+        self.device_search_timer = QTimer(self)
+        self.device_search_timer.setSingleShot(True)
+        self.device_search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.device_search_timer.timeout.connect(self.start_device_search)
+
+    def start_worker(self, worker, progress_dialog=None):
+        """
+        Avvia un worker (JobAdapter) sullo scheduler condiviso: importazioni, esportazioni e
+        report procedono insieme, o restano in coda se lo scheduler è occupato. Il worker
+        resta referenziato finché il suo job non termina.
+        """
+        self._active_workers.add(worker)
+        if progress_dialog is not None:
+            worker.progress_updated.connect(progress_dialog.setValue)
+            progress_dialog.canceled.connect(worker.cancel)
+            worker.done.connect(progress_dialog.close)
+            progress_dialog.show()
+        worker.done.connect(lambda: self.on_worker_done(worker))
+        worker.start()
+        self.update_jobs_title()
+
+    def on_worker_done(self, worker):
+        self._active_workers.discard(worker)
+        self.update_jobs_title()
+
+    def update_jobs_title(self):
+        count = len(self._active_workers)
+        if not count:
+            self.setWindowTitle("Gestione Anagrafiche")
+        else:
+            self.setWindowTitle(f"Gestione Anagrafiche ({count} {'operazione' if count == 1 else 'operazioni'} in corso...)")
+
+    def stop_search_worker(self):
+        self.customer_search_timer.stop()
+        self.device_search_timer.stop()
+        self.search_thread.quit()
+        self.search_thread.wait()
+
+    def _next_search_id(self, kind):
+        """Nuovo id per il tipo di ricerca: i risultati con id precedenti verranno ignorati."""
+        self._search_ids[kind] += 1
+        self.search_worker.supersede(kind, self._search_ids[kind])
+        return self._search_ids[kind]
+
+    def start_customer_search(self):
+        request_id = self._next_search_id(SEARCH_CUSTOMERS)
+        search_text = self.customer_search_box.text()
+        self._search_params[SEARCH_CUSTOMERS] = (search_text, None)
+        self.search_requested.emit(SEARCH_CUSTOMERS, request_id, search_text, 0)
+
+    def start_device_search(self):
+        customer_id = self.selected_customer_id()
+        if customer_id is None:
+            return
+        request_id = self._next_search_id(SEARCH_DEVICES)
+        search_text = self.device_search_box.text()
+        self._search_params[SEARCH_DEVICES] = (search_text, customer_id)
+        self.search_requested.emit(SEARCH_DEVICES, request_id, search_text, customer_id)
+
+    def on_search_results(self, kind, request_id, rows):
+        if request_id != self._search_ids[kind]:
+            return  # Superata da una ricerca più recente
+        # Il worker ha letto la prima pagina; le successive le carica il modello
+        search_text, customer_id = self._search_params[kind]
+        if kind == SEARCH_CUSTOMERS:
+            self.fill_customers_table(search_text, first_page=rows)
+        else:
+            self.fill_devices_table(customer_id, search_text, first_page=rows)
+
+    def on_search_error(self, kind, error_message):
+        QMessageBox.critical(self, "Errore Ricerca", f"Impossibile completare la ricerca:\n{error_message}")
+
+    def selected_customer_id(self):
+        selected_rows = self.customer_table.selectionModel().selectedRows()
+        if not selected_rows:
+            return None
+        return self.customer_model.row_at(selected_rows[0].row())['id']
+
     def create_buttons(self, add_text, edit_text, del_text, add_fn, edit_fn, del_fn):
         layout = QHBoxLayout(); add = QPushButton(add_text); add.setIcon(QApplication.style().standardIcon(QStyle.SP_FileDialogNewFolder)); add.clicked.connect(add_fn)
         edit = QPushButton(edit_text); edit.setIcon(QApplication.style().standardIcon(QStyle.SP_DialogApplyButton)); edit.clicked.connect(edit_fn)
@@ -412,35 +585,33 @@ class DbManagerDialog(QDialog):
         if not selected_rows:
             QMessageBox.warning(self, "Cliente non Selezionato", "Per favore, seleziona un cliente dalla tabella prima di importare i dispositivi.")
             return
-        selected_customer_id = int(self.customer_table.item(selected_rows[0].row(), 0).text())
-        selected_customer_name = self.customer_table.item(selected_rows[0].row(), 1).text()
+        selected_customer_id = self.customer_model.row_at(selected_rows[0].row())['id']
+        selected_customer_name = self.customer_model.row_at(selected_rows[0].row())['name']
         reply = QMessageBox.question(self, 'Conferma Importazione', f"Stai per importare i dispositivi per il cliente:\n\n<b>{selected_customer_name}</b>\n\nVuoi continuare?", QMessageBox.Yes | QMessageBox.No)
         if reply == QMessageBox.No: return
         filename, _ = QFileDialog.getOpenFileName(self, "Seleziona File da Importare", "", "File Excel/CSV (*.xlsx *.csv)")
         if not filename: return
+        # pandas (e openpyxl per i file Excel) viene caricato solo qui, alla prima importazione
+        from app.workers.import_worker import ImportWorker
         try:
-            df_headers = pd.read_csv(filename, sep=';', dtype=str, nrows=0) if filename.endswith('.csv') else pd.read_excel(filename, dtype=str, nrows=0)
-            file_columns = df_headers.columns.tolist()
+            file_columns = read_import_file(filename, header_only=True).columns.tolist()
         except Exception as e:
             QMessageBox.critical(self, "Errore Lettura File", f"Impossibile leggere le intestazioni dal file:\n{e}"); return
         map_dialog = MappingDialog(file_columns, self)
         if map_dialog.exec() == QDialog.Accepted:
             mapping = map_dialog.get_mapping()
             if mapping is None: return
-            self.progress_dialog = QProgressDialog("Importazione dei dati...", "Annulla", 0, 100, self)
-            self.progress_dialog.setWindowModality(Qt.WindowModal); self.progress_dialog.setWindowTitle("Importazione in Corso"); self.progress_dialog.setValue(0)
-            self.thread = QThread(); self.worker = ImportWorker(filename, mapping, selected_customer_id)
-            self.worker.moveToThread(self.thread)
-            self.worker.progress_updated.connect(self.progress_dialog.setValue); self.progress_dialog.canceled.connect(self.worker.cancel)
-            self.thread.started.connect(self.worker.run); self.worker.finished.connect(self.on_import_finished); self.worker.error.connect(self.on_import_error)
-            self.worker.finished.connect(self.thread.quit); self.worker.finished.connect(self.worker.deleteLater); self.thread.finished.connect(self.thread.deleteLater)
-            self.thread.finished.connect(self.progress_dialog.close)
-            self.thread.start(); self.progress_dialog.exec()
+            progress_dialog = QProgressDialog("Importazione dei dati...", "Annulla", 0, 100, self)
+            progress_dialog.setWindowTitle("Importazione in Corso"); progress_dialog.setValue(0)
+            worker = ImportWorker(filename, mapping, selected_customer_id)
+            worker.finished.connect(self.on_import_finished); worker.error.connect(self.on_import_error)
+            self.start_worker(worker, progress_dialog)
 
     def on_import_finished(self, added_count, skipped_rows_details, status):
         self.load_customers_table()
         if status == "Annullato":
-            QMessageBox.warning(self, "Importazione Annullata", "L'operazione di importazione è stata annullata dall'utente."); return
+            QMessageBox.warning(self, "Importazione Annullata",
+                                f"L'operazione di importazione è stata annullata dall'utente.\n\nDispositivi già aggiunti: {added_count}"); return
         skipped_count = len(skipped_rows_details)
         summary_message = f"Importazione terminata.\n\n- Dispositivi aggiunti: {added_count}\n- Righe ignorate: {skipped_count}"
         msg_box = QMessageBox(self); msg_box.setWindowTitle("Importazione Completata"); msg_box.setText(summary_message)
@@ -454,77 +625,112 @@ class DbManagerDialog(QDialog):
             msg_box.exec()
 
     def on_import_error(self, error_message):
-        self.progress_dialog.close(); QMessageBox.critical(self, "Errore Importazione", error_message)
+        QMessageBox.critical(self, "Errore Importazione", error_message)
 
     def export_daily_verifications(self):
-        date_dialog = DateSelectionDialog(self)
-        if date_dialog.exec() == QDialog.Accepted:
-            target_date = date_dialog.getSelectedDate()
+        selected_rows = self.customer_table.selectionModel().selectedRows()
+        customer_id = self.customer_model.row_at(selected_rows[0].row())['id'] if selected_rows else None
+        customer_name = self.customer_model.row_at(selected_rows[0].row())['name'] if selected_rows else None
+
+        options_dialog = ExportOptionsDialog(customer_name, self)
+        if options_dialog.exec() == QDialog.Accepted:
+            options = options_dialog.get_options()
+            date_from, date_to = options["date_from"], options["date_to"]
             
-            default_filename = f"Export_Verifiche_{target_date.replace('-', '')}.stm"
-            output_path, _ = QFileDialog.getSaveFileName(self, "Salva Esportazione Verifiche per Data", default_filename, "File Safety Test Manager (*.stm)")
+            period = date_from.replace('-', '') if date_from == date_to else f"{date_from.replace('-', '')}-{date_to.replace('-', '')}"
+            extension = ".stm.gz" if options["compress"] else ".stm"
+            default_filename = f"Export_Verifiche_{period}{extension}"
+            file_filter = "Archivio compresso (*.stm.gz)" if options["compress"] else "File Safety Test Manager (*.stm)"
+            output_path, _ = QFileDialog.getSaveFileName(self, "Salva Esportazione Verifiche", default_filename, file_filter)
 
             if not output_path:
-                logging.info("Esportazione giornaliera annullata dall'utente.")
+                logging.info("Esportazione annullata dall'utente.")
                 return
 
-            self.export_thread = QThread()
-            # Assumiamo che il worker si chiami DailyExportWorker come definito prima
-            self.export_worker = DailyExportWorker(target_date, output_path)
-            self.export_worker.moveToThread(self.export_thread)
-            
-            self.export_thread.started.connect(self.export_worker.run)
-            self.export_worker.finished.connect(self.on_export_finished)
-            self.export_worker.error.connect(self.on_export_error)
-            
-            self.export_worker.finished.connect(self.export_thread.quit)
-            self.export_worker.finished.connect(self.export_worker.deleteLater)
-            self.export_thread.finished.connect(self.export_thread.deleteLater)
-            
-            self.export_thread.start()
-            
-            # --- CORREZIONE QUI ---
-            self.export_daily_button.setEnabled(False)
-            self.setWindowTitle("Manager Anagrafiche (Esportazione in corso...)")
+            worker = DailyExportWorker(date_from, output_path, end_date=date_to,
+                                       customer_id=customer_id if options["only_customer"] else None,
+                                       compress=options["compress"])
+            worker.finished.connect(self.on_export_finished)
+            worker.error.connect(self.on_export_error)
+            self.start_worker(worker)
 
     def on_export_finished(self, status, message):
-        self.setWindowTitle("Manager Anagrafiche")
-        # --- CORREZIONE QUI ---
-        self.export_daily_button.setEnabled(True)
         if status == "Success":
             QMessageBox.information(self, "Esportazione Completata", message)
         else:
             QMessageBox.warning(self, "Esportazione", message)
 
     def on_export_error(self, error_message):
-        self.setWindowTitle("Manager Anagrafiche")
-        # --- CORREZIONE QUI ---
-        self.export_daily_button.setEnabled(True)
         QMessageBox.critical(self, "Errore Esportazione", error_message)
 
-    def filter_customers(self): self.load_customers_table(self.customer_search_box.text())
-    def filter_devices(self): self.customer_selected()
+    def generate_batch_reports(self):
+        selected_rows = self.customer_table.selectionModel().selectedRows()
+        customer = self.customer_model.row_at(selected_rows[0].row()) if selected_rows else None
+        selected_dev_rows = self.device_table.selectionModel().selectedRows()
+        device = self.device_model.row_at(selected_dev_rows[0].row()) if selected_dev_rows else None
+
+        options_dialog = ReportBatchOptionsDialog(customer['name'] if customer else None, device['description'] if device else None, self)
+        if options_dialog.exec() != QDialog.Accepted:
+            return
+        options = options_dialog.get_options()
+        output_dir = QFileDialog.getExistingDirectory(self, "Cartella di Destinazione dei Report")
+        if not output_dir:
+            return
+
+        progress_dialog = QProgressDialog("Generazione dei report PDF...", "Annulla", 0, 100, self)
+        progress_dialog.setWindowTitle("Generazione Report in Corso"); progress_dialog.setValue(0)
+        worker = ReportBatchWorker(output_dir, {"logo_path": self.main_window.logo_path},
+                                   date_from=options["date_from"], date_to=options["date_to"],
+                                   customer_id=customer['id'] if options["only_customer"] else None,
+                                   device_ids=[device['id']] if options["only_device"] else None)
+        worker.finished.connect(self.on_report_batch_finished); worker.error.connect(self.on_report_batch_error)
+        self.start_worker(worker, progress_dialog)
+
+    def on_report_batch_finished(self, generated_count, failed_reports, status):
+        if status == "Annullato":
+            QMessageBox.warning(self, "Generazione Annullata", f"Generazione dei report annullata.\n\nReport già generati: {generated_count}")
+            return
+        if not generated_count and not failed_reports:
+            QMessageBox.information(self, "Generazione Report", "Nessuna verifica trovata per la selezione.")
+            return
+        message = f"Generazione terminata.\n\n- Report generati: {generated_count}\n- Errori: {len(failed_reports)}"
+        if failed_reports:
+            details = [f"{filename}: {error}" for filename, error in failed_reports]
+            report_dialog = ImportReportDialog("Report Non Generati", details, self, "I seguenti report non sono stati generati:")
+            QMessageBox.warning(self, "Generazione Report", message); report_dialog.exec()
+        else:
+            QMessageBox.information(self, "Generazione Report", message)
+
+    def on_report_batch_error(self, error_message):
+        QMessageBox.critical(self, "Errore Generazione Report", error_message)
+
+    def filter_customers(self): self.customer_search_timer.start()
+    def filter_devices(self): self.device_search_timer.start()
 
     def load_customers_table(self, search_text=None):
-        self.customer_table.setRowCount(0)
-        # Aggiungi i nuovi campi alla lista delle colonne da visualizzare
-        columns_to_display = ['id', 'name', 'address', 'phone', 'email']
-        for customer in database.get_all_customers(search_query=search_text):
-            row = self.customer_table.rowCount()
-            self.customer_table.insertRow(row)
-            for i, col_name in enumerate(columns_to_display):
-                value_to_show = str(customer[col_name]) if col_name in customer.keys() and customer[col_name] is not None else ''
-                self.customer_table.setItem(row, i, QTableWidgetItem(value_to_show))
+        # Caricamento sincrono (es. dopo una modifica): invalida le ricerche in corso
+        self.customer_search_timer.stop()
+        self._next_search_id(SEARCH_CUSTOMERS)
+        self.fill_customers_table(search_text)
+
+    def fill_customers_table(self, search_text, first_page=None):
+        self.customer_model.set_source(
+            lambda offset, limit: database.search_customers(search_text, limit=limit, offset=offset), first_page)
+        # Il reset del modello azzera la selezione senza emettere selectionChanged
         self.devices_group.setTitle("Dispositivi")
-        self.device_table.setRowCount(0) 
+        self.device_model.clear()
         self.set_device_buttons_enabled(False)
+        self.export_daily_button.setEnabled(False)
+        self.delete_all_devices_button.setEnabled(False)
         self.verifications_group.setTitle("Storico Verifiche")
-        self.verifications_table.setRowCount(0) 
+        self.clear_verifications_table()
+
+    def clear_verifications_table(self):
+        self.verifications_model.clear()
         self.set_verification_buttons_enabled(False)
 
     def customer_selected(self):
-        self.verifications_table.setRowCount(0); 
-        self.set_verification_buttons_enabled(False)
+        self.clear_verifications_table()
         selected_rows = self.customer_table.selectionModel().selectedRows()
         if not selected_rows: 
             self.set_device_buttons_enabled(False)
@@ -533,39 +739,38 @@ class DbManagerDialog(QDialog):
             return
         self.export_daily_button.setEnabled(True)
         self.delete_all_devices_button.setEnabled(True)
-        customer_id = int(self.customer_table.item(selected_rows[0].row(), 0).text()) 
-        customer_name = self.customer_table.item(selected_rows[0].row(), 1).text()
+        customer = self.customer_model.row_at(selected_rows[0].row())
+        customer_id, customer_name = customer['id'], customer['name']
         self.devices_group.setTitle(f"Dispositivi per '{customer_name}'")
         self.load_devices_table(customer_id); 
         self.set_device_buttons_enabled(True)
 
     def load_devices_table(self, customer_id):
-        self.device_table.setRowCount(0)
-        search_text = self.device_search_box.text()
-        for device in database.get_devices_for_customer(customer_id, search_query=search_text):
-            row = self.device_table.rowCount(); self.device_table.insertRow(row)
-            for i, col in enumerate(['id', 'description', 'serial_number', 'manufacturer', 'model', 'customer_inventory', 'ams_inventory']): self.device_table.setItem(row, i, QTableWidgetItem(str(device[col])))
+        self.device_search_timer.stop()
+        self._next_search_id(SEARCH_DEVICES)
+        self.fill_devices_table(customer_id, self.device_search_box.text())
+
+    def fill_devices_table(self, customer_id, search_text, first_page=None):
+        self.device_model.set_source(
+            lambda offset, limit: database.search_devices(search_text, customer_id=customer_id, limit=limit, offset=offset), first_page)
+        self.clear_verifications_table()
 
     def device_selected(self):
         selected_rows = self.device_table.selectionModel().selectedRows()
-        if not selected_rows: self.verifications_table.setRowCount(0); self.set_verification_buttons_enabled(False); return
-        device_id = int(self.device_table.item(selected_rows[0].row(), 0).text()); device_desc = self.device_table.item(selected_rows[0].row(), 1).text()
-        self.verifications_group.setTitle(f"Storico Verifiche per '{device_desc}'"); self.load_verifications_table(device_id)
+        if not selected_rows: self.clear_verifications_table(); return
+        device = self.device_model.row_at(selected_rows[0].row())
+        self.verifications_group.setTitle(f"Storico Verifiche per '{device['description']}'"); self.load_verifications_table(device['id'])
 
     def load_verifications_table(self, device_id):
-        self.verifications_table.setRowCount(0); self.set_verification_buttons_enabled(False)
-        for verif in database.get_verifications_for_device(device_id):
-            self.set_verification_buttons_enabled(True); row = self.verifications_table.rowCount(); self.verifications_table.insertRow(row)
-            self.verifications_table.setItem(row, 0, QTableWidgetItem(str(verif['id']))); self.verifications_table.setItem(row, 1, QTableWidgetItem(verif['verification_date']))
-            status_item = QTableWidgetItem(verif['overall_status']); status_item.setBackground(QColor('#D4EDDA') if verif['overall_status'] == 'PASSATO' else QColor('#F8D7DA'))
-            self.verifications_table.setItem(row, 2, status_item)
+        self.verifications_model.set_source(
+            lambda offset, limit: database.get_verifications_for_device(device_id, limit=limit, offset=offset))
+        self.set_verification_buttons_enabled(self.verifications_model.rowCount() > 0)
 
     def view_verification_details(self):
         selected_verif_rows = self.verifications_table.selectionModel().selectedRows(); selected_dev_rows = self.device_table.selectionModel().selectedRows()
         if not selected_verif_rows or not selected_dev_rows: return
-        verif_id = int(self.verifications_table.item(selected_verif_rows[0].row(), 0).text()); device_id = int(self.device_table.item(selected_dev_rows[0].row(), 0).text())
-        verifications = database.get_verifications_for_device(device_id)
-        verification_data = next((v for v in verifications if v['id'] == verif_id), None)
+        # Il modello contiene già la riga completa della verifica (SELECT *)
+        verification_data = self.verifications_model.row_at(selected_verif_rows[0].row())
         if verification_data: dialog = VerificationViewerDialog(verification_data, self); dialog.exec()
 
     def generate_old_report(self):
@@ -573,13 +778,10 @@ class DbManagerDialog(QDialog):
         selected_dev_rows = self.device_table.selectionModel().selectedRows()
         if not selected_verif_rows or not selected_dev_rows: 
             QMessageBox.warning(self, "Attenzione", "Selezionare un dispositivo e una verifica dalla lista."); return
-        verif_id = int(self.verifications_table.item(selected_verif_rows[0].row(), 0).text())
-        dev_id = int(self.device_table.item(selected_dev_rows[0].row(), 0).text())
+        verification = self.verifications_model.row_at(selected_verif_rows[0].row())
+        dev_id = self.device_model.row_at(selected_dev_rows[0].row())['id']
         device_info = database.get_device_by_id(dev_id)
-        customer_info = next((c for c in database.get_all_customers() 
-                              if c['id'] == device_info['customer_id']), None)
-        verification = next((v for v in database.get_verifications_for_device(dev_id) 
-                             if v['id'] == verif_id), None)
+        customer_info = database.get_customer_by_id(device_info['customer_id']) if device_info else None
         if not (device_info and customer_info and verification): 
             QMessageBox.critical(self, "Errore", "Impossibile recuperare tutti i dati per il report.")
             return
@@ -597,7 +799,10 @@ class DbManagerDialog(QDialog):
         visual_data = json.loads(verification['visual_inspection_json']) if 'visual_inspection_json' in verification.keys() and verification['visual_inspection_json'] else {}
         verification_data = {'date': verification['verification_date'], 'profile_name': verification['profile_name'], 'overall_status': verification['overall_status'], 'results': results_data, 'visual_inspection_data': visual_data}
         filename, _ = QFileDialog.getSaveFileName(self, "Salva Report PDF", f"./Report_{device_info['serial_number']}_{verification['verification_date']}.pdf", "PDF Files (*.pdf)")
-        if filename: report_generator.create_report(filename, device_info, customer_info, mti_info, report_settings, verification_data, technician_name); QMessageBox.information(self, "Successo", f"Report generato:\n{filename}")
+        if filename:
+            import report_generator
+            report_generator.create_report(filename, device_info, customer_info, mti_info, report_settings, verification_data, technician_name)
+            QMessageBox.information(self, "Successo", f"Report generato:\n{filename}")
 
     def set_verification_buttons_enabled(self, enabled): self.view_verif_btn.setEnabled(enabled); self.gen_report_btn.setEnabled(enabled)
     def set_device_buttons_enabled(self, enabled): self.add_dev_btn.setEnabled(enabled); self.edit_dev_btn.setEnabled(enabled); self.del_dev_btn.setEnabled(enabled)
@@ -611,7 +816,7 @@ class DbManagerDialog(QDialog):
         selected_rows = self.customer_table.selectionModel().selectedRows()
         if not selected_rows: return
         row_idx = selected_rows[0].row()
-        cust_id = int(self.customer_table.item(row_idx, 0).text())
+        cust_id = self.customer_model.row_at(row_idx)['id']
         
         # Recupera i dati dal database per essere sicuro di avere la versione più aggiornata
         customer_data_from_db = database.get_customer_by_id(cust_id)
@@ -631,7 +836,7 @@ class DbManagerDialog(QDialog):
     def delete_customer(self):
         selected_rows = self.customer_table.selectionModel().selectedRows()
         if not selected_rows: return
-        cust_id = int(self.customer_table.item(selected_rows[0].row(), 0).text())
+        cust_id = self.customer_model.row_at(selected_rows[0].row())['id']
         reply = QMessageBox.question(self, 'Conferma', 'Eliminare il cliente? (Possibile solo se non ha dispositivi)')
         if reply == QMessageBox.Yes:
             success, message = database.delete_customer(cust_id)
@@ -640,7 +845,7 @@ class DbManagerDialog(QDialog):
     def add_device(self):
         selected_rows = self.customer_table.selectionModel().selectedRows()
         if not selected_rows: return
-        cust_id = int(self.customer_table.item(selected_rows[0].row(), 0).text())
+        cust_id = self.customer_model.row_at(selected_rows[0].row())['id']
         dialog = DeviceDialog(parent=self)
         if dialog.exec():
             data = dialog.get_data()
@@ -649,13 +854,13 @@ class DbManagerDialog(QDialog):
     def edit_device(self):
         selected_dev_rows = self.device_table.selectionModel().selectedRows(); selected_cust_rows = self.customer_table.selectionModel().selectedRows()
         if not selected_dev_rows or not selected_cust_rows: return
-        dev_id = int(self.device_table.item(selected_dev_rows[0].row(), 0).text()); cust_id = int(self.customer_table.item(selected_cust_rows[0].row(), 0).text())
+        dev_id = self.device_model.row_at(selected_dev_rows[0].row())['id']; cust_id = self.customer_model.row_at(selected_cust_rows[0].row())['id']
         device_data = database.get_device_by_id(dev_id); dialog = DeviceDialog(device_data, self)
         if dialog.exec(): data = dialog.get_data(); database.update_device(dev_id, **data); self.load_devices_table(cust_id)
     def delete_device(self):
         selected_dev_rows = self.device_table.selectionModel().selectedRows(); selected_cust_rows = self.customer_table.selectionModel().selectedRows()
         if not selected_dev_rows or not selected_cust_rows: return
-        dev_id = int(self.device_table.item(selected_dev_rows[0].row(), 0).text()); cust_id = int(self.customer_table.item(selected_cust_rows[0].row(), 0).text())
+        dev_id = self.device_model.row_at(selected_dev_rows[0].row())['id']; cust_id = self.customer_model.row_at(selected_cust_rows[0].row())['id']
         reply = QMessageBox.question(self, 'Conferma', 'Eliminare questo dispositivo e tutte le sue verifiche?')
         if reply == QMessageBox.Yes: database.delete_device(dev_id); self.load_devices_table(cust_id)
     
@@ -665,8 +870,8 @@ class DbManagerDialog(QDialog):
         if not selected_rows:
             return
 
-        customer_id = int(self.customer_table.item(selected_rows[0].row(), 0).text())
-        customer_name = self.customer_table.item(selected_rows[0].row(), 1).text()
+        customer_id = self.customer_model.row_at(selected_rows[0].row())['id']
+        customer_name = self.customer_model.row_at(selected_rows[0].row())['name']
         
         # Recupera il numero di dispositivi per mostrarlo nel messaggio
         device_count = database.get_device_count_for_customer(customer_id)
@@ -694,37 +899,33 @@ class DbManagerDialog(QDialog):
 
      # --- NUOVI METODI PER L'IMPORTAZIONE DA ARCHIVIO ---
     def import_from_stm(self):
-        filepath, _ = QFileDialog.getOpenFileName(self, "Seleziona Archivio da Importare", "", "File Safety Test Manager (*.stm)")
+        filepath, _ = QFileDialog.getOpenFileName(self, "Seleziona Archivio da Importare", "", "File Safety Test Manager (*.stm *.stm.gz)")
         if not filepath:
             return
 
-        self.import_thread = QThread()
-        self.import_worker = StmImportWorker(filepath)
-        self.import_worker.moveToThread(self.import_thread)
+        progress_dialog = QProgressDialog("Lettura e importazione dell'archivio...", "Annulla", 0, 100, self)
+        progress_dialog.setWindowTitle("Importazione da Archivio"); progress_dialog.setValue(0)
 
-        self.import_thread.started.connect(self.import_worker.run)
-        self.import_worker.finished.connect(self.on_stm_import_finished)
-        self.import_worker.error.connect(self.on_import_error) # Possiamo riusare lo slot di errore
+        worker = StmImportWorker(filepath)
+        worker.finished.connect(self.on_stm_import_finished)
+        worker.error.connect(self.on_import_error) # Possiamo riusare lo slot di errore
+        self.start_worker(worker, progress_dialog)
 
-        self.import_worker.finished.connect(self.import_thread.quit)
-        self.import_worker.finished.connect(self.import_worker.deleteLater)
-        self.import_thread.finished.connect(self.import_thread.deleteLater)
-
-        self.import_thread.start()
-        # Potremmo aggiungere una progress dialog anche qui se l'operazione è lunga
-        self.setWindowTitle("Manager Anagrafiche (Importazione da archivio in corso...)")
-
-    def on_stm_import_finished(self, verif_imported, verif_skipped, dev_new, cust_new):
-        self.setWindowTitle("Manager Anagrafiche")
+    def on_stm_import_finished(self, verif_imported, verif_skipped, dev_new, cust_new, status):
         self.load_customers_table() # Ricarica tutto per mostrare i nuovi dati
 
-        summary_message = f"Importazione da archivio completata.\n\n" \
+        cancelled = status == "Annullato"
+        header = "Importazione da archivio annullata. Dati già salvati:" if cancelled else "Importazione da archivio completata."
+        summary_message = f"{header}\n\n" \
                           f"- Verifiche importate: {verif_imported}\n" \
                           f"- Verifiche saltate (già presenti): {verif_skipped}\n" \
-                          f"- Nuovi dispositivi creati: {dev_new}\n"
-                          # f"- Nuovi clienti creati: {cust_new}" # Potremmo aggiungerlo se necessario
+                          f"- Nuovi dispositivi creati: {dev_new}\n" \
+                          f"- Nuovi clienti creati: {cust_new}"
 
-        QMessageBox.information(self, "Importazione Completata", summary_message)
+        if cancelled:
+            QMessageBox.warning(self, "Importazione Annullata", summary_message)
+        else:
+            QMessageBox.information(self, "Importazione Completata", summary_message)
 class InstrumentDetailDialog(QDialog):
     """Dialog per inserire/modificare i dettagli di un singolo strumento."""
     def __init__(self, instrument_data=None, parent=None):
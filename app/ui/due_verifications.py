@@ -0,0 +1,195 @@
+# app/ui/due_verifications.py
+from datetime import date, datetime
+
+from PySide6.QtWidgets import QApplication, QStyle, QStyledItemDelegate
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize, Signal
+from PySide6.QtGui import QColor, QFont
+
+from app.ui.table_models import TABLE_PAGE_SIZE
+
+# Tipi di riga dell'elenco
+ITEM_HEADER = "header"    # intestazione di gruppo (cliente)
+ITEM_DEVICE = "device"    # dispositivo in scadenza
+ITEM_EMPTY = "empty"      # messaggio "nessuna verifica"
+
+ItemKindRole = Qt.UserRole + 1
+ItemDataRole = Qt.UserRole + 2
+
+OVERDUE_COLOR = "#D32F2F"
+DUE_SOON_COLOR = "#F57C00"
+HEADER_BACKGROUND = "#ECEFF1"
+
+def format_due_date(date_str):
+    """Data di scadenza in formato gg/mm/aaaa (o così com'è se non è una data ISO)."""
+    try:
+        return datetime.strptime(date_str, '%Y-%m-%d').strftime('%d/%m/%Y')
+    except (TypeError, ValueError):
+        return str(date_str)
+
+class DueVerificationsModel(QAbstractListModel):
+    """
+    Elenco virtuale delle verifiche scadute o in scadenza, raggruppate per cliente.
+    Le righe arrivano a pagine da un worker in background: fetchMore() non legge il
+    database ma emette `page_requested`, e le pagine ricevute vengono aggiunte con
+    append_page(). Le intestazioni dei clienti sono inserite quando cambia il cliente.
+    """
+    # (generazione, giorni di orizzonte, offset, limite)
+    page_requested = Signal(int, int, int, int)
+
+    def __init__(self, page_size=TABLE_PAGE_SIZE, parent=None):
+        super().__init__(parent)
+        self._page_size = page_size
+        self._generation = 0
+        self._days = 0
+        self._items = []
+        self._summary = {}
+        self._device_count = 0
+        self._last_customer_id = None
+        self._loading = False
+        self._exhausted = True
+        self._today = ""
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def reset(self, days_in_future):
+        """Svuota l'elenco e avvia un nuovo caricamento; restituisce la nuova generazione."""
+        self.beginResetModel()
+        self._generation += 1
+        self._days = days_in_future
+        self._items = []
+        self._summary = {}
+        self._device_count = 0
+        self._last_customer_id = None
+        self._loading = False
+        self._exhausted = False
+        self._today = date.today().strftime('%Y-%m-%d')
+        self.endResetModel()
+        return self._generation
+
+    def set_summary(self, generation, summary):
+        """Riceve i conteggi per cliente e aggiorna le intestazioni già mostrate."""
+        if generation != self._generation:
+            return
+        self._summary = summary
+        for row, (kind, _) in enumerate(self._items):
+            if kind == ITEM_HEADER:
+                index = self.index(row)
+                self.dataChanged.emit(index, index, [Qt.DisplayRole])
+
+    def append_page(self, generation, offset, rows):
+        """Aggiunge una pagina di dispositivi ricevuta dal worker."""
+        if generation != self._generation or offset != self._device_count:
+            return  # Risposta di un caricamento superato
+        self._loading = False
+        self._exhausted = len(rows) < self._page_size
+        new_items = []
+        for device in rows:
+            if device['customer_id'] != self._last_customer_id:
+                self._last_customer_id = device['customer_id']
+                new_items.append((ITEM_HEADER, (device['customer_id'], device['customer_name'])))
+            new_items.append((ITEM_DEVICE, device))
+        if not new_items and not self._items:
+            new_items.append((ITEM_EMPTY, None))
+        self._device_count += len(rows)
+        if new_items:
+            first = len(self._items)
+            self.beginInsertRows(QModelIndex(), first, first + len(new_items) - 1)
+            self._items.extend(new_items)
+            self.endInsertRows()
+
+    def is_overdue(self, device):
+        return device['next_verification_date'] < self._today
+
+    # --- Interfaccia QAbstractListModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._items)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        kind, payload = self._items[index.row()]
+        if role == ItemKindRole:
+            return kind
+        if role == ItemDataRole:
+            return payload
+        if role != Qt.DisplayRole:
+            return None
+        if kind == ITEM_EMPTY:
+            return "Nessuna verifica in scadenza."
+        if kind == ITEM_HEADER:
+            customer_id, customer_name = payload
+            if customer_id not in self._summary:
+                return customer_name
+            due_count, overdue_count = self._summary[customer_id]
+            return f"{customer_name} — {due_count} in scadenza, {overdue_count} scadute"
+        return f"{payload['description']} (S/N: {payload['serial_number']})"
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted and not self._loading
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._loading = True
+        self.page_requested.emit(self._generation, self._days, self._device_count, self._page_size)
+
+
+class DueVerificationDelegate(QStyledItemDelegate):
+    """
+    Disegna le righe dell'elenco scadenze senza creare un widget per riga:
+    intestazioni di cliente in grassetto, dispositivi su due righe con icona e
+    data di scadenza in rosso (scaduta) o arancione (in scadenza).
+    """
+    PADDING = 4
+    ICON_SIZE = 16
+
+    def _fonts(self, option):
+        bold = QFont(option.font); bold.setBold(True)
+        small = QFont(option.font); small.setItalic(True); small.setPointSizeF(max(option.font.pointSizeF() - 1, 6))
+        return bold, small
+
+    def sizeHint(self, option, index):
+        line_height = option.fontMetrics.height()
+        if index.data(ItemKindRole) == ITEM_DEVICE:
+            return QSize(option.rect.width(), 2 * line_height + 3 * self.PADDING)
+        return QSize(option.rect.width(), line_height + 2 * self.PADDING)
+
+    def paint(self, painter, option, index):
+        kind = index.data(ItemKindRole)
+        if kind != ITEM_DEVICE:
+            if kind == ITEM_HEADER:
+                painter.fillRect(option.rect, QColor(HEADER_BACKGROUND))
+                painter.save()
+                painter.setFont(self._fonts(option)[0])
+                painter.drawText(option.rect.adjusted(self.PADDING, 0, -self.PADDING, 0), Qt.AlignVCenter | Qt.AlignLeft, index.data())
+                painter.restore()
+            else:
+                super().paint(painter, option, index)
+            return
+
+        device = index.data(ItemDataRole)
+        overdue = index.model().is_overdue(device)
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+
+        painter.save()
+        rect = option.rect.adjusted(self.PADDING, self.PADDING, -self.PADDING, -self.PADDING)
+        icon = QApplication.style().standardIcon(QStyle.SP_MessageBoxCritical if overdue else QStyle.SP_MessageBoxWarning)
+        icon.paint(painter, QRect(rect.left(), rect.top() + (rect.height() - self.ICON_SIZE) // 2, self.ICON_SIZE, self.ICON_SIZE))
+        text_rect = rect.adjusted(self.ICON_SIZE + self.PADDING, 0, 0, 0)
+        line_height = text_rect.height() // 2
+
+        bold, small = self._fonts(option)
+        painter.setPen(QColor(OVERDUE_COLOR if overdue else DUE_SOON_COLOR))
+        painter.setFont(bold)
+        first_line = QRect(text_rect.left(), text_rect.top(), text_rect.width(), line_height)
+        painter.drawText(first_line, Qt.AlignVCenter | Qt.AlignLeft,
+                         painter.fontMetrics().elidedText(index.data(), Qt.ElideRight, first_line.width()))
+        due_date = format_due_date(device['next_verification_date'])
+        painter.setFont(small)
+        painter.drawText(QRect(text_rect.left(), text_rect.top() + line_height, text_rect.width(), line_height),
+                         Qt.AlignVCenter | Qt.AlignLeft, f"Scadenza: {due_date}")
+        painter.restore()
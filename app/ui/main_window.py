@@ -5,20 +5,32 @@ from datetime import datetime
 
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
     QHBoxLayout, QPushButton, QLabel, QComboBox, QGroupBox, QFormLayout, QDialog,
-    QMessageBox, QFileDialog, QStyle, QStatusBar, QListWidget, QListWidgetItem, QLineEdit)
+    QMessageBox, QFileDialog, QStyle, QStatusBar, QListView, QLineEdit, QSpinBox, QProgressBar)
 from PySide6.QtGui import QAction, QColor
-from PySide6.QtCore import Qt, QSettings, QDate
+from PySide6.QtCore import Qt, QSettings, QThread, Signal
 import json
 from app import config
 import database
-import report_generator
 from app.ui.dialogs import (DbManagerDialog, VisualInspectionDialog, DeviceDialog, 
                             InstrumentManagerDialog, InstrumentSelectionDialog)
 from app.ui.widgets import TestRunnerWidget
+from app.ui.due_verifications import DueVerificationsModel, DueVerificationDelegate
+from app.workers.due_verifications_worker import DueVerificationsWorker
+from app.workers.save_report_worker import SaveReportWorker
+from app.workers.backup_worker import BackupWorker
+from app import backup_manager, jobs
 from app.backup_manager import restore_from_backup
 
+# Attesa massima (s, per thread) dei job in corso alla chiusura dell'applicazione
+JOB_SHUTDOWN_TIMEOUT_SECONDS = 30
+
 
 class MainWindow(QMainWindow):
+    # Richiesta del riepilogo scadenze per cliente al worker: (generazione, giorni)
+    due_summary_requested = Signal(int, int)
+    # Verifica completata da salvare (e stampare) in background: (id lavoro, SaveReportJob)
+    save_job_requested = Signal(int, object)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Safety Test Manager")
@@ -38,6 +50,12 @@ class MainWindow(QMainWindow):
 
         self.create_left_panel()
         self.create_right_panel()
+        self.setup_due_verifications_worker()
+        QApplication.instance().aboutToQuit.connect(self.stop_due_verifications_worker)
+        self.setup_save_report_worker()
+        # All'uscita i job in background (importazioni, esportazioni, report) vengono annullati
+        QApplication.instance().aboutToQuit.connect(
+            lambda: jobs.shutdown_scheduler(timeout=JOB_SHUTDOWN_TIMEOUT_SECONDS))
 
         self.load_customers()
         self.customer_selector.currentIndexChanged.connect(self.load_devices_for_customer)
@@ -56,17 +74,34 @@ class MainWindow(QMainWindow):
         dashboard_layout.addRow("Numero Clienti:", self.customers_stat_label)
         dashboard_layout.addRow("Numero Dispositivi:", self.devices_stat_label)
         
-        scadenze_group = QGroupBox("Verifiche Scadute o in Scadenza (30 gg)")
-        scadenze_layout = QVBoxLayout(scadenze_group)
-        self.scadenze_list = QListWidget()
+        # Elenco virtuale: modello + delegate, righe caricate a pagine in background
+        self.scadenze_group = QGroupBox()
+        scadenze_layout = QVBoxLayout(self.scadenze_group)
+        horizon_layout = QHBoxLayout()
+        self.horizon_spinbox = QSpinBox()
+        self.horizon_spinbox.setRange(0, 3650)
+        self.horizon_spinbox.setSuffix(" gg")
+        self.horizon_spinbox.setValue(int(self.settings.value("due_horizon_days", database.DUE_VERIFICATION_HORIZON_DAYS)))
+        self.horizon_spinbox.setKeyboardTracking(False)
+        self.horizon_spinbox.valueChanged.connect(self.change_due_horizon)
+        horizon_layout.addWidget(QLabel("Mostra scadenze entro:"))
+        horizon_layout.addWidget(self.horizon_spinbox)
+        horizon_layout.addStretch()
+        self.scadenze_model = DueVerificationsModel(parent=self)
+        self.scadenze_list = QListView()
+        self.scadenze_list.setModel(self.scadenze_model)
+        self.scadenze_list.setItemDelegate(DueVerificationDelegate(self.scadenze_list))
+        self.scadenze_list.setSelectionMode(QListView.SingleSelection)
+        scadenze_layout.addLayout(horizon_layout)
         scadenze_layout.addWidget(self.scadenze_list)
+        self.update_due_group_title()
         
         db_button = QPushButton("Gestione Anagrafiche")
         db_button.setIcon(QApplication.style().standardIcon(QStyle.SP_ComputerIcon))
         db_button.clicked.connect(self.open_db_manager)
 
         left_layout.addWidget(dashboard_group)
-        left_layout.addWidget(scadenze_group)
+        left_layout.addWidget(self.scadenze_group)
         left_layout.addWidget(db_button)
         left_layout.addStretch()
         self.main_layout.addWidget(left_panel, 1)
@@ -173,6 +208,10 @@ class MainWindow(QMainWindow):
         file_menu = menu_bar.addMenu("File")
         settings_menu = menu_bar.addMenu("Impostazioni")
         
+        backup_action = QAction("Crea Backup del Database", self)
+        backup_action.triggered.connect(self.start_backup)
+        file_menu.addAction(backup_action)
+        self.backup_action = backup_action
         restore_action = QAction("Ripristina Database da Backup...", self)
         restore_action.triggered.connect(self.restore_database)
         file_menu.addAction(restore_action)
@@ -187,35 +226,117 @@ class MainWindow(QMainWindow):
         mti_manager_action = QAction("Gestisci Strumenti di Misura...", self)
         mti_manager_action.triggered.connect(self.open_instrument_manager)
         settings_menu.addAction(mti_manager_action)
+        compress_backup_action = QAction("Comprimi i Backup", self, checkable=True)
+        compress_backup_action.setChecked(self.settings.value("backup_compress", False, type=bool))
+        compress_backup_action.toggled.connect(lambda checked: self.settings.setValue("backup_compress", checked))
+        settings_menu.addAction(compress_backup_action)
     
     def load_control_panel_data(self):
         self.statusBar().showMessage("Aggiornamento dati dashboard...")
         stats = database.get_stats()
         self.customers_stat_label.setText(f"<b>{stats.get('customers', 0)}</b>")
         self.devices_stat_label.setText(f"<b>{stats.get('devices', 0)}</b>")
-        self.scadenze_list.clear()
-        devices_to_check = database.get_devices_needing_verification()
-        if not devices_to_check:
-            self.scadenze_list.addItem("Nessuna verifica in scadenza.")
-        else:
-            today = QDate.currentDate()
-            for device in devices_to_check:
-                next_date_str = device['next_verification_date']
-                if not next_date_str: continue
-                next_date = QDate.fromString(next_date_str, "yyyy-MM-dd")
-                item_text = f"<b>{device['description']}</b> (S/N: {device['serial_number']})<br><small><i>{device['customer_name']}</i> - Scadenza: {next_date.toString('dd/MM/yyyy')}</small>"
-                list_item = QListWidgetItem()
-                label = QLabel(item_text)
-                if next_date < today:
-                    label.setStyleSheet("color: #D32F2F; font-weight: bold;")
-                    list_item.setIcon(QApplication.style().standardIcon(QStyle.SP_MessageBoxCritical))
-                else:
-                    label.setStyleSheet("color: #F57C00;")
-                    list_item.setIcon(QApplication.style().standardIcon(QStyle.SP_MessageBoxWarning))
-                self.scadenze_list.addItem(list_item)
-                self.scadenze_list.setItemWidget(list_item, label)
+        self.reload_due_verifications()
         self.statusBar().showMessage("Pronto.", 3000)
 
+    def setup_due_verifications_worker(self):
+        """Thread dedicato alla lettura dell'elenco scadenze, per non bloccare la finestra."""
+        self.due_thread = QThread(self)
+        self.due_worker = DueVerificationsWorker()
+        self.due_worker.moveToThread(self.due_thread)
+        self.scadenze_model.page_requested.connect(self.due_worker.load_page)
+        self.due_summary_requested.connect(self.due_worker.load_summary)
+        self.due_worker.page_loaded.connect(self.scadenze_model.append_page)
+        self.due_worker.summary_loaded.connect(self.scadenze_model.set_summary)
+        self.due_worker.error.connect(lambda message: self.statusBar().showMessage(f"Errore caricamento scadenze: {message}", 5000))
+        self.due_thread.finished.connect(self.due_worker.deleteLater)
+        self.due_thread.start()
+
+    def update_due_group_title(self):
+        self.scadenze_group.setTitle(f"Verifiche Scadute o in Scadenza ({self.horizon_spinbox.value()} gg)")
+
+    def change_due_horizon(self, days):
+        self.settings.setValue("due_horizon_days", days)
+        self.update_due_group_title()
+        self.reload_due_verifications()
+
+    def reload_due_verifications(self):
+        """Ricarica l'elenco scadenze: riepilogo per cliente e prima pagina arrivano dal worker."""
+        days = self.horizon_spinbox.value()
+        generation = self.scadenze_model.reset(days)
+        self.due_summary_requested.emit(generation, days)
+        self.scadenze_model.fetchMore()
+
+    def stop_due_verifications_worker(self):
+        self.due_thread.quit()
+        self.due_thread.wait()
+
+    def setup_save_report_worker(self):
+        """Thread dedicato al salvataggio delle verifiche e alla generazione dei report PDF."""
+        self._pending_save_jobs = set()
+        self._last_save_job_id = 0
+        self.save_progress_bar = QProgressBar()
+        self.save_progress_bar.setRange(0, 0)  # Indicatore di attività
+        self.save_progress_bar.setMaximumWidth(150)
+        self.save_progress_bar.hide()
+        self.statusBar().addPermanentWidget(self.save_progress_bar)
+
+        self.save_thread = QThread(self)
+        self.save_worker = SaveReportWorker()
+        self.save_worker.moveToThread(self.save_thread)
+        self.save_job_requested.connect(self.save_worker.process)
+        self.save_worker.progress.connect(self.on_save_job_progress)
+        self.save_worker.finished.connect(self.on_save_job_finished)
+        self.save_worker.error.connect(self.on_save_job_error)
+        self.save_thread.finished.connect(self.save_worker.deleteLater)
+        self.save_thread.start()
+        QApplication.instance().aboutToQuit.connect(self.stop_save_report_worker)
+
+    def submit_save_job(self, job):
+        """Accoda una verifica completata: i lavori vengono eseguiti in ordine, uno alla volta."""
+        self._last_save_job_id += 1
+        self._pending_save_jobs.add(self._last_save_job_id)
+        self.save_progress_bar.show()
+        self.save_job_requested.emit(self._last_save_job_id, job)
+
+    def _save_job_done(self, job_id):
+        self._pending_save_jobs.discard(job_id)
+        self.save_progress_bar.setVisible(bool(self._pending_save_jobs))
+
+    def on_save_job_progress(self, job_id, stage):
+        queued = len(self._pending_save_jobs) - 1
+        self.statusBar().showMessage(f"{stage}..." + (f" (altri {queued} in coda)" if queued > 0 else ""))
+
+    def on_save_job_finished(self, job_id, report_filename):
+        self._save_job_done(job_id)
+        self.load_control_panel_data()
+        if report_filename:
+            self.statusBar().showMessage(f"Verifica salvata e report generato: {report_filename}", 10000)
+        else:
+            self.statusBar().showMessage("Verifica salvata.", 5000)
+
+    def on_save_job_error(self, job_id, error_message):
+        self._save_job_done(job_id)
+        self.load_control_panel_data()
+        QMessageBox.critical(self, "Errore Salvataggio", error_message)
+
+    def stop_save_report_worker(self):
+        self.save_thread.quit()
+        self.save_thread.wait()
+
+    def closeEvent(self, event):
+        # I lavori ancora in coda andrebbero persi con la chiusura del thread
+        if self._pending_save_jobs:
+            QMessageBox.warning(self, "Salvataggio in Corso",
+                                "Attendere il termine del salvataggio delle verifiche e della generazione dei report prima di chiudere.")
+            event.ignore()
+            return
+        if not self.backup_action.isEnabled():
+            QMessageBox.warning(self, "Backup in Corso", "Attendere il termine del backup del database prima di chiudere.")
+            event.ignore()
+            return
+        super().closeEvent(event)
+
     def setup_verification_session(self):
         dialog = InstrumentSelectionDialog(self)
         if dialog.exec() == QDialog.Accepted:
@@ -243,7 +364,7 @@ class MainWindow(QMainWindow):
         # --- NUOVO BLOCCO DI CONTROLLO PER LE PARTI APPLICATE ---
         
         # Controlla se il profilo richiede test su parti applicate
-        profile_needs_ap = any(test.is_applied_part_test for test in selected_profile.tests)
+        profile_needs_ap = selected_profile.needs_applied_parts
         
         # Controlla se il dispositivo ha parti applicate registrate
         try:
@@ -364,21 +485,58 @@ class MainWindow(QMainWindow):
             else:
                 QMessageBox.warning(self, "Errore", "Il numero di serie non può essere vuoto.")
 
+    def start_backup(self):
+        """Backup online in background: si può continuare a lavorare durante la copia."""
+        self.backup_action.setEnabled(False)
+        self.statusBar().showMessage("Backup del database in corso...")
+        self.backup_worker = BackupWorker(compress=self.settings.value("backup_compress", False, type=bool))
+        self.backup_worker.progress_updated.connect(lambda percent: self.statusBar().showMessage(f"Backup del database in corso... {percent}%"))
+        self.backup_worker.finished.connect(self.on_backup_finished)
+        self.backup_worker.start()
+
+    def on_backup_finished(self, result):
+        self.backup_action.setEnabled(True)
+        if result is None:
+            self.statusBar().clearMessage()
+            QMessageBox.critical(self, "Errore Backup", "Impossibile creare il backup del database. Controllare i log.")
+            return
+        kind = "incrementale" if result.kind == backup_manager.BACKUP_INCREMENTAL else "completo"
+        self.statusBar().showMessage(
+            f"Backup {kind} creato: {result.path} ({result.size_bytes / 1048576:.1f} MB in {result.total_seconds:.1f} s)", 10000)
+
     def restore_database(self):
         logging.warning("L'utente ha avviato la procedura di ripristino del database.")
+        # Il ripristino chiude le connessioni di tutti i thread: nessun lavoro deve essere a metà di una transazione
+        scheduler = jobs.get_scheduler()
+        if scheduler.running() or scheduler.pending() or self._pending_save_jobs:
+            logging.info("Ripristino rifiutato: operazioni in background ancora in corso.")
+            QMessageBox.warning(self, "Operazioni in Corso",
+                                "Attendere il termine delle operazioni in corso (salvataggi, importazioni, esportazioni, report e backup) prima di ripristinare il database.")
+            return
         reply = QMessageBox.question(self, 'Conferma Ripristino Database',
-                                     "<b>ATTENZIONE:</b> Stai per sovrascrivere il database corrente con un file di backup. L'operazione è irreversibile.\n\nL'applicazione verrà chiusa al termine. Vuoi continuare?",
+                                     "<b>ATTENZIONE:</b> Stai per sovrascrivere il database corrente con un file di backup. Una copia del database attuale verrà salvata nella cartella dei backup.\n\nL'applicazione verrà chiusa al termine. Vuoi continuare?",
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if reply == QMessageBox.No:
             logging.info("Procedura di ripristino annullata dall'utente."); return
-        backup_path, _ = QFileDialog.getOpenFileName(self, "Seleziona un file di backup", "backups", "File di Backup (*.bak)")
+        backup_path, _ = QFileDialog.getOpenFileName(self, "Seleziona un file di backup", "backups", "File di Backup (*.bak *.bak.gz *.incr.gz)")
         if not backup_path:
             logging.info("Selezione del file di backup annullata."); return
-        success = restore_from_backup(backup_path)
-        if success:
-            QMessageBox.information(self, "Ripristino Completato", "Database ripristinato con successo. L'applicazione verrà chiusa.")
-        else:
-            QMessageBox.critical(self, "Errore di Ripristino", "Errore durante il ripristino. Controllare i log.")
+        # Il worker delle scadenze legge con una propria connessione: viene fermato prima che vengano chiuse
+        self.stop_due_verifications_worker()
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            result = restore_from_backup(backup_path)
+        finally:
+            QApplication.restoreOverrideCursor()
+        if not result.ok:
+            # Il database corrente non è stato modificato: l'applicazione resta aperta
+            self.setup_due_verifications_worker()
+            self.reload_due_verifications()
+            QMessageBox.critical(self, "Errore di Ripristino", f"Il database non è stato ripristinato.\n\n{result.error}")
+            return
+        snapshot_note = f"\n\nIl database sostituito è stato salvato in:\n{result.snapshot_path}" if result.snapshot_path else ""
+        QMessageBox.information(self, "Ripristino Completato",
+                                f"Database ripristinato con successo in {result.total_seconds:.1f} s.{snapshot_note}\n\nL'applicazione verrà chiusa.")
         QApplication.quit()
 
     def set_company_logo(self):
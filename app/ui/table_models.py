@@ -0,0 +1,91 @@
+# app/ui/table_models.py
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PySide6.QtGui import QColor
+
+# Righe lette dal database per ogni pagina: la vista chiede la pagina successiva
+# (canFetchMore/fetchMore) solo quando l'utente scorre fino in fondo.
+TABLE_PAGE_SIZE = 200
+
+class LazyRowTableModel(QAbstractTableModel):
+    """
+    Modello di sola lettura sopra le funzioni DAO di database.py.
+    Le righe (sqlite3.Row) vengono caricate a pagine tramite `page_loader(offset, limit)`
+    e i valori vengono convertiti in testo solo quando la vista li disegna.
+    `columns` è una lista di tuple (chiave della riga, intestazione).
+    """
+    def __init__(self, columns, background=None, page_size=TABLE_PAGE_SIZE, parent=None):
+        super().__init__(parent)
+        self._keys = [key for key, _ in columns]
+        self._headers = [header for _, header in columns]
+        self._background = background  # funzione opzionale (riga, chiave) -> colore di sfondo
+        self._page_size = page_size
+        self._page_loader = None
+        self._rows = []
+        self._exhausted = True
+
+    @property
+    def page_size(self):
+        return self._page_size
+
+    def set_source(self, page_loader, first_page=None):
+        """
+        Sostituisce la sorgente dati e carica la prima pagina.
+        `first_page` permette di passare righe già lette (es. da un worker in background).
+        """
+        self.beginResetModel()
+        self._page_loader = page_loader
+        self._rows = list(first_page) if first_page is not None else list(page_loader(0, self._page_size))
+        self._exhausted = len(self._rows) < self._page_size
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self._page_loader = None
+        self._rows = []
+        self._exhausted = True
+        self.endResetModel()
+
+    def row_at(self, row):
+        """Restituisce la riga del database mostrata alla posizione `row`."""
+        return self._rows[row]
+
+    # --- Interfaccia QAbstractTableModel ---
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._keys)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self._headers[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        key = self._keys[index.column()]
+        if role == Qt.DisplayRole:
+            value = row[key] if key in row.keys() else None
+            return '' if value is None else str(value)
+        if role == Qt.BackgroundRole and self._background:
+            color = self._background(row, key)
+            return QColor(color) if color else None
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        page = list(self._page_loader(len(self._rows), self._page_size))
+        self._exhausted = len(page) < self._page_size
+        if not page:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        self._rows.extend(page)
+        self.endInsertRows()
@@ -0,0 +1,27 @@
+# app/workers/backup_worker.py
+from PySide6.QtCore import Signal
+from app.batch_jobs import BackupJob
+from app.workers.job_adapter import JobAdapter
+
+class BackupWorker(JobAdapter):
+    """Esegue il backup online del database in background, mentre l'applicazione resta utilizzabile."""
+    # L'avanzamento (progress_updated) è calcolato sulle pagine copiate.
+    # BackupResult, o None se il backup non è riuscito o è stato annullato
+    finished = Signal(object)
+
+    def __init__(self, compress=False, verify=True):
+        super().__init__()
+        self.compress = compress
+        self.verify = verify
+
+    def create_job(self):
+        return BackupJob(compress=self.compress, verify=self.verify)
+
+    def on_result(self, result):
+        self.finished.emit(result)
+
+    def on_cancelled(self):
+        self.finished.emit(None)
+
+    def on_error(self, message):
+        self.finished.emit(None)
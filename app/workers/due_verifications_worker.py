@@ -0,0 +1,39 @@
+# app/workers/due_verifications_worker.py
+import logging
+
+from PySide6.QtCore import QObject, Signal, Slot
+import database
+
+class DueVerificationsWorker(QObject):
+    """
+    Legge in un thread dedicato l'elenco delle verifiche scadute o in scadenza:
+    il riepilogo per cliente e le pagine di dispositivi, ordinate per cliente e data.
+    Ogni richiesta porta il numero di "generazione" del caricamento a cui appartiene,
+    così la dashboard può scartare le risposte di un caricamento ormai superato.
+    """
+    # (generazione, {customer_id: (totale, scaduti)})
+    summary_loaded = Signal(int, object)
+    # (generazione, offset, righe)
+    page_loaded = Signal(int, int, object)
+    error = Signal(str)
+
+    @Slot(int, int)
+    def load_summary(self, generation, days_in_future):
+        try:
+            summary = database.get_due_verification_summary(days_in_future)
+        except Exception as e:
+            logging.error("Errore durante il conteggio delle verifiche in scadenza.", exc_info=True)
+            self.error.emit(str(e))
+            return
+        self.summary_loaded.emit(generation, summary)
+
+    @Slot(int, int, int, int)
+    def load_page(self, generation, days_in_future, offset, limit):
+        try:
+            rows = database.get_devices_needing_verification(
+                days_in_future, limit=limit, offset=offset, group_by_customer=True)
+        except Exception as e:
+            logging.error("Errore durante il caricamento delle verifiche in scadenza.", exc_info=True)
+            self.error.emit(str(e))
+            return
+        self.page_loaded.emit(generation, offset, rows)
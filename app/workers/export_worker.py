@@ -1,36 +1,35 @@
-import json
-from PySide6.QtCore import QObject, Signal
-import database
+from PySide6.QtCore import Signal
 import logging
+from app.batch_jobs import StmExportJob
+from app.workers.job_adapter import JobAdapter
 
-class DailyExportWorker(QObject):
-    """Esegue l'esportazione delle verifiche di una data specifica in formato JSON (.stm)."""
+class DailyExportWorker(JobAdapter):
+    """
+    Esegue l'esportazione delle verifiche di una data, o di un intervallo di date,
+    in formato JSON (.stm), opzionalmente per un solo cliente e compressa con gzip.
+    """
     finished = Signal(str, str) # Segnale emesso alla fine: (status, messaggio)
     error = Signal(str)
 
-    def __init__(self, target_date, output_path):
+    def __init__(self, target_date, output_path, end_date=None, customer_id=None, compress=False):
         super().__init__()
         self.target_date = target_date
+        self.end_date = end_date or target_date
         self.output_path = output_path
+        self.customer_id = customer_id
+        self.compress = compress
 
-    def run(self):
-        try:
-            logging.info(f"Avvio esportazione in formato STM per la data: {self.target_date}")
-            
-            export_data = database.get_full_verification_data_for_date(self.target_date)
-            
-            if not export_data["verifications"]:
-                logging.warning(f"Nessuna verifica trovata per la data {self.target_date}.")
-                self.finished.emit("Warning", "Nessuna verifica trovata per la data selezionata.")
-                return
+    def create_job(self):
+        return StmExportJob(self.target_date, self.output_path, self.end_date, self.customer_id, compress=self.compress)
 
-            with open(self.output_path, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, indent=4)
-            
-            num_verifiche = len(export_data['verifications'])
-            logging.info(f"Esportazione completata con successo. Salvate {num_verifiche} verifiche.")
-            self.finished.emit("Success", f"Esportazione completata.\n\nSalvate {num_verifiche} verifiche nel file:\n{self.output_path}")
+    def on_result(self, num_verifiche):
+        if not num_verifiche:
+            logging.warning(f"Nessuna verifica trovata per il periodo {self.target_date} - {self.end_date}.")
+            self.finished.emit("Warning", "Nessuna verifica trovata per il periodo selezionato.")
+            return
 
-        except Exception as e:
-            logging.error("Errore durante l'esportazione delle verifiche.", exc_info=True)
-            self.error.emit(f"Si è verificato un errore imprevisto durante l'esportazione:\n{e}")
+        logging.info(f"Esportazione completata con successo. Salvate {num_verifiche} verifiche.")
+        self.finished.emit("Success", f"Esportazione completata.\n\nSalvate {num_verifiche} verifiche nel file:\n{self.output_path}")
+
+    def on_error(self, message):
+        self.error.emit(message)
@@ -0,0 +1,60 @@
+# app/workers/job_adapter.py
+import logging
+from PySide6.QtCore import QObject, Signal
+from app import jobs
+
+class JobAdapter(QObject):
+    """
+    Adattatore Qt di un job di app.jobs: le sottoclassi creano il job (create_job) e
+    traducono l'esito nei propri segnali (on_result / on_cancelled / on_error).
+    Con start() il job va in coda allo scheduler condiviso, quindi più operazioni possono
+    procedere insieme; i segnali emessi dai thread dello scheduler arrivano agli slot
+    dell'interfaccia tramite connessioni in coda.
+    """
+    # Avanzamento in percentuale
+    progress_updated = Signal(int)
+    # Emesso per ultimo, qualunque sia l'esito (es. per chiudere la finestra di avanzamento)
+    done = Signal()
+
+    def __init__(self):
+        super().__init__()
+        self.handle = None
+
+    def create_job(self):
+        raise NotImplementedError
+
+    def start(self, scheduler=None, priority=None):
+        """Mette il job in coda allo scheduler (quello condiviso se non indicato) e ne restituisce l'handle."""
+        scheduler = scheduler or jobs.get_scheduler()
+        self.handle = scheduler.submit(self.create_job(), priority, progress_callback=self.progress_updated.emit,
+                                       done_callback=self._on_job_done)
+        return self.handle
+
+    def run(self):
+        """Esegue il job nel thread corrente, senza scheduler."""
+        self.handle = jobs.JobHandle(self.create_job(), progress_callback=self.progress_updated.emit,
+                                     done_callback=self._on_job_done)
+        self.handle.execute()
+
+    def cancel(self):
+        """Slot per richiedere l'annullamento; non ha effetto se il job è già terminato."""
+        if self.handle is not None and self.handle.cancel():
+            logging.warning(f"Richiesta di annullamento ricevuta: {self.handle.job.name}.")
+
+    def _on_job_done(self, handle):
+        if handle.state == jobs.JOB_DONE:
+            self.on_result(handle.result)
+        elif handle.state == jobs.JOB_CANCELLED:
+            self.on_cancelled()
+        else:
+            self.on_error(str(handle.error))
+        self.done.emit()
+
+    def on_result(self, result):
+        pass
+
+    def on_cancelled(self):
+        pass
+
+    def on_error(self, message):
+        pass
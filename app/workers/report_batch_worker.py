@@ -0,0 +1,38 @@
+# app/workers/report_batch_worker.py
+from PySide6.QtCore import Signal
+from app.batch_jobs import ReportBatchJob
+from app.workers.job_adapter import JobAdapter
+
+class ReportBatchWorker(JobAdapter):
+    """
+    Genera in background i report PDF di una selezione di verifiche (intervallo di date,
+    cliente, elenco di dispositivi). I dati vengono letti con un'unica query e i PDF
+    prodotti in parallelo sul pool di processi condiviso (ReportBatchJob).
+    """
+    # (report generati, [(file, errore)], stato: "Completato" / "Annullato")
+    finished = Signal(int, list, str)
+    error = Signal(str)
+
+    def __init__(self, output_dir, report_settings, date_from=None, date_to=None, customer_id=None, device_ids=None, max_workers=None):
+        super().__init__()
+        self.output_dir = output_dir
+        self.report_settings = report_settings
+        self.date_from = date_from
+        self.date_to = date_to
+        self.customer_id = customer_id
+        self.device_ids = device_ids
+        self.max_workers = max_workers
+
+    def create_job(self):
+        return ReportBatchJob(self.output_dir, self.report_settings, self.date_from, self.date_to,
+                              self.customer_id, self.device_ids, self.max_workers)
+
+    def on_result(self, stats):
+        self.finished.emit(stats.generated, stats.failed, "Annullato" if stats.cancelled else "Completato")
+
+    def on_cancelled(self):
+        # Annullata prima di iniziare, mentre era in coda
+        self.finished.emit(0, [], "Annullato")
+
+    def on_error(self, message):
+        self.error.emit(message)
@@ -0,0 +1,73 @@
+# app/workers/save_report_worker.py
+import logging
+from dataclasses import dataclass
+
+from PySide6.QtCore import QObject, Signal, Slot
+import database
+
+# Fasi di un lavoro, mostrate nella barra di stato
+STAGE_SAVING = "Salvataggio verifica"
+STAGE_REPORT = "Generazione report PDF"
+
+
+@dataclass
+class SaveReportJob:
+    """Una verifica completata da salvare, con il report PDF da generare (se report_filename non è None)."""
+    device_info: dict
+    customer_info: dict
+    mti_info: dict
+    report_settings: dict
+    profile_name: str
+    results: list
+    overall_status: str
+    visual_inspection_data: dict
+    technician_name: str
+    report_filename: str = None
+    report_date: str = None    # data stampata nel report (gg/mm/aaaa)
+
+
+class SaveReportWorker(QObject):
+    """
+    Salva le verifiche e ne genera i report in un thread dedicato, così il tecnico può
+    passare al dispositivo successivo mentre il PDF precedente è ancora in produzione.
+    I lavori arrivano con lo slot `process` e vengono eseguiti uno alla volta, in ordine.
+    """
+    # (id lavoro, fase)
+    progress = Signal(int, str)
+    # (id lavoro, file del report o "" se non richiesto)
+    finished = Signal(int, str)
+    # (id lavoro, messaggio)
+    error = Signal(int, str)
+
+    @Slot(int, object)
+    def process(self, job_id, job):
+        device_id = job.device_info['id']
+        self.progress.emit(job_id, STAGE_SAVING)
+        verification_id = database.save_verification(
+            device_id=device_id, profile_name=job.profile_name,
+            results=job.results, overall_status=job.overall_status,
+            visual_inspection_data=job.visual_inspection_data, mti_info=job.mti_info,
+            technician_name=job.technician_name
+        )
+        if verification_id is None:
+            self.error.emit(job_id, f"Impossibile salvare la verifica del dispositivo {job.device_info['serial_number']}.\n"
+                                    "Il report non è stato generato.")
+            return
+
+        if not job.report_filename:
+            self.finished.emit(job_id, "")
+            return
+
+        self.progress.emit(job_id, STAGE_REPORT)
+        try:
+            import report_generator   # caricato al primo report, non all'avvio dell'applicazione
+            verification_data = {'date': job.report_date, 'profile_name': job.profile_name,
+                                 'overall_status': job.overall_status, 'results': job.results,
+                                 'visual_inspection_data': job.visual_inspection_data}
+            report_generator.create_report(job.report_filename, job.device_info, job.customer_info, job.mti_info,
+                                           job.report_settings, verification_data, job.technician_name)
+        except Exception as e:
+            logging.error(f"Errore durante la generazione del report {job.report_filename}.", exc_info=True)
+            self.error.emit(job_id, f"Verifica salvata, ma impossibile generare il report:\n{job.report_filename}\n\n{e}")
+            return
+        self.finished.emit(job_id, job.report_filename)
@@ -0,0 +1,75 @@
+# app/workers/search_worker.py
+import logging
+import sqlite3
+import threading
+
+from PySide6.QtCore import QObject, Signal, Slot
+import database
+
+# Tipi di ricerca gestiti dal worker
+SEARCH_CUSTOMERS = "customers"
+SEARCH_DEVICES = "devices"
+
+class SearchWorker(QObject):
+    """
+    Esegue le ricerche di DbManagerDialog in un thread dedicato e persistente.
+    Ogni richiesta ha un id crescente per tipo di ricerca: le richieste superate da una
+    più recente vengono scartate prima di partire e, se già in esecuzione, interrotte
+    con sqlite3 interrupt(), così il thread è sempre libero per l'ultima digitazione.
+    Con `page_size` viene letta solo la prima pagina dei risultati; le successive
+    vengono caricate dal modello della tabella durante lo scorrimento.
+    """
+    # (tipo di ricerca, id richiesta, righe trovate)
+    results_ready = Signal(str, int, object)
+    error = Signal(str, str)
+
+    def __init__(self, page_size=None):
+        super().__init__()
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._latest = {}       # tipo -> id dell'ultima richiesta inviata
+        self._running = None    # (tipo, id) della ricerca in esecuzione
+        self._conn = None
+
+    def supersede(self, kind, request_id):
+        """
+        Chiamato dal thread della UI quando parte una nuova richiesta: registra l'id più
+        recente e interrompe l'eventuale ricerca dello stesso tipo ancora in corso.
+        """
+        with self._lock:
+            self._latest[kind] = request_id
+            running = self._running
+            if running and running[0] == kind and running[1] < request_id and self._conn is not None:
+                self._conn.interrupt()
+
+    def _is_stale(self, kind, request_id):
+        return request_id < self._latest.get(kind, request_id)
+
+    @Slot(str, int, str, int)
+    def search(self, kind, request_id, text, customer_id):
+        with self._lock:
+            if self._is_stale(kind, request_id):
+                return
+            self._conn = database.get_db_connection()
+            self._running = (kind, request_id)
+        try:
+            if kind == SEARCH_CUSTOMERS:
+                rows = database.search_customers(text, limit=self.page_size)
+            else:
+                rows = database.search_devices(text, customer_id=customer_id, limit=self.page_size)
+        except sqlite3.OperationalError as e:
+            # Interrotta perché superata da una nuova richiesta: nessun risultato da mostrare
+            if "interrupted" not in str(e):
+                logging.error(f"Errore durante la ricerca '{text}'.", exc_info=True)
+                self.error.emit(kind, str(e))
+            return
+        except Exception as e:
+            logging.error(f"Errore durante la ricerca '{text}'.", exc_info=True)
+            self.error.emit(kind, str(e))
+            return
+        finally:
+            with self._lock:
+                self._running = None
+
+        if not self._is_stale(kind, request_id):
+            self.results_ready.emit(kind, request_id, rows)
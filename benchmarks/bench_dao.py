@@ -0,0 +1,77 @@
+# benchmarks/bench_dao.py
+"""
+Micro-benchmark delle funzioni DAO più usate (ops/sec).
+
+Confronta due modalità sullo stesso database temporaneo:
+- "per-chiamata": la connessione viene chiusa dopo ogni operazione, come faceva
+  la vecchia get_db_connection() (connect + PRAGMA + close a ogni chiamata);
+- "pool": la connessione del thread viene riutilizzata.
+
+Uso:  python benchmarks/bench_dao.py [--devices 2000] [--ops 2000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def _seed(database, n_devices):
+    customer_id = database.add_or_get_customer("Cliente Benchmark", "Via Prova 1")
+    with database.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO devices (customer_id, serial_number, description, applied_parts_json) VALUES (?, ?, ?, '[]')",
+            [(customer_id, f"SN{i:07d}", f"Dispositivo {i}") for i in range(n_devices)]
+        )
+    return customer_id
+
+
+def _measure(label, fn, ops, reconnect, database):
+    start = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+        if reconnect:
+            database.close_db_connection()
+    elapsed = time.perf_counter() - start
+    return label, ops / elapsed if elapsed else float('inf')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--ops", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)  # database.py crea 'verifiche.db' nella cartella corrente
+        import database
+
+        _seed(database, args.devices)
+        device_id = database.get_device_by_serial("SN0000000")['id']
+        n = args.devices
+
+        cases = [
+            ("get_device_by_id", lambda i: database.get_device_by_id(device_id)),
+            ("get_device_by_serial", lambda i: database.get_device_by_serial(f"SN{i % n:07d}")),
+            ("device_exists", lambda i: database.device_exists(f"SN{i % n:07d}")),
+            ("verification_exists", lambda i: database.verification_exists(device_id, "2025-01-01", "CEI 62-5")),
+            ("add_or_get_customer", lambda i: database.add_or_get_customer("Cliente Benchmark")),
+            ("save_verification", lambda i: database.save_verification(
+                device_id, "CEI 62-5", [], "PASSATO", {}, {}, "Bench", verification_date=f"2024-{i:06d}")),
+        ]
+
+        print(f"{'operazione':<24}{'per-chiamata':>16}{'pool':>16}{'speedup':>10}")
+        for name, fn in cases:
+            _, before = _measure(name, fn, args.ops, True, database)
+            _, after = _measure(name, fn, args.ops, False, database)
+            print(f"{name:<24}{before:>13.0f}/s{after:>13.0f}/s{after / before:>9.1f}x")
+
+        database.close_all_connections()
+        os.chdir(ROOT_DIR)
+
+
+if __name__ == "__main__":
+    main()
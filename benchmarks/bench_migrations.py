@@ -0,0 +1,65 @@
+# benchmarks/bench_migrations.py
+"""
+Tempi di avvio del motore delle migrazioni.
+
+Misura su un database temporaneo:
+- l'import di database.py (non tocca più il disco: lo schema viene controllato alla prima connessione);
+- la creazione di un database nuovo con tutte le migrazioni;
+- il controllo a ogni avvio con la cartella delle migrazioni invariata (impronta salvata);
+- lo stesso controllo con rilettura e checksum di tutti i file (impronta assente).
+
+Uso:  python benchmarks/bench_migrations.py [--runs 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def _median_ms(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        start = time.perf_counter()
+        import database
+        print(f"{'import database':<36}{(time.perf_counter() - start) * 1000:>10.1f} ms")
+
+        counter = iter(range(args.runs))
+        def fresh_database():
+            database.set_database_path(os.path.join(tmp_dir, f"nuovo_{next(counter)}.db"))
+            database.migrate_database()
+        print(f"{'database nuovo (tutte le migrazioni)':<36}{_median_ms(fresh_database, args.runs):>10.1f} ms")
+
+        database.set_database_path(os.path.join(tmp_dir, "verifiche.db"))
+        database.migrate_database()
+        print(f"{'avvio, migrazioni invariate':<36}{_median_ms(database.migrate_database, args.runs):>10.2f} ms")
+
+        def full_scan():
+            conn = database.get_db_connection()
+            conn.execute("DELETE FROM schema_meta")
+            database.migrate_database()
+        print(f"{'avvio, rilettura di tutti i file':<36}{_median_ms(full_scan, args.runs):>10.2f} ms")
+
+        database.close_all_connections()
+        os.chdir(ROOT_DIR)
+
+
+if __name__ == "__main__":
+    main()
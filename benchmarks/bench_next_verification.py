@@ -0,0 +1,107 @@
+# benchmarks/bench_next_verification.py
+"""
+Benchmark del ricalcolo delle date di prossima verifica.
+
+Confronta, sullo stesso database temporaneo:
+- "per-dispositivo": lettura dell'ultima verifica, calcolo con relativedelta in Python
+  e UPDATE di una riga per dispositivo, come faceva update_device_next_verification_date();
+- "SQL": un'unica recompute_next_verification_dates() su tutti i dispositivi.
+Al termine controlla che le due modalità producano le stesse date.
+
+Uso:  python benchmarks/bench_next_verification.py [--devices 100000] [--verifications 3]
+"""
+import argparse
+import calendar
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+INTERVALS = (6, 12, 24)
+
+
+def _seed(database, n_devices, per_device):
+    customer_id = database.add_or_get_customer("Cliente Benchmark", "Via Prova 1")
+    with database.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO devices (customer_id, serial_number, description, applied_parts_json, verification_interval) VALUES (?, ?, ?, '[]', ?)",
+            [(customer_id, f"SN{i:07d}", f"Dispositivo {i}", INTERVALS[i % len(INTERVALS)]) for i in range(n_devices)]
+        )
+        # Giorni fino a fine mese inclusi, per verificare l'allineamento con relativedelta
+        conn.executemany(
+            "INSERT INTO verifications (device_id, verification_date, profile_name, results_json, overall_status) VALUES (?, ?, 'CEI 62-5', '[]', 'PASSATO')",
+            [(i + 1, _verification_date(i, k)) for i in range(n_devices) for k in range(per_device)]
+        )
+
+
+def _verification_date(i, k):
+    year, month = 2021 + k, (i + k) % 12 + 1
+    day = min((i * 7) % 31 + 1, calendar.monthrange(year, month)[1])
+    return f"{year}-{month:02d}-{day:02d}"
+
+
+def _recompute_per_device(database):
+    """Vecchio approccio: una SELECT, un calcolo Python e un UPDATE per dispositivo."""
+    from dateutil.relativedelta import relativedelta
+    conn = database.get_db_connection()
+    devices = conn.execute("SELECT id, verification_interval FROM devices WHERE verification_interval > 0").fetchall()
+    with database.transaction():
+        for device in devices:
+            last_date = conn.execute("SELECT MAX(verification_date) FROM verifications WHERE device_id = ?", (device['id'],)).fetchone()[0]
+            if last_date is None:
+                continue
+            next_date = date.fromisoformat(last_date) + relativedelta(months=int(device['verification_interval']))
+            conn.execute("UPDATE devices SET next_verification_date = ? WHERE id = ?", (next_date.strftime('%Y-%m-%d'), device['id']))
+
+
+def _snapshot(database):
+    conn = database.get_db_connection()
+    return conn.execute("SELECT id, next_verification_date FROM devices ORDER BY id").fetchall()
+
+
+def _clear(database):
+    with database.transaction() as conn:
+        conn.execute("UPDATE devices SET next_verification_date = NULL")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--devices", type=int, default=100000)
+    parser.add_argument("--verifications", type=int, default=3, help="Verifiche per dispositivo")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)  # database.py crea 'verifiche.db' nella cartella corrente
+        import database
+
+        _seed(database, args.devices, args.verifications)
+
+        _clear(database)
+        start = time.perf_counter()
+        _recompute_per_device(database)
+        per_device = time.perf_counter() - start
+        expected = [tuple(row) for row in _snapshot(database)]
+
+        _clear(database)
+        start = time.perf_counter()
+        updated = database.recompute_next_verification_dates()
+        bulk = time.perf_counter() - start
+        actual = [tuple(row) for row in _snapshot(database)]
+
+        print(f"{args.devices} dispositivi, {args.verifications} verifiche ciascuno")
+        print(f"{'per-dispositivo':<18}{per_device:>10.2f} s")
+        print(f"{'SQL':<18}{bulk:>10.2f} s   ({updated} righe aggiornate, {per_device / bulk:.1f}x)")
+        mismatches = sum(1 for a, b in zip(expected, actual) if a != b)
+        print("Date identiche." if not mismatches else f"{mismatches} date diverse!")
+
+        database.close_all_connections()
+        os.chdir(ROOT_DIR)
+        return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
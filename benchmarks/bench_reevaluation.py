@@ -0,0 +1,119 @@
+# benchmarks/bench_reevaluation.py
+"""
+Benchmark della rivalutazione delle verifiche con limiti aggiornati.
+
+Confronta, sullo stesso database temporaneo:
+- "per-misura": lettura di results_json di ogni verifica e valutazione di una misura
+  alla volta in Python (come farebbe il TestRunnerWidget);
+- "NumPy": reevaluate_verifications() sull'intero vettore delle misure.
+Al termine controlla che le due modalità trovino le stesse verifiche con esito cambiato.
+
+Uso:  python benchmarks/bench_reevaluation.py [--verifications 100000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+PROFILES = [{"profile_key": "CEI 62-5", "profile_name": "CEI 62-5", "tests": [
+    {"name": "Resistenza conduttore di protezione", "parameter": "", "limits": {"::ST": {"unit": "Ohm", "high_value": 0.2}}},
+    {"name": "Corrente dispersione apparecchio", "parameter": "NC", "limits": {"::ST": {"unit": "uA", "high_value": 500}}},
+    {"name": "Corrente dispersione apparecchio", "parameter": "SFC", "limits": {"::ST": {"unit": "uA", "high_value": 1000}}},
+    {"name": "Dispersione paziente", "parameter": "", "is_applied_part_test": True,
+     "limits": {"::B": {"unit": "uA", "high_value": 100}, "::BF": {"unit": "uA", "high_value": 100}, "::CF": {"unit": "uA", "high_value": 10}}},
+    {"name": "Isolamento", "parameter": "", "limits": {"::ST": {"unit": "MOhm"}}},
+]}]
+APPLIED_PARTS = [{"name": "ECG", "part_type": "CF"}, {"name": "SpO2", "part_type": "BF"}, {"name": "NIBP", "part_type": "BF"}]
+
+
+def _seed(database, profile, n_verifications):
+    from app import profile_engine
+    rng = random.Random(1)
+    n_devices = max(1, n_verifications // 4)
+    customer_id = database.add_or_get_customer("Cliente Benchmark", "Via Prova 1")
+    steps = profile.plan(APPLIED_PARTS)
+    with database.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO devices (customer_id, serial_number, description, applied_parts_json) VALUES (?, ?, ?, ?)",
+            [(customer_id, f"SN{i:07d}", f"Dispositivo {i}", json.dumps(APPLIED_PARTS)) for i in range(n_devices)]
+        )
+        rows = []
+        for i in range(n_verifications):
+            # Valori quasi sempre lontani dal limite, qualche misura al limite o appena oltre
+            values = [round(step.limit.high_value * (rng.uniform(0.9, 1.05) if rng.random() < 0.02 else rng.uniform(0.05, 0.45)), 3)
+                      if step.limit.high_value else 250 for step in steps]
+            evaluation = profile_engine.evaluate(steps, values)
+            rows.append((i % n_devices + 1, f"{2015 + i // 40000}-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+                         json.dumps(evaluation.results), evaluation.overall_status))
+        conn.executemany(
+            "INSERT INTO verifications (device_id, verification_date, profile_name, results_json, overall_status) VALUES (?, ?, 'CEI 62-5', ?, ?)",
+            rows
+        )
+
+
+def _reevaluate_per_measurement(database, profiles):
+    """Riferimento: decodifica results_json e valuta ogni misura singolarmente."""
+    from app import profile_engine
+    conn = database.get_db_connection()
+    changed = set()
+    for row in conn.execute("SELECT v.id, v.profile_name, v.results_json, v.overall_status, d.applied_parts_json "
+                            "FROM verifications v JOIN devices d ON d.id = v.device_id"):
+        profile = profiles[row['profile_name']]
+        part_types = {pa['name']: pa['part_type'] for pa in json.loads(row['applied_parts_json'])}
+        tests = {(t.name, t.parameter if not t.is_applied_part_test else None): t for t in profile.tests}
+        passed = True
+        for result in json.loads(row['results_json']):
+            test = tests[(result['test'], result['parameter'])]
+            limit = test.limit_for(part_types[result['applied_part']] if result['applied_part'] else None)
+            if limit.high_value is not None and float(result['value']) > limit.high_value:
+                passed = False
+        if passed != (row['overall_status'] == profile_engine.STATUS_PASSED):
+            changed.add(row['id'])
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--verifications", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        import database
+        from app import profile_engine
+        from app.reevaluation import reevaluate_verifications
+
+        profile = profile_engine.compile_profiles(PROFILES)["CEI 62-5"]
+        start = time.perf_counter()
+        _seed(database, profile, args.verifications)
+        print(f"Database di prova: {args.verifications} verifiche in {time.perf_counter() - start:.1f} s")
+
+        # Revisione della norma: limite della dispersione paziente CF ridotto del 20%
+        PROFILES[0]["tests"][3]["limits"]["::CF"]["high_value"] = 8
+        new_profiles = profile_engine.compile_profiles(PROFILES)
+
+        start = time.perf_counter()
+        expected = _reevaluate_per_measurement(database, new_profiles)
+        before = time.perf_counter() - start
+
+        start = time.perf_counter()
+        report = reevaluate_verifications(new_profiles)
+        after = time.perf_counter() - start
+
+        print(f"{'per-misura':<12}{before:>8.2f} s")
+        print(f"{'NumPy':<12}{after:>8.2f} s   ({report.measurements} misure, {before / after:.1f}x)")
+        found = {c.verification_id for c in report.changes}
+        print(f"Verifiche con esito cambiato: {len(found)} - {'coincidono' if found == expected else 'DIFFERENZE!'}")
+
+        database.close_all_connections()
+        os.chdir(ROOT_DIR)
+
+
+if __name__ == "__main__":
+    main()
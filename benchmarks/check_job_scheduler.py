@@ -0,0 +1,105 @@
+# benchmarks/check_job_scheduler.py
+"""
+Controllo di regressione sul parallelismo del JobScheduler (app.jobs).
+
+Dopo un primo job (che lascia un thread inattivo) invia insieme N job che si
+attendono a vicenda su una barriera: se lo scheduler non li esegue davvero su N
+thread la barriera scade. Controlla anche che due job con la
+stessa exclusive_key non si sovrappongano. Termina con codice 1 se un controllo fallisce.
+
+Uso:  python benchmarks/check_job_scheduler.py
+"""
+import os
+import sys
+import threading
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from app import jobs  # noqa: E402
+
+BARRIER_TIMEOUT_SECONDS = 5
+
+
+class _BarrierJob(jobs.Job):
+    name = "Barriera"
+
+    def __init__(self, barrier):
+        self.barrier = barrier
+
+    def run(self, context):
+        self.barrier.wait(BARRIER_TIMEOUT_SECONDS)
+        return threading.current_thread().name
+
+
+class _IntervalJob(jobs.Job):
+    name = "Intervallo"
+    exclusive_key = "check"
+
+    def run(self, context):
+        start = time.perf_counter()
+        time.sleep(0.2)
+        return start, time.perf_counter()
+
+
+class _NoopJob(jobs.Job):
+    name = "Vuoto"
+
+    def run(self, context):
+        return None
+
+
+def check_concurrency(n_jobs):
+    """
+    N job inviati insieme devono girare su N thread diversi, anche quando lo scheduler
+    ha già un thread inattivo (avviato da un job precedente e in attesa di lavoro).
+    """
+    scheduler = jobs.JobScheduler(max_workers=n_jobs)
+    barrier = threading.Barrier(n_jobs)
+    try:
+        scheduler.submit(_NoopJob()).get_result(5)
+        time.sleep(0.1)     # il thread torna in attesa sulla condition
+        handles = [scheduler.submit(_BarrierJob(barrier)) for _ in range(n_jobs)]
+        threads = {handle.get_result(BARRIER_TIMEOUT_SECONDS * 2) for handle in handles}
+    except (threading.BrokenBarrierError, jobs.JobError, TimeoutError) as e:
+        return f"{n_jobs} job: non eseguiti in parallelo ({type(e).__name__})"
+    finally:
+        scheduler.shutdown()
+    if len(threads) != n_jobs:
+        return f"{n_jobs} job: eseguiti su {len(threads)} thread"
+    return None
+
+
+def check_exclusive_key():
+    """
+    Due job con la stessa exclusive_key inviati insieme, con thread liberi per entrambi:
+    il secondo deve restare in coda per tutta la durata del primo.
+    """
+    scheduler = jobs.JobScheduler(max_workers=2)
+    try:
+        handles = [scheduler.submit(_IntervalJob()) for _ in range(2)]
+        first, second = [handle.get_result(5) for handle in handles]
+    finally:
+        scheduler.shutdown()
+    if second[0] < first[1] and first[0] < second[1]:
+        return "job con la stessa exclusive_key eseguiti insieme"
+    # Tolleranza per il tempo tra i due submit
+    if handles[1].wait_seconds < handles[0].run_seconds - 0.05:
+        return (f"exclusive_key: il secondo job ha atteso {handles[1].wait_seconds:.2f} s, "
+                f"meno della durata del primo ({handles[0].run_seconds:.2f} s)")
+    return None
+
+
+def main():
+    problems = [problem for problem in [check_concurrency(n) for n in (2, 3, 4)] + [check_exclusive_key()] if problem]
+    for problem in problems:
+        print(problem)
+    if problems:
+        return 1
+    print("JobScheduler: parallelismo ed exclusive_key corretti.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
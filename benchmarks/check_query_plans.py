@@ -0,0 +1,139 @@
+# benchmarks/check_query_plans.py
+"""
+Controllo di regressione sui piani di esecuzione delle query di database.py.
+
+Esegue le funzioni DAO su un database temporaneo popolato, intercetta le query
+effettivamente eseguite (con i parametri) e ne analizza l'EXPLAIN QUERY PLAN.
+Termina con codice 1 se una query esegue una scansione completa di una tabella
+senza indice o deve ordinare i risultati in un B-tree temporaneo.
+
+Uso:  python benchmarks/check_query_plans.py [-v]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# Tabelle piccole per natura, per cui una scansione completa è accettabile
+SMALL_TABLES = {"mti_instruments", "schema_version"}
+
+_FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+# Query di analisi che ordinano per data solo il sottoinsieme già filtrato da un indice
+SORT_ALLOWED = ("FROM verification_results",)
+
+# "FOR RIGHT PART OF ORDER BY" ordina solo i piccoli gruppi già letti in ordine dall'indice
+_TEMP_BTREE = re.compile(r"USE TEMP B-TREE FOR (?!RIGHT PART)")
+
+
+def _seed(database):
+    customer_ids = []
+    with database.transaction() as conn:
+        for c in range(20):
+            cursor = conn.execute("INSERT INTO customers (name, address) VALUES (?, ?)", (f"Cliente {c:03d}", "Via Prova"))
+            customer_ids.append(cursor.lastrowid)
+        conn.executemany(
+            "INSERT INTO devices (customer_id, serial_number, description, model, ams_inventory, applied_parts_json, next_verification_date) VALUES (?, ?, ?, ?, ?, '[]', ?)",
+            [(customer_ids[i % 20], f"SN{i:06d}", f"Dispositivo {i}", "Modello", f"AMS{i:06d}", f"2025-{i % 12 + 1:02d}-01") for i in range(2000)]
+        )
+        conn.executemany(
+            "INSERT INTO verifications (device_id, verification_date, profile_name, results_json, overall_status) VALUES (?, ?, 'CEI 62-5', '[]', 'PASSATO')",
+            [(i % 2000 + 1, f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}") for i in range(6000)]
+        )
+    return customer_ids[0]
+
+
+def _exercise_dao(database, customer_id):
+    """Chiama le funzioni di lettura più usate con parametri realistici."""
+    database.get_all_customers()
+    database.get_all_customers(search_query="Cliente")
+    database.get_customer_by_id(customer_id)
+    database.get_devices_for_customer(customer_id)
+    database.get_devices_for_customer(customer_id, search_query="Disp")
+    database.get_device_by_id(1)
+    database.get_device_by_serial("SN000001")
+    database.device_exists("SN000001")
+    database.search_device_globally("AMS000001")
+    database.search_customers("clie")
+    database.search_devices("SN0000", limit=50)
+    database.search_devices("disp mod", customer_id=customer_id)
+    database.get_device_count_for_customer(customer_id)
+    database.get_verifications_for_device(1)
+    database.get_verifications_for_device(1, limit=200, offset=0)
+    database.get_all_customers(limit=200, offset=200)
+    database.get_devices_for_customer(customer_id, limit=200, offset=200)
+    database.verification_exists(1, "2024-01-01", "CEI 62-5")
+    database.get_all_verifications_for_customer(customer_id)
+    database.get_stats()
+    database.get_devices_needing_verification()
+    database.get_devices_needing_verification(90, limit=200, offset=200, group_by_customer=True)
+    database.get_due_verification_summary(90)
+    database.get_all_instruments()
+    database.get_all_device_serials()
+    database.get_customer_ids_by_name()
+    database.get_customer_ids_by_name(["Cliente 001"])
+    database.get_device_ids_by_serial()
+    database.get_device_ids_by_serial(["SN000001", "SN000002"])
+    database.get_verification_keys()
+    database.get_verification_results(1)
+    database.find_verification_results(test_name="Corrente di dispersione", passed=False, limit=200)
+    list(database.iter_verification_packages("2024-01-01", "2024-01-31"))
+    list(database.iter_verification_packages("2024-01-01", customer_id=customer_id))
+    database.get_report_rows("2024-01-01", "2024-01-31", customer_id=customer_id)
+    database.get_report_rows(device_ids=[1, 2, 3])
+
+
+def _plan_problems(conn, sql):
+    problems = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + sql):
+        detail = row[3]
+        match = _FULL_SCAN.match(detail)
+        if match and match.group(1) not in SMALL_TABLES:
+            problems.append(detail)
+        # Le ricerche full-text ordinano per pertinenza solo le righe trovate: il sort è atteso
+        elif (_TEMP_BTREE.search(detail) and " MATCH " not in sql and not any(t in sql for t in SMALL_TABLES)
+              and not any(marker in sql for marker in SORT_ALLOWED)):
+            problems.append(detail)
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-v", "--verbose", action="store_true", help="Mostra il piano di tutte le query")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)  # database.py crea 'verifiche.db' nella cartella corrente
+        import database
+
+        customer_id = _seed(database)
+        conn = database.get_db_connection()
+        conn.execute("ANALYZE")
+
+        executed = []
+        conn.set_trace_callback(executed.append)
+        _exercise_dao(database, customer_id)
+        conn.set_trace_callback(None)
+
+        queries = list(dict.fromkeys(sql.strip() for sql in executed if sql.lstrip().upper().startswith("SELECT")))
+        failures = 0
+        for sql in queries:
+            problems = _plan_problems(conn, sql)
+            if problems or args.verbose:
+                print(("NESSUN INDICE: " if problems else "ok: ") + " ".join(sql.split()))
+                for row in conn.execute("EXPLAIN QUERY PLAN " + sql):
+                    print(f"    {row[3]}")
+            failures += bool(problems)
+
+        database.close_all_connections()
+        os.chdir(ROOT_DIR)
+
+    print(f"{len(queries)} query analizzate, {failures} senza indice adeguato.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,81 +1,380 @@
 # database.py (Versione con sistema di migrazione)
 import sqlite3
+import hashlib
 import json
 import os
 import logging
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import datetime
 
-def get_db_connection():
-    """Stabilisce e restituisce una connessione al database con row_factory."""
-    conn = sqlite3.connect('verifiche.db')
+DB_FILE = 'verifiche.db'
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# PRAGMA applicati a ogni nuova connessione. WAL permette letture concorrenti
+# mentre un worker scrive; con WAL, synchronous=NORMAL resta sicuro in caso di crash.
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON;",
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA cache_size = -16000;",      # ~16 MB di page cache
+    "PRAGMA mmap_size = 268435456;",    # 256 MB di memory-mapped I/O
+    "PRAGMA temp_store = MEMORY;",
+)
+BUSY_TIMEOUT_SECONDS = 10
+
+# Una connessione per thread: la GUI e ogni worker (QThread) riusano la propria.
+_local = threading.local()
+_open_states = weakref.WeakSet()
+_states_lock = threading.Lock()
+
+class _ThreadConnection:
+    """Connessione di un thread e profondità delle transazioni annidate.
+    Viene chiusa automaticamente quando il thread termina e i suoi dati locali vengono rilasciati."""
+    __slots__ = ('conn', 'tx_depth', '__weakref__')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.tx_depth = 0
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+def _open_connection():
+    """Apre e configura una nuova connessione al database."""
+    conn = sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=False)
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON;")
-    logging.info("Connessione al database stabilita.")
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    logging.info(f"Connessione al database stabilita (thread: {threading.current_thread().name}).")
     return conn
 
-def migrate_database():
+def _thread_state():
+    state = getattr(_local, 'state', None)
+    if state is None or state.conn is None:
+        if _schema_checked_path != DB_FILE:
+            _ensure_schema()
+        state = _ThreadConnection(_open_connection())
+        _local.state = state
+        with _states_lock:
+            _open_states.add(state)
+    return state
+
+def get_db_connection():
     """
-    Applica le migrazioni SQL al database in modo sequenziale.
-    Traccia la versione corrente dello schema in una tabella 'schema_version'.
+    Restituisce la connessione del thread corrente, creandola al primo utilizzo.
+    La connessione è in modalità autocommit: le scritture vanno eseguite dentro transaction().
     """
-    # 1. Crea la tabella per il versioning dello schema, se non esiste
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL);")
-    
-    # 2. Controlla la versione corrente. Se la tabella è vuota, la versione è 0.
-    cursor.execute("SELECT version FROM schema_version;")
-    result = cursor.fetchone()
-    current_version = result['version'] if result else 0
-    
-    conn.commit()
-    conn.close()
+    return _thread_state().conn
 
-    # 3. Trova e ordina i file di migrazione
-    migrations_path = 'migrations'
-    if not os.path.isdir(migrations_path):
-        logging.info(f"ERRORE: La cartella delle migrazioni '{migrations_path}' non è stata trovata.")
+def close_db_connection():
+    """Chiude la connessione del thread corrente (es. alla fine di un worker)."""
+    state = getattr(_local, 'state', None)
+    if state is None:
         return
+    _local.state = None
+    with _states_lock:
+        _open_states.discard(state)
+    state.close()
+
+def close_all_connections():
+    """Chiude tutte le connessioni aperte da qualsiasi thread (es. prima di un ripristino)."""
+    global _schema_checked_path
+    with _states_lock:
+        states = list(_open_states)
+        _open_states.clear()
+    for state in states:
+        try:
+            state.close()
+        except sqlite3.Error:
+            logging.warning("Impossibile chiudere una connessione al database.", exc_info=True)
+    _local.state = None
+    # Il file potrebbe essere sostituito (ripristino): lo schema verrà ricontrollato alla prossima connessione
+    _schema_checked_path = None
 
+def checkpoint_wal():
+    """Riporta nel file principale le pagine ancora nel WAL (es. prima di copiare il file del database)."""
+    get_db_connection().execute("PRAGMA wal_checkpoint(TRUNCATE);")
+
+def set_database_path(path):
+    """Cambia il file di database in uso, chiudendo le connessioni esistenti."""
+    global DB_FILE
+    close_all_connections()
+    DB_FILE = path
+
+@contextmanager
+def transaction():
+    """
+    Esegue il blocco in una transazione: commit all'uscita, rollback in caso di eccezione.
+    Le chiamate annidate usano un SAVEPOINT, quindi una funzione DAO può essere
+    richiamata all'interno di una transazione più ampia (es. durante un'importazione).
+    """
+    state = _thread_state()
+    conn = state.conn
+    depth = state.tx_depth
+    savepoint = f"sp_{depth}"
+    # IMMEDIATE acquisisce subito il lock di scrittura ed evita deadlock tra lettori che diventano scrittori
+    conn.execute("BEGIN IMMEDIATE" if depth == 0 else f"SAVEPOINT {savepoint}")
+    state.tx_depth = depth + 1
     try:
-        migration_files = sorted([f for f in os.listdir(migrations_path) if f.endswith('.sql')])
-    except FileNotFoundError:
-        logging.info(f"ERRORE: La cartella delle migrazioni '{migrations_path}' non è stata trovata.")
-        return
+        yield conn
+    except BaseException:
+        state.tx_depth = depth
+        if depth == 0:
+            conn.execute("ROLLBACK")
+        else:
+            conn.execute(f"ROLLBACK TO {savepoint}")
+            conn.execute(f"RELEASE {savepoint}")
+        raise
+    else:
+        state.tx_depth = depth
+        conn.execute("COMMIT" if depth == 0 else f"RELEASE {savepoint}")
+
+# --- Migrazioni dello schema ---
+# Ogni file NNN_descrizione.sql in MIGRATIONS_DIR porta lo schema alla versione NNN.
+# Ogni migrazione viene applicata in una sola transazione insieme all'aggiornamento di
+# schema_version: se uno statement fallisce lo schema resta alla versione precedente.
+# I file non devono quindi contenere BEGIN/COMMIT né PRAGMA che non ammettono transazioni.
+# schema_migrations conserva nome e checksum (SHA-256) dei file applicati; schema_meta
+# l'impronta della cartella all'ultimo controllo, così gli avvii successivi non rileggono i file.
+
+_MIGRATION_TABLES = (
+    "CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL);",
+    """CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        checksum TEXT NOT NULL,
+        applied_at TEXT,           -- NULL per le migrazioni applicate prima dello storico
+        duration_ms REAL
+    );""",
+    "CREATE TABLE IF NOT EXISTS schema_meta (key TEXT PRIMARY KEY, value TEXT);",
+)
 
-    # 4. Applica le nuove migrazioni
-    for m_file in migration_files:
+# DB_FILE il cui schema è già stato controllato in questo processo
+_schema_checked_path = None
+_schema_lock = threading.Lock()
+
+class MigrationError(Exception):
+    """Una migrazione non è stata applicata (lo schema resta alla versione precedente)."""
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    path: str
+    checksum: str
+
+@dataclass
+class MigrationPlan:
+    current_version: int
+    latest_version: int
+    pending: list = field(default_factory=list)     # Migration da applicare, in ordine
+    modified: list = field(default_factory=list)    # file già applicati ma cambiati su disco
+    applied: list = field(default_factory=list)     # Migration applicate da migrate_database
+    skipped_scan: bool = False                      # cartella invariata: file non riletti
+    seconds: float = 0.0
+
+def _scan_migrations():
+    """Legge i file di migrazione in MIGRATIONS_DIR, ordinati per versione."""
+    if not os.path.isdir(MIGRATIONS_DIR):
+        logging.error(f"La cartella delle migrazioni '{MIGRATIONS_DIR}' non è stata trovata.")
+        return []
+    migrations = {}
+    for m_file in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not m_file.endswith('.sql'):
+            continue
         try:
-            file_version = int(m_file.split('_')[0])
-        except (ValueError, IndexError):
-            logging.info(f"ATTENZIONE: Il file di migrazione '{m_file}' non è nominato correttamente e verrà ignorato.")
+            version = int(m_file.split('_')[0])
+        except ValueError:
+            logging.warning(f"Il file di migrazione '{m_file}' non è nominato correttamente e verrà ignorato.")
             continue
+        if version in migrations:
+            raise MigrationError(f"Due file di migrazione con la versione {version}: {migrations[version].name}, {m_file}")
+        path = os.path.join(MIGRATIONS_DIR, m_file)
+        with open(path, 'rb') as f:
+            checksum = hashlib.sha256(f.read()).hexdigest()
+        migrations[version] = Migration(version, m_file, path, checksum)
+    return [migrations[v] for v in sorted(migrations)]
+
+def _migrations_fingerprint():
+    """Impronta economica della cartella (una sola stat): cambia quando si aggiungono, rinominano o tolgono file."""
+    try:
+        stat = os.stat(MIGRATIONS_DIR)
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns}:{stat.st_ino}"
+
+def latest_schema_version():
+    """Versione dello schema dopo l'ultima migrazione disponibile in MIGRATIONS_DIR (0 se nessuna)."""
+    migrations = _scan_migrations()
+    return migrations[-1].version if migrations else 0
 
-        if file_version > current_version:
-            logging.info(f"Applicando migrazione: {m_file}...")
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            with open(os.path.join(migrations_path, m_file), 'r', encoding='utf-8') as f:
-                sql_script = f.read()
-            
-            # Esegui lo script di migrazione
-            cursor.executescript(sql_script)
-
-            # Aggiorna la versione dello schema nel database
-            if current_version == 0 and file_version == 1:
-                 # Se partiamo da zero, inseriamo la prima versione
-                 cursor.execute("INSERT INTO schema_version (version) VALUES (?)", (file_version,))
-            else:
-                # Altrimenti, la aggiorniamo
-                cursor.execute("UPDATE schema_version SET version = ?", (file_version,))
-            
-            conn.commit()
-            conn.close()
-            current_version = file_version # Aggiorna la versione in memoria
-            logging.info(f"Database aggiornato alla versione {current_version}.")
+def _split_sql_statements(sql_script):
+    """Divide uno script in statement singoli (i trigger BEGIN ... END restano interi)."""
+    statement = ""
+    for piece in sql_script.split(';'):
+        statement += piece + ';'
+        if sqlite3.complete_statement(statement):
+            if statement.strip(' \t\r\n;'):
+                yield statement
+            statement = ""
+    if statement.strip(' \t\r\n;'):
+        yield statement
+
+def _read_schema_state(conn):
+    """(versione corrente, {versione: checksum applicato}, impronta salvata) di un database già inizializzato."""
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    history = dict(conn.execute("SELECT version, checksum FROM schema_migrations").fetchall())
+    fingerprint = conn.execute("SELECT value FROM schema_meta WHERE key = 'migrations_fingerprint'").fetchone()
+    return (row[0] or 0), history, (fingerprint[0] if fingerprint else None)
+
+def _build_plan(current_version, history, migrations):
+    plan = MigrationPlan(current_version=current_version,
+                         latest_version=max([current_version] + [m.version for m in migrations]))
+    for migration in migrations:
+        if migration.version > current_version:
+            plan.pending.append(migration)
+        elif migration.version in history and history[migration.version] != migration.checksum:
+            plan.modified.append(migration)
+    return plan
+
+def migration_plan(db_path=None):
+    """
+    Modalità di prova: restituisce le migrazioni che migrate_database applicherebbe
+    (MigrationPlan) senza modificare il database, che viene aperto in sola lettura.
+    """
+    db_path = db_path or DB_FILE
+    migrations = _scan_migrations()
+    if not os.path.exists(db_path):
+        return _build_plan(0, {}, migrations)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        current_version = 0
+        history = {}
+        if 'schema_version' in tables:
+            current_version = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] or 0
+        if 'schema_migrations' in tables:
+            history = dict(conn.execute("SELECT version, checksum FROM schema_migrations").fetchall())
+    finally:
+        conn.close()
+    return _build_plan(current_version, history, migrations)
+
+@contextmanager
+def _immediate_transaction(conn):
+    """Transazione su una connessione dedicata (non quella del thread gestita da transaction())."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+
+def _apply_migration(conn, migration):
+    """Applica una migrazione in una transazione; solleva MigrationError lasciando lo schema invariato."""
+    with open(migration.path, 'r', encoding='utf-8') as f:
+        sql_script = f.read()
+    start = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Un altro processo potrebbe averla applicata mentre attendevamo il lock
+        current_version = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] or 0
+        if migration.version <= current_version:
+            conn.execute("ROLLBACK")
+            return False
+        for statement in _split_sql_statements(sql_script):
+            conn.execute(statement)
+        conn.execute("DELETE FROM schema_version")
+        conn.execute("INSERT INTO schema_version (version) VALUES (?)", (migration.version,))
+        conn.execute(
+            "INSERT OR REPLACE INTO schema_migrations (version, name, checksum, applied_at, duration_ms) VALUES (?, ?, ?, ?, ?)",
+            (migration.version, migration.name, migration.checksum,
+             datetime.now().isoformat(timespec='seconds'), (time.perf_counter() - start) * 1000)
+        )
+        conn.execute("COMMIT")
+    except Exception as e:
+        conn.execute("ROLLBACK")
+        raise MigrationError(f"Migrazione {migration.name} non applicata: {e}") from e
+    return True
+
+def migrate_database(dry_run=False):
+    """
+    Porta lo schema del database all'ultima versione applicando le migrazioni mancanti,
+    ognuna nella propria transazione. Con dry_run=True restituisce solo il piano.
+    Se la cartella delle migrazioni non è cambiata dall'ultimo controllo e il database
+    è all'ultima versione registrata, i file non vengono riletti.
+    Restituisce un MigrationPlan (con `applied` e il tempo impiegato).
+    """
+    global _schema_checked_path
+    if dry_run:
+        return migration_plan()
+
+    start = time.perf_counter()
+    conn = _open_connection()
+    try:
+        for statement in _MIGRATION_TABLES:
+            conn.execute(statement)
+        current_version, history, stored_fingerprint = _read_schema_state(conn)
+        fingerprint = _migrations_fingerprint()
+        if fingerprint is not None and fingerprint == stored_fingerprint and current_version in history:
+            plan = MigrationPlan(current_version=current_version, latest_version=current_version, skipped_scan=True)
+            plan.seconds = time.perf_counter() - start
+            logging.info(f"Schema del database alla versione {current_version}: migrazioni invariate ({plan.seconds * 1000:.1f} ms).")
+            _schema_checked_path = DB_FILE
+            return plan
+
+        migrations = _scan_migrations()
+        plan = _build_plan(current_version, history, migrations)
+        for migration in plan.modified:
+            logging.warning(f"Il file di migrazione {migration.name} è cambiato dopo essere stato applicato.")
+
+        with _immediate_transaction(conn):
+            # Registra i file applicati prima che esistesse lo storico (database esistenti)
+            conn.executemany(
+                "INSERT OR IGNORE INTO schema_migrations (version, name, checksum) VALUES (?, ?, ?)",
+                [(m.version, m.name, m.checksum) for m in migrations if m.version <= current_version]
+            )
+        for migration in plan.pending:
+            logging.info(f"Applicando migrazione: {migration.name}...")
+            if _apply_migration(conn, migration):
+                plan.applied.append(migration)
+                logging.info(f"Database aggiornato alla versione {migration.version}.")
+
+        if fingerprint is not None:
+            with _immediate_transaction(conn):
+                conn.execute("INSERT OR REPLACE INTO schema_meta (key, value) VALUES ('migrations_fingerprint', ?)", (fingerprint,))
+        plan.seconds = time.perf_counter() - start
+        logging.info(f"Controllo dello schema completato: {len(plan.applied)} migrazioni applicate "
+                     f"in {plan.seconds * 1000:.1f} ms (versione {plan.latest_version}).")
+        _schema_checked_path = DB_FILE
+        return plan
+    finally:
+        conn.close()
+
+def _ensure_schema():
+    """
+    Applica le migrazioni la prima volta che il processo usa DB_FILE, se l'avvio
+    dell'applicazione non l'ha già fatto con migrate_database() (app/startup.py).
+    """
+    with _schema_lock:
+        if _schema_checked_path != DB_FILE:
+            migrate_database()
 
 # --- Funzioni di manipolazione dati (DAO - Data Access Object) ---
+# Le letture usano direttamente la connessione del thread; le scritture passano da transaction().
 
 def add_device(customer_id, serial, desc, mfg, model, applied_parts, customer_inv, ams_inv, verification_interval):
     """Aggiunge un nuovo dispositivo, includendo l'intervallo di verifica."""
@@ -93,13 +392,11 @@ def add_device(customer_id, serial, desc, mfg, model, applied_parts, customer_in
         pass
     # --- FINE LOGICA CORRETTA ---
 
-    conn = get_db_connection()
-    conn.execute(
-        "INSERT INTO devices (customer_id, serial_number, description, manufacturer, model, applied_parts_json, customer_inventory, ams_inventory, verification_interval) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-        (customer_id, serial, desc, mfg, model, pa_json, customer_inv, ams_inv, interval)
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO devices (customer_id, serial_number, description, manufacturer, model, applied_parts_json, customer_inventory, ams_inventory, verification_interval) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (customer_id, serial, desc, mfg, model, pa_json, customer_inv, ams_inv, interval)
+        )
 
 def update_device(dev_id, serial, desc, mfg, model, applied_parts, customer_inv, ams_inv, verification_interval):
     """Aggiorna un dispositivo esistente, includendo l'intervallo di verifica."""
@@ -113,237 +410,272 @@ def update_device(dev_id, serial, desc, mfg, model, applied_parts, customer_inv,
         pass
     # --- FINE LOGICA CORRETTA ---
     
-    conn = get_db_connection()
-    conn.execute(
-        "UPDATE devices SET serial_number=?, description=?, manufacturer=?, model=?, applied_parts_json=?, customer_inventory=?, ams_inventory=?, verification_interval=? WHERE id=?",
-        (serial, desc, mfg, model, pa_json, customer_inv, ams_inv, interval, dev_id)
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE devices SET serial_number=?, description=?, manufacturer=?, model=?, applied_parts_json=?, customer_inventory=?, ams_inventory=?, verification_interval=? WHERE id=?",
+            (serial, desc, mfg, model, pa_json, customer_inv, ams_inv, interval, dev_id)
+        )
+        # Un nuovo intervallo sposta la scadenza calcolata dall'ultima verifica
+        recompute_next_verification_dates([dev_id])
 
 def add_customer(name, address, phone, email):
-    conn = get_db_connection()
-    try:
+    with transaction() as conn:
         conn.execute("INSERT INTO customers (name, address, phone, email) VALUES (?, ?, ?, ?)", (name, address, phone, email))
-        logging.info(f"Cliente aggiunto: {name}.")
-        conn.commit()
-    finally:
-        conn.close()
+    logging.info(f"Cliente aggiunto: {name}.")
 
 def update_customer(cust_id, name, address, phone, email):
-    conn = get_db_connection()
-    conn.execute("UPDATE customers SET name=?, address=?, phone=?, email=? WHERE id=?", (name, address, phone, email, cust_id))
+    with transaction() as conn:
+        conn.execute("UPDATE customers SET name=?, address=?, phone=?, email=? WHERE id=?", (name, address, phone, email, cust_id))
     logging.info(f"Cliente ID {cust_id} aggiornato: {name}.")
-    conn.commit()
-    conn.close()
 
 def delete_customer(cust_id):
-    conn = get_db_connection()
     try:
-        conn.execute("DELETE FROM customers WHERE id=?", (cust_id,))
-        conn.commit()
+        with transaction() as conn:
+            conn.execute("DELETE FROM customers WHERE id=?", (cust_id,))
         logging.info(f"Cliente ID {cust_id} eliminato.")    
         return True, "Cliente eliminato."
     except sqlite3.IntegrityError:
         return False, "Impossibile eliminare: il cliente ha dispositivi associati."
-    finally:
-        conn.close()
-
-def get_all_customers():
-    conn = get_db_connection()
-    customers = conn.execute("SELECT * FROM customers ORDER BY name").fetchall()
-    conn.close()
-    return customers
 
 def add_or_get_customer(name, address=""):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM customers WHERE name = ?", (name,))
-    customer = cursor.fetchone()
-    if customer:
-        conn.close()
-        return customer['id']
-    else:
-        cursor.execute("INSERT INTO customers (name, address) VALUES (?, ?)", (name, address))
-        customer_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return customer_id
+    with transaction() as conn:
+        customer = conn.execute("SELECT id FROM customers WHERE name = ?", (name,)).fetchone()
+        if customer:
+            return customer['id']
+        cursor = conn.execute("INSERT INTO customers (name, address) VALUES (?, ?)", (name, address))
+        return cursor.lastrowid
 
 def device_exists(serial_number):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM devices WHERE serial_number = ?", (serial_number,))
-    device = cursor.fetchone()
-    conn.close()
+    device = conn.execute("SELECT id FROM devices WHERE serial_number = ?", (serial_number,)).fetchone()
     return device is not None
 
+def get_all_device_serials():
+    """Restituisce l'insieme di tutte le matricole presenti, per i controlli di duplicato in blocco."""
+    conn = get_db_connection()
+    return {row[0] for row in conn.execute("SELECT serial_number FROM devices WHERE serial_number IS NOT NULL")}
+
+def add_devices_bulk(devices):
+    """
+    Inserisce più dispositivi con un'unica executemany.
+    `devices` è una sequenza di tuple (customer_id, serial, desc, mfg, model,
+    applied_parts_json, customer_inv, ams_inv, verification_interval).
+    """
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO devices (customer_id, serial_number, description, manufacturer, model, applied_parts_json, customer_inventory, ams_inventory, verification_interval) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            devices
+        )
+
 def delete_device(dev_id):
     """Elimina un dispositivo e, a cascata, tutte le sue verifiche."""
-    conn = get_db_connection()
     try:
-        conn.execute("DELETE FROM devices WHERE id=?", (dev_id,))
-        conn.commit()
+        with transaction() as conn:
+            conn.execute("DELETE FROM devices WHERE id=?", (dev_id,))
         logging.warning(f"Dispositivo con ID {dev_id} e tutte le sue verifiche sono stati eliminati.")
     except Exception as e:
+        # In caso di errore la transazione è già stata annullata
         logging.error(f"Errore durante l'eliminazione del dispositivo ID {dev_id}", exc_info=True)
-        # In caso di errore, annulla la transazione
-        conn.rollback()
-    finally:
-        conn.close()
 
-def get_devices_for_customer(customer_id):
+def get_device_by_id(device_id):
     conn = get_db_connection()
-    devices = conn.execute("SELECT * FROM devices WHERE customer_id = ? ORDER BY description", (customer_id,)).fetchall()
-    conn.close()
-    return devices
+    return conn.execute("SELECT * FROM devices WHERE id = ?", (device_id,)).fetchone()
 
-def get_device_by_id(device_id):
+def get_verifications_for_device(device_id, limit=None, offset=0):
+    """Recupera le verifiche per un dato dispositivo (tutte, o una pagina con limit/offset)."""
     conn = get_db_connection()
-    device = conn.execute("SELECT * FROM devices WHERE id = ?", (device_id,)).fetchone()
-    conn.close()
-    return device
+    # La query "SELECT *" seleziona automaticamente anche la nuova colonna 'technician_name'
+    query, params = _paginate(
+        "SELECT * FROM verifications WHERE device_id = ? ORDER BY verification_date DESC, id DESC",
+        [device_id], limit, offset
+    )
+    return conn.execute(query, params).fetchall()
 
-# app/workers/stm_import_worker.py
-import json
-import logging
-from PySide6.QtCore import QObject, Signal
-import database
+def _paginate(query, params, limit, offset):
+    """
+    Aggiunge LIMIT/OFFSET alla query per il caricamento a pagine delle tabelle.
+    Le query paginate devono avere un ORDER BY univoco (es. terminare con l'id),
+    altrimenti una riga potrebbe comparire in due pagine.
+    """
+    if limit is None:
+        return query, params
+    return query + " LIMIT ? OFFSET ?", list(params) + [limit, offset]
 
-class StmImportWorker(QObject):
-    """Esegue l'importazione di un file archivio .stm in background."""
-    finished = Signal(int, int, int, int) # verif_imp, verif_skip, dev_new, cust_new
-    error = Signal(str)
+def _fts_match_expression(search_text):
+    """
+    Converte il testo digitato dall'utente in un'espressione MATCH FTS5.
+    Ogni parola diventa una frase con l'ultimo token in prefisso ("SN-12" trova "SN-1234"),
+    le parole sono in AND. Restituisce None se non c'è nulla da cercare.
+    """
+    terms = [term for term in (search_text or "").split() if any(ch.isalnum() for ch in term)]
+    if not terms:
+        return None
+    return " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
 
-    def __init__(self, filepath):
-        super().__init__()
-        self.filepath = filepath
+def search_customers(search_text, limit=None, offset=0):
+    """
+    Ricerca full-text dei clienti per nome, con corrispondenza per prefisso.
+    I risultati sono ordinati per pertinenza; senza testo restituisce tutti i clienti.
+    """
+    match = _fts_match_expression(search_text)
+    if match is None:
+        return get_all_customers(limit=limit, offset=offset)
+    conn = get_db_connection()
+    query, params = _paginate("""
+        SELECT c.* FROM customers_fts f JOIN customers c ON c.id = f.rowid
+        WHERE customers_fts MATCH ? ORDER BY f.rank, c.name
+    """, [match], limit, offset)
+    return conn.execute(query, params).fetchall()
 
-    def run(self):
-        logging.info(f"Avvio importazione dall'archivio: {self.filepath}")
-        try:
-            with open(self.filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except Exception as e:
-            self.error.emit(f"Impossibile leggere o parsare il file .stm: {e}")
-            return
-
-        verif_imported = 0
-        verif_skipped = 0
-        devices_created = 0
-        customers_created = 0
-        
-        # Itera su ogni pacchetto di verifica presente nel file
-        for verification_package in data.get("verifications", []):
-            try:
-                # --- 1. Gestione Cliente ---
-                customer_data = verification_package['customer']
-                customer_id = database.add_or_get_customer(customer_data['name'], customer_data['address'])
-                
-                # --- 2. Gestione Dispositivo ---
-                device_data = verification_package['device']
-                device_serial = device_data['serial_number']
-                
-                existing_device = database.get_device_by_serial(device_serial)
-                if existing_device:
-                    device_id = existing_device['id']
-                else:
-                    # Crea il nuovo dispositivo se non esiste
-                    database.add_device(
-                        customer_id, device_serial, device_data['description'], device_data['manufacturer'],
-                        device_data['model'], json.loads(device_data['applied_parts_json']), 
-                        device_data['customer_inventory'], device_data['ams_inventory']
-                    )
-                    new_device = database.get_device_by_serial(device_serial)
-                    device_id = new_device['id']
-                    devices_created += 1
-                    logging.info(f"Nuovo dispositivo creato: {device_serial}")
-                
-                # --- 3. Gestione Verifica ---
-                verif_details = verification_package['verification_details']
-                verif_date = verif_details['verification_date']
-                verif_profile = verif_details['profile_name']
-
-                if database.verification_exists(device_id, verif_date, verif_profile):
-                    verif_skipped += 1
-                    logging.warning(f"Verifica del {verif_date} per S/N {device_serial} già esistente. Saltata.")
-                else:
-                    # Salva la nuova verifica
-                    database.save_verification(
-                        device_id=device_id,
-                        verification_date=verif_date,
-                        profile_name=verif_profile,
-                        results=json.loads(verif_details['results_json']),
-                        overall_status=verif_details['overall_status'],
-                        visual_inspection_data=json.loads(verif_details['visual_inspection_json']),
-                        mti_info=verif_details['mti_info']
-                    )
-                    verif_imported += 1
-            
-            except Exception as e:
-                logging.error(f"Errore durante l'importazione di un record di verifica.", exc_info=True)
-                verif_skipped += 1 # Salta il record problematico
-
-        self.finished.emit(verif_imported, verif_skipped, devices_created, customers_created)
-
-def get_verifications_for_device(device_id):
-    """Recupera tutte le verifiche per un dato dispositivo."""
+def search_devices(search_text, customer_id=None, limit=None, offset=0):
+    """
+    Ricerca full-text dei dispositivi su descrizione, matricola, modello, costruttore,
+    inventari cliente/AMS e nome del cliente, con corrispondenza per prefisso.
+    I risultati sono ordinati per pertinenza; `customer_id` limita la ricerca a un cliente.
+    """
+    match = _fts_match_expression(search_text)
+    if match is None:
+        return get_devices_for_customer(customer_id, limit=limit, offset=offset) if customer_id is not None else []
     conn = get_db_connection()
-    # La query "SELECT *" seleziona automaticamente anche la nuova colonna 'technician_name'
-    verifications = conn.execute(
-        "SELECT * FROM verifications WHERE device_id = ? ORDER BY verification_date DESC", 
-        (device_id,)
-    ).fetchall()
-    conn.close()
-    return verifications
+    query = """
+        SELECT d.* FROM devices_fts f JOIN devices d ON d.id = f.rowid
+        WHERE devices_fts MATCH ?
+    """
+    params = [match]
+    if customer_id is not None:
+        query += " AND d.customer_id = ?"
+        params.append(customer_id)
+    query += " ORDER BY f.rank, d.description, d.id"
+    query, params = _paginate(query, params, limit, offset)
+    return conn.execute(query, params).fetchall()
 
-def get_all_customers(search_query=None):
-    """Restituisce tutti i clienti, filtrati opzionalmente per nome."""
+def get_all_customers(search_query=None, limit=None, offset=0):
+    """Restituisce i clienti, filtrati opzionalmente per nome (ricerca full-text) e paginati."""
+    if search_query and _fts_match_expression(search_query):
+        return search_customers(search_query, limit=limit, offset=offset)
     conn = get_db_connection()
-    query = "SELECT * FROM customers"
-    params = []
-    if search_query:
-        query += " WHERE name LIKE ?"
-        params.append(f"%{search_query}%")
-    query += " ORDER BY name"
-    customers = conn.execute(query, params).fetchall()
-    conn.close()
-    return customers
-
-def get_devices_for_customer(customer_id, search_query=None):
-    """Restituisce i dispositivi di un cliente, filtrati opzionalmente."""
+    query, params = _paginate("SELECT * FROM customers ORDER BY name", [], limit, offset)
+    return conn.execute(query, params).fetchall()
+
+def get_devices_for_customer(customer_id, search_query=None, limit=None, offset=0):
+    """Restituisce i dispositivi di un cliente, filtrati opzionalmente (ricerca full-text) e paginati."""
+    if search_query and _fts_match_expression(search_query):
+        return search_devices(search_query, customer_id=customer_id, limit=limit, offset=offset)
     conn = get_db_connection()
-    query = "SELECT * FROM devices WHERE customer_id = ?"
-    params = [customer_id]
-    if search_query:
-        query += " AND (description LIKE ? OR serial_number LIKE ? OR model LIKE ? OR ams_inventory LIKE ? OR customer_inventory LIKE ?)"
-        params.extend([f"%{search_query}%", f"%{search_query}%", f"%{search_query}%", f"%{search_query}%", f"%{search_query}%"])
-    query += " ORDER BY description"
-    devices = conn.execute(query, params).fetchall()
-    conn.close()
-    return devices
+    query, params = _paginate("SELECT * FROM devices WHERE customer_id = ? ORDER BY description, id", [customer_id], limit, offset)
+    return conn.execute(query, params).fetchall()
+
+_STATS_FIELDS = ("device_count", "verification_count", "passed_count", "failed_count", "last_verification_date")
+
+# Statistiche ricalcolate da zero, per il controllo di coerenza delle tabelle mantenute dai trigger
+_EXPECTED_GLOBAL_STATS_QUERY = """
+    SELECT
+        (SELECT COUNT(*) FROM customers) AS customer_count,
+        (SELECT COUNT(*) FROM devices) AS device_count,
+        (SELECT COUNT(*) FROM verifications) AS verification_count,
+        (SELECT COUNT(*) FROM verifications WHERE overall_status = 'PASSATO') AS passed_count,
+        (SELECT COUNT(*) FROM verifications WHERE overall_status = 'FALLITO') AS failed_count,
+        (SELECT MAX(verification_date) FROM verifications) AS last_verification_date
+"""
+_EXPECTED_CUSTOMER_STATS_QUERY = """
+    SELECT c.id AS customer_id,
+        (SELECT COUNT(*) FROM devices d WHERE d.customer_id = c.id) AS device_count,
+        COUNT(v.id) AS verification_count,
+        COUNT(CASE WHEN v.overall_status = 'PASSATO' THEN 1 END) AS passed_count,
+        COUNT(CASE WHEN v.overall_status = 'FALLITO' THEN 1 END) AS failed_count,
+        MAX(v.verification_date) AS last_verification_date
+    FROM customers c
+    LEFT JOIN devices d ON d.customer_id = c.id
+    LEFT JOIN verifications v ON v.device_id = d.id
+    GROUP BY c.id
+"""
 
 def get_stats():
-    """Restituisce un dizionario con le statistiche principali."""
+    """
+    Restituisce un dizionario con le statistiche principali della dashboard.
+    I valori sono letti dalla tabella global_stats, mantenuta dai trigger, senza scansioni.
+    """
     conn = get_db_connection()
-    cursor = conn.cursor()
 
     try:
-        device_count = cursor.execute("SELECT COUNT(id) FROM devices").fetchone()[0]
-        customer_count = cursor.execute("SELECT COUNT(id) FROM customers").fetchone()[0]
-        last_verif_date = cursor.execute("SELECT MAX(verification_date) FROM verifications").fetchone()[0]
+        row = conn.execute("SELECT * FROM global_stats WHERE id = 1").fetchone()
     except Exception:
         # Gestisce il caso di DB vuoto o errori
-        return {"devices": 0, "customers": 0, "last_verif": "N/A"}
-    finally:
-        conn.close()
+        row = None
+    if row is None:
+        return {"devices": 0, "customers": 0, "verifications": 0, "passed": 0, "failed": 0, "last_verif": "N/A"}
 
     return {
-        "devices": device_count,
-        "customers": customer_count,
-        "last_verif": last_verif_date if last_verif_date else "Nessuna"
+        "devices": row["device_count"],
+        "customers": row["customer_count"],
+        "verifications": row["verification_count"],
+        "passed": row["passed_count"],
+        "failed": row["failed_count"],
+        "last_verif": row["last_verification_date"] if row["last_verification_date"] else "Nessuna"
     }
 
+def get_customer_stats(customer_id):
+    """Restituisce le statistiche mantenute di un cliente (dispositivi, verifiche, esiti, ultima verifica)."""
+    conn = get_db_connection()
+    row = conn.execute("SELECT * FROM customer_stats WHERE customer_id = ?", (customer_id,)).fetchone()
+    if row is None:
+        return {"devices": 0, "verifications": 0, "passed": 0, "failed": 0, "last_verif": "Nessuna"}
+    return {
+        "devices": row["device_count"],
+        "verifications": row["verification_count"],
+        "passed": row["passed_count"],
+        "failed": row["failed_count"],
+        "last_verif": row["last_verification_date"] if row["last_verification_date"] else "Nessuna"
+    }
+
+def check_stats_consistency(repair=False):
+    """
+    Ricalcola da zero le statistiche e le confronta con global_stats e customer_stats.
+    Restituisce la lista delle differenze trovate (vuota se tutto è coerente).
+    Con repair=True le tabelle delle statistiche vengono ricostruite dai dati.
+    """
+    conn = get_db_connection()
+    differences = []
+
+    expected = conn.execute(_EXPECTED_GLOBAL_STATS_QUERY).fetchone()
+    stored = conn.execute("SELECT * FROM global_stats WHERE id = 1").fetchone()
+    for column in ("customer_count",) + _STATS_FIELDS:
+        stored_value = stored[column] if stored else None
+        if stored_value != expected[column]:
+            differences.append(f"Totali: {column} = {stored_value}, atteso {expected[column]}")
+
+    expected_customers = {row["customer_id"]: row for row in conn.execute(_EXPECTED_CUSTOMER_STATS_QUERY)}
+    stored_customers = {row["customer_id"]: row for row in conn.execute("SELECT * FROM customer_stats")}
+    for customer_id in sorted(set(expected_customers) | set(stored_customers)):
+        expected_row = expected_customers.get(customer_id)
+        stored_row = stored_customers.get(customer_id)
+        if expected_row is None:
+            differences.append(f"Cliente {customer_id}: statistiche presenti per un cliente inesistente")
+            continue
+        if stored_row is None:
+            differences.append(f"Cliente {customer_id}: statistiche mancanti")
+            continue
+        for column in _STATS_FIELDS:
+            if stored_row[column] != expected_row[column]:
+                differences.append(f"Cliente {customer_id}: {column} = {stored_row[column]}, atteso {expected_row[column]}")
+
+    if differences:
+        logging.warning(f"Statistiche non coerenti con i dati: {len(differences)} differenze.")
+    if differences and repair:
+        with transaction() as conn:
+            conn.execute("DELETE FROM global_stats")
+            conn.execute(
+                "INSERT INTO global_stats (id, customer_count, " + ", ".join(_STATS_FIELDS) + ") "
+                "SELECT 1, customer_count, " + ", ".join(_STATS_FIELDS) + " FROM (" + _EXPECTED_GLOBAL_STATS_QUERY + ")"
+            )
+            conn.execute("DELETE FROM customer_stats")
+            conn.execute(
+                "INSERT INTO customer_stats (customer_id, " + ", ".join(_STATS_FIELDS) + ") "
+                "SELECT customer_id, " + ", ".join(_STATS_FIELDS) + " FROM (" + _EXPECTED_CUSTOMER_STATS_QUERY + ")"
+            )
+        logging.info("Statistiche ricostruite dai dati.")
+    return differences
+
 def get_all_verifications_for_customer(customer_id):
     """
     Recupera una lista completa di tutte le verifiche per tutti i dispositivi
@@ -368,69 +700,259 @@ def get_all_verifications_for_customer(customer_id):
         WHERE c.id = ?
         ORDER BY d.description, v.verification_date DESC;
     """
-    verifications = conn.execute(query, (customer_id,)).fetchall()
-    conn.close()
-    return verifications
+    return conn.execute(query, (customer_id,)).fetchall()
 
-def get_full_verification_data_for_date(target_date):
+# --- Risultati normalizzati (tabella verification_results, popolata dai trigger) ---
+
+def get_verification_results(verification_id):
+    """Restituisce le misure di una verifica (una riga per test / parte applicata), nell'ordine originale."""
+    conn = get_db_connection()
+    return conn.execute(
+        "SELECT * FROM verification_results WHERE verification_id = ? ORDER BY position",
+        (verification_id,)
+    ).fetchall()
+
+def _results_filters(test_name=None, passed=None, model=None, manufacturer=None, customer_id=None, date_from=None, date_to=None):
+    conditions, params = [], []
+    if test_name is not None:
+        conditions.append("r.test_name = ?"); params.append(test_name)
+    if passed is not None:
+        conditions.append("r.passed = ?"); params.append(1 if passed else 0)
+    if model is not None:
+        conditions.append("d.model = ?"); params.append(model)
+    if manufacturer is not None:
+        conditions.append("d.manufacturer = ?"); params.append(manufacturer)
+    if customer_id is not None:
+        conditions.append("d.customer_id = ?"); params.append(customer_id)
+    if date_from is not None:
+        conditions.append("v.verification_date >= ?"); params.append(date_from)
+    if date_to is not None:
+        conditions.append("v.verification_date <= ?"); params.append(date_to)
+    return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+def find_verification_results(test_name=None, passed=None, model=None, manufacturer=None, customer_id=None,
+                              date_from=None, date_to=None, limit=None, offset=0):
     """
-    Recupera tutte le verifiche di una data specifica, complete di dati
-    di dispositivo e cliente, e le struttura in un dizionario per l'export.
+    Cerca le singole misure con filtri opzionali (es. tutte le dispersioni fallite di un modello:
+    test_name="...", passed=False, model="X"). Ogni riga include data e profilo della verifica
+    e i dati principali del dispositivo. Ordinate dalla verifica più recente.
     """
+    where, params = _results_filters(test_name, passed, model, manufacturer, customer_id, date_from, date_to)
+    query = f"""
+        SELECT r.*, v.verification_date, v.profile_name, v.overall_status, v.device_id,
+               d.serial_number, d.description, d.manufacturer, d.model, d.customer_id
+        FROM verification_results r
+        JOIN verifications v ON v.id = r.verification_id
+        JOIN devices d ON d.id = v.device_id
+        {where}
+        ORDER BY v.verification_date DESC, r.verification_id DESC, r.position
+    """
+    query, params = _paginate(query, params, limit, offset)
     conn = get_db_connection()
-    # Query che unisce tutte le tabelle e filtra per data
-    query = """
-        SELECT 
-            c.id as customer_id, c.name as customer_name, c.address as customer_address,
-            d.id as device_id, d.serial_number, d.description, d.manufacturer, d.model, d.applied_parts_json, d.customer_inventory, d.ams_inventory,
-            v.id as verification_id, v.verification_date, v.profile_name, v.results_json, v.overall_status, v.visual_inspection_json, v.mti_instrument, v.mti_serial, v.mti_version, v.mti_cal_date
+    return conn.execute(query, params).fetchall()
+
+def get_test_results_summary(model=None, manufacturer=None, customer_id=None, date_from=None, date_to=None):
+    """
+    Statistiche per test: numero di misure, quante fallite e valori minimo/medio/massimo.
+    Accetta gli stessi filtri di find_verification_results.
+    """
+    where, params = _results_filters(None, None, model, manufacturer, customer_id, date_from, date_to)
+    query = f"""
+        SELECT r.test_name, r.unit, COUNT(*) AS measurements,
+               SUM(CASE WHEN r.passed THEN 0 ELSE 1 END) AS failed,
+               MIN(r.value) AS min_value, AVG(r.value) AS avg_value, MAX(r.value) AS max_value
+        FROM verification_results r
+        JOIN verifications v ON v.id = r.verification_id
+        JOIN devices d ON d.id = v.device_id
+        {where}
+        GROUP BY r.test_name, r.unit
+        ORDER BY r.test_name
+    """
+    conn = get_db_connection()
+    return conn.execute(query, params).fetchall()
+
+def _verification_date_filter(date_from, date_to):
+    conditions, params = [], []
+    if date_from is not None:
+        conditions.append("v.verification_date >= ?"); params.append(date_from)
+    if date_to is not None:
+        conditions.append("v.verification_date <= ?"); params.append(date_to)
+    return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+def get_verifications_for_reevaluation(date_from=None, date_to=None):
+    """(id, profile_name, overall_status, device_id) delle verifiche da rivalutare, ordinate per id."""
+    where, params = _verification_date_filter(date_from, date_to)
+    cursor = get_db_connection().cursor()
+    cursor.row_factory = None
+    return cursor.execute(f"SELECT v.id, v.profile_name, v.overall_status, v.device_id FROM verifications v{where} ORDER BY v.id", params).fetchall()
+
+def iter_results_for_reevaluation(date_from=None, date_to=None, fetch_size=20000):
+    """
+    Itera a blocchi (liste di tuple) le misure delle verifiche da rivalutare, in ordine di verifica:
+    (verification_id, position, test_name, parameter, applied_part, value, passed).
+    value è None per le misure non numeriche.
+    """
+    where, params = _verification_date_filter(date_from, date_to)
+    if where:
+        query = f"""
+            SELECT r.verification_id, r.position, r.test_name, r.parameter, r.applied_part, r.value, r.passed
+            FROM verification_results r JOIN verifications v ON v.id = r.verification_id
+            {where}
+            ORDER BY r.verification_id, r.position
+        """
+    else:
+        query = """
+            SELECT r.verification_id, r.position, r.test_name, r.parameter, r.applied_part, r.value, r.passed
+            FROM verification_results r
+            ORDER BY r.verification_id, r.position
+        """
+    cursor = get_db_connection().cursor()
+    cursor.row_factory = None   # tuple semplici: vengono trasformate in colonne
+    cursor.execute(query, params)
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        yield rows
+
+def get_applied_part_types():
+    """Tipo di ogni parte applicata registrata: {(device_id, nome della parte): tipo}."""
+    part_types = {}
+    for device_id, applied_parts_json in get_db_connection().execute("SELECT id, applied_parts_json FROM devices"):
+        try:
+            applied_parts = json.loads(applied_parts_json or '[]')
+        except json.JSONDecodeError:
+            continue
+        for part in applied_parts:
+            if isinstance(part, dict) and 'name' in part:
+                part_types.setdefault((device_id, part['name']), part.get('part_type'))
+    return part_types
+
+def get_results_for_verifications(verification_ids):
+    """Righe di verification_results delle verifiche indicate: {(verification_id, position): riga}."""
+    conn = get_db_connection()
+    rows = conn.execute(
+        "SELECT * FROM verification_results WHERE verification_id IN (SELECT value FROM json_each(?))",
+        (json.dumps(list(verification_ids)),)
+    ).fetchall()
+    return {(row['verification_id'], row['position']): row for row in rows}
+
+def get_verification_summaries(verification_ids):
+    """Data, profilo, esito e dispositivo/cliente di un elenco di verifiche, come dizionari indicizzati per id."""
+    conn = get_db_connection()
+    rows = conn.execute("""
+        SELECT v.id, v.verification_date, v.profile_name, v.overall_status,
+               d.serial_number, d.description, c.name AS customer_name
         FROM verifications v
-        JOIN devices d ON v.device_id = d.id
-        JOIN customers c ON d.customer_id = c.id
-        WHERE v.verification_date = ?
+        JOIN devices d ON d.id = v.device_id
+        JOIN customers c ON c.id = d.customer_id
+        WHERE v.id IN (SELECT value FROM json_each(?))
+    """, (json.dumps(list(verification_ids)),)).fetchall()
+    return {row['id']: dict(row) for row in rows}
+
+# Query che unisce tutte le tabelle per l'esportazione delle verifiche
+_EXPORT_QUERY = """
+    SELECT 
+        c.id as customer_id, c.name as customer_name, c.address as customer_address,
+        d.id as device_id, d.serial_number, d.description, d.manufacturer, d.model, d.applied_parts_json, d.customer_inventory, d.ams_inventory, d.verification_interval,
+        v.id as verification_id, v.verification_date, v.profile_name, v.results_json, v.overall_status, v.visual_inspection_json, v.mti_instrument, v.mti_serial, v.mti_version, v.mti_cal_date, v.technician_name
+    FROM verifications v
+    JOIN devices d ON v.device_id = d.id
+    JOIN customers c ON d.customer_id = c.id
+"""
+
+def _verification_package_from_row(row):
+    """Costruisce il pacchetto di esportazione (formato .stm 1.0) di una verifica."""
+    return {
+        "customer": {
+            "name": row["customer_name"],
+            "address": row["customer_address"]
+        },
+        "device": {
+            "serial_number": row["serial_number"],
+            "description": row["description"],
+            "manufacturer": row["manufacturer"],
+            "model": row["model"],
+            "applied_parts_json": row["applied_parts_json"],
+            "customer_inventory": row["customer_inventory"],
+            "ams_inventory": row["ams_inventory"],
+            "verification_interval": row["verification_interval"]
+        },
+        "verification_details": {
+            "verification_date": row["verification_date"],
+            "profile_name": row["profile_name"],
+            "results_json": row["results_json"],
+            "overall_status": row["overall_status"],
+            "visual_inspection_json": row["visual_inspection_json"],
+            "technician_name": row["technician_name"],
+            "mti_info": {
+                "instrument": row["mti_instrument"],
+                "serial": row["mti_serial"],
+                "version": row["mti_version"],
+                "cal_date": row["mti_cal_date"]
+            }
+        }
+    }
+
+def iter_verification_packages(date_from, date_to=None, customer_id=None, fetch_size=500):
     """
-    rows = conn.execute(query, (target_date,)).fetchall()
-    conn.close()
+    Itera le verifiche comprese tra date_from e date_to (incluse; solo date_from se
+    date_to è None), opzionalmente per un solo cliente, restituendo un pacchetto di
+    esportazione alla volta senza materializzare l'intero risultato.
+    """
+    conn = get_db_connection()
+    query = _EXPORT_QUERY + " WHERE v.verification_date BETWEEN ? AND ?"
+    params = [date_from, date_to or date_from]
+    if customer_id is not None:
+        query += " AND c.id = ?"
+        params.append(customer_id)
+    # Nessun ORDER BY: un ordinamento richiederebbe di materializzare tutte le righe in un B-tree temporaneo
+    cursor = conn.execute(query, params)
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        for row in rows:
+            yield _verification_package_from_row(row)
 
-    export_structure = {
+def get_full_verification_data_for_date(target_date):
+    """
+    Recupera tutte le verifiche di una data specifica, complete di dati
+    di dispositivo e cliente, e le struttura in un dizionario per l'export.
+    Per esportazioni grandi usare iter_verification_packages, che non carica tutto in memoria.
+    """
+    return {
         "export_format_version": "1.0",
         "export_creation_date": datetime.now().isoformat(),
         "verifications_for_date": target_date,
-        "verifications": []
+        "verifications": list(iter_verification_packages(target_date))
     }
 
-    for row in rows:
-        verification_package = {
-            "customer": {
-                "name": row["customer_name"],
-                "address": row["customer_address"]
-            },
-            "device": {
-                "serial_number": row["serial_number"],
-                "description": row["description"],
-                "manufacturer": row["manufacturer"],
-                "model": row["model"],
-                "applied_parts_json": row["applied_parts_json"],
-                "customer_inventory": row["customer_inventory"],
-                "ams_inventory": row["ams_inventory"]
-            },
-            "verification_details": {
-                "verification_date": row["verification_date"],
-                "profile_name": row["profile_name"],
-                "results_json": row["results_json"],
-                "overall_status": row["overall_status"],
-                "visual_inspection_json": row["visual_inspection_json"],
-                "mti_info": {
-                    "instrument": row["mti_instrument"],
-                    "serial": row["mti_serial"],
-                    "version": row["mti_version"],
-                    "cal_date": row["mti_cal_date"]
-                }
-            }
-        }
-        export_structure["verifications"].append(verification_package)
-    
-    return export_structure
+def get_report_rows(date_from=None, date_to=None, customer_id=None, device_ids=None):
+    """
+    Recupera con un'unica query le verifiche per cui generare i report, complete dei
+    dati di dispositivo e cliente (stesse colonne dell'esportazione .stm).
+    Filtri opzionali e combinabili: intervallo di date (date_to assente = solo date_from),
+    cliente ed elenco di dispositivi. Restituisce dizionari, serializzabili con pickle
+    per i processi che generano i PDF.
+    """
+    conditions, params = [], []
+    if date_from is not None:
+        conditions.append("v.verification_date BETWEEN ? AND ?")
+        params += [date_from, date_to or date_from]
+    if customer_id is not None:
+        conditions.append("c.id = ?")
+        params.append(customer_id)
+    if device_ids is not None:
+        # Un solo parametro JSON invece di una clausola IN con migliaia di segnaposto
+        conditions.append("v.device_id IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(list(device_ids)))
+    query = _EXPORT_QUERY
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    conn = get_db_connection()
+    return [dict(row) for row in conn.execute(query, params)]
+
 def get_device_count_for_customer(customer_id):
     """Conta quanti dispositivi sono associati a un cliente."""
     conn = get_db_connection()
@@ -440,31 +962,23 @@ def get_device_count_for_customer(customer_id):
     except Exception as e:
         logging.error(f"Impossibile contare i dispositivi per il cliente ID {customer_id}", exc_info=True)
         return 0
-    finally:
-        conn.close()
 
 def delete_all_devices_for_customer(customer_id):
     """Elimina TUTTI i dispositivi (e a cascata le loro verifiche) per un dato cliente."""
-    conn = get_db_connection()
     try:
-        # Grazie a "ON DELETE CASCADE", eliminando i dispositivi vengono eliminate anche le verifiche
-        cursor = conn.execute("DELETE FROM devices WHERE customer_id = ?", (customer_id,))
-        conn.commit()
+        with transaction() as conn:
+            # Grazie a "ON DELETE CASCADE", eliminando i dispositivi vengono eliminate anche le verifiche
+            cursor = conn.execute("DELETE FROM devices WHERE customer_id = ?", (customer_id,))
         logging.warning(f"Eliminati {cursor.rowcount} dispositivi per il cliente ID {customer_id}.")
         return True
     except Exception as e:
         logging.error(f"Errore durante l'eliminazione massiva dei dispositivi per il cliente ID {customer_id}", exc_info=True)
-        conn.rollback()
         return False
-    finally:
-        conn.close()
         
 def get_device_by_serial(serial_number):
     """Restituisce i dati di un dispositivo cercando per matricola, o None se non esiste."""
     conn = get_db_connection()
-    device = conn.execute("SELECT * FROM devices WHERE serial_number = ?", (serial_number,)).fetchone()
-    conn.close()
-    return device
+    return conn.execute("SELECT * FROM devices WHERE serial_number = ?", (serial_number,)).fetchone()
 
 def verification_exists(device_id, verification_date, profile_name):
     """Verifica se una verifica specifica esiste già per un dato dispositivo."""
@@ -473,52 +987,163 @@ def verification_exists(device_id, verification_date, profile_name):
         "SELECT id FROM verifications WHERE device_id = ? AND verification_date = ? AND profile_name = ?",
         (device_id, verification_date, profile_name)
     ).fetchone()
-    conn.close()
     return verif is not None
 
-def update_device_next_verification_date(device_id, interval_months):
-    """Calcola e aggiorna la data della prossima verifica per un dispositivo."""
-    if not device_id or not interval_months:
-        return
-    try:
-        # Calcola la data futura. Semplice approssimazione, si può usare dateutil per maggiore precisione.
-        from datetime import date
-        from dateutil.relativedelta import relativedelta # Richiede: pip install python-dateutil
-        
-        next_date = date.today() + relativedelta(months=int(interval_months))
-        next_date_str = next_date.strftime('%Y-%m-%d')
-        
+# --- Funzioni per le importazioni in blocco ---
+# Da usare all'interno di transaction(): le mappe identità vengono caricate una volta
+# e i nuovi record scritti con executemany.
+
+# Numero massimo di parametri per le query "IN (...)" suddivise a blocchi
+_IN_CHUNK_SIZE = 500
+
+def _select_in_chunks(query_template, values):
+    """Esegue una SELECT con clausola IN (...) suddividendo i valori in blocchi."""
+    conn = get_db_connection()
+    values = list(values)
+    for start in range(0, len(values), _IN_CHUNK_SIZE):
+        chunk = values[start:start + _IN_CHUNK_SIZE]
+        placeholders = ", ".join("?" * len(chunk))
+        yield from conn.execute(query_template.format(placeholders=placeholders), chunk)
+
+def get_customer_ids_by_name(names=None):
+    """Mappa nome cliente -> id, per tutti i clienti o solo per i nomi indicati."""
+    if names is None:
         conn = get_db_connection()
-        conn.execute("UPDATE devices SET next_verification_date = ? WHERE id = ?", (next_date_str, device_id))
-        conn.commit()
-        conn.close()
-        logging.info(f"Data prossima verifica per dispositivo ID {device_id} impostata a {next_date_str}")
-    except Exception as e:
-        logging.error(f"Impossibile aggiornare la data di prossima verifica per il dispositivo ID {device_id}", exc_info=True)
+        return {row['name']: row['id'] for row in conn.execute("SELECT id, name FROM customers")}
+    return {row['name']: row['id'] for row in _select_in_chunks("SELECT id, name FROM customers WHERE name IN ({placeholders})", names)}
+
+def get_device_ids_by_serial(serials=None):
+    """Mappa matricola -> id dispositivo, per tutti i dispositivi o solo per le matricole indicate."""
+    if serials is None:
+        conn = get_db_connection()
+        return {row['serial_number']: row['id'] for row in conn.execute("SELECT id, serial_number FROM devices WHERE serial_number IS NOT NULL")}
+    return {row['serial_number']: row['id'] for row in _select_in_chunks("SELECT id, serial_number FROM devices WHERE serial_number IN ({placeholders})", serials)}
+
+def get_verification_keys():
+    """Insieme delle chiavi (device_id, verification_date, profile_name) di tutte le verifiche salvate."""
+    conn = get_db_connection()
+    return {tuple(row) for row in conn.execute("SELECT device_id, verification_date, profile_name FROM verifications")}
+
+def add_customers_bulk(customers):
+    """Inserisce più clienti; `customers` è una sequenza di tuple (name, address)."""
+    with transaction() as conn:
+        conn.executemany("INSERT INTO customers (name, address) VALUES (?, ?)", customers)
+
+def add_verifications_bulk(verifications):
+    """
+    Inserisce più verifiche con un'unica executemany. Ogni tupla contiene, nell'ordine:
+    device_id, verification_date, profile_name, results_json, overall_status,
+    visual_inspection_json, mti_instrument, mti_serial, mti_version, mti_cal_date, technician_name.
+    """
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO verifications (device_id, verification_date, profile_name, results_json, overall_status, visual_inspection_json, mti_instrument, mti_serial, mti_version, mti_cal_date, technician_name) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            verifications
+        )
+
+# Ricalcolo della prossima verifica: data dell'ultima verifica + verification_interval mesi.
+# Come relativedelta, se il giorno non esiste nel mese di arrivo si usa l'ultimo giorno del mese
+# (31/01 + 1 mese = 29/02, non 02/03 come farebbe date() di SQLite da solo).
+# I dispositivi con intervallo ma mai verificati vanno verificati subito: se non hanno
+# già una data, ricevono quella odierna. Quelli senza intervallo non vengono toccati.
+# Richiede UPDATE ... FROM (SQLite 3.33 o successivo).
+_NEXT_VERIFICATION_UPDATE = """
+    UPDATE devices SET next_verification_date = s.next_date
+    FROM (
+        SELECT id, CASE
+            WHEN last_date IS NULL THEN COALESCE(current_date_value, date('now', 'localtime'))
+            WHEN strftime('%d', date(last_date, '+' || months || ' months')) = strftime('%d', last_date)
+                THEN date(last_date, '+' || months || ' months')
+            ELSE date(last_date, 'start of month', '+' || (months + 1) || ' months', '-1 day')
+        END AS next_date
+        FROM (
+            SELECT d.id, d.next_verification_date AS current_date_value,
+                CAST(d.verification_interval AS INTEGER) AS months, l.last_date
+            FROM devices d
+            LEFT JOIN (
+                SELECT device_id, MAX(verification_date) AS last_date FROM verifications
+                {verification_filter} GROUP BY device_id
+            ) l ON l.device_id = d.id
+            WHERE CAST(d.verification_interval AS INTEGER) > 0 {device_filter}
+        )
+    ) s
+    WHERE devices.id = s.id AND s.next_date IS NOT NULL AND devices.next_verification_date IS NOT s.next_date
+"""
+
+def recompute_next_verification_dates(device_ids=None):
+    """
+    Ricalcola in SQL la data della prossima verifica, per tutti i dispositivi (device_ids=None)
+    oppure solo per quelli indicati. Aggiorna solo le righe la cui data cambia e ne
+    restituisce il numero.
+    """
+    with transaction() as conn:
+        if device_ids is None:
+            return conn.execute(_NEXT_VERIFICATION_UPDATE.format(verification_filter="", device_filter="")).rowcount
+        device_ids = list(device_ids)
+        updated = 0
+        for start in range(0, len(device_ids), _IN_CHUNK_SIZE):
+            chunk = device_ids[start:start + _IN_CHUNK_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+            query = _NEXT_VERIFICATION_UPDATE.format(
+                verification_filter=f"WHERE device_id IN ({placeholders})",
+                device_filter=f"AND d.id IN ({placeholders})")
+            updated += conn.execute(query, chunk + chunk).rowcount
+        return updated
 
 
-def get_devices_needing_verification(days_in_future=30):
-    """Recupera i dispositivi con verifica scaduta o in scadenza."""
+# Orizzonte predefinito (giorni) per le verifiche in scadenza mostrate nella dashboard
+DUE_VERIFICATION_HORIZON_DAYS = 30
+
+def _due_date_limit(days_in_future):
     from datetime import date, timedelta
-    
-    today = date.today()
-    future_date = today + timedelta(days=days_in_future)
-    
+    return (date.today() + timedelta(days=days_in_future)).strftime('%Y-%m-%d')
+
+def get_devices_needing_verification(days_in_future=DUE_VERIFICATION_HORIZON_DAYS, limit=None, offset=0, group_by_customer=False):
+    """
+    Recupera i dispositivi con verifica scaduta o in scadenza entro `days_in_future` giorni.
+    Ordinati per data di scadenza oppure, con group_by_customer=True, per cliente e poi per
+    data (entrambi gli ordinamenti usano un indice). limit/offset permettono di leggerli a pagine.
+    """
     conn = get_db_connection()
     # Seleziona i dispositivi la cui prossima verifica è nel passato o entro i prossimi X giorni
-    query = """
-        SELECT d.*, c.name as customer_name FROM devices d
-        JOIN customers c ON d.customer_id = c.id
-        WHERE d.next_verification_date IS NOT NULL AND d.next_verification_date <= ?
-        ORDER BY d.next_verification_date ASC
+    if group_by_customer:
+        query = """
+            SELECT d.*, c.name as customer_name FROM customers c
+            JOIN devices d ON d.customer_id = c.id
+            WHERE d.next_verification_date IS NOT NULL AND d.next_verification_date <= ?
+            ORDER BY c.name, d.next_verification_date, d.id
+        """
+    else:
+        query = """
+            SELECT d.*, c.name as customer_name FROM devices d
+            JOIN customers c ON d.customer_id = c.id
+            WHERE d.next_verification_date IS NOT NULL AND d.next_verification_date <= ?
+            ORDER BY d.next_verification_date ASC, d.id
+        """
+    query, params = _paginate(query, [_due_date_limit(days_in_future)], limit, offset)
+    return conn.execute(query, params).fetchall()
+
+def get_due_verification_summary(days_in_future=DUE_VERIFICATION_HORIZON_DAYS):
     """
-    devices = conn.execute(query, (future_date.strftime('%Y-%m-%d'),)).fetchall()
-    conn.close()
-    return devices
+    Conta, per ogni cliente, i dispositivi con verifica in scadenza entro `days_in_future`
+    giorni e quanti di questi sono già scaduti. Restituisce {customer_id: (totale, scaduti)}.
+    """
+    from datetime import date
+    conn = get_db_connection()
+    rows = conn.execute("""
+        SELECT customer_id, COUNT(*) AS due_count, COUNT(CASE WHEN next_verification_date < ? THEN 1 END) AS overdue_count
+        FROM devices
+        WHERE next_verification_date IS NOT NULL AND next_verification_date <= ?
+        GROUP BY customer_id
+    """, (date.today().strftime('%Y-%m-%d'), _due_date_limit(days_in_future))).fetchall()
+    return {row['customer_id']: (row['due_count'], row['overdue_count']) for row in rows}
 
 
 def save_verification(device_id, profile_name, results, overall_status, visual_inspection_data, mti_info, technician_name, verification_date=None):
-    """Salva una nuova verifica nel database, includendo il nome del tecnico."""
+    """
+    Salva una nuova verifica nel database, includendo il nome del tecnico.
+    Restituisce l'id della verifica salvata, o None in caso di errore.
+    """
     if verification_date is None:
         verification_date = datetime.now().strftime('%Y-%m-%d')
 
@@ -526,88 +1151,74 @@ def save_verification(device_id, profile_name, results, overall_status, visual_i
     visual_json = json.dumps(visual_inspection_data)
     mti_data = mti_info if isinstance(mti_info, dict) else {}
 
-    conn = get_db_connection()
     try:
-        conn.execute(
-            # La lista delle colonne (11 totali)
-            "INSERT INTO verifications (device_id, verification_date, profile_name, results_json, overall_status, visual_inspection_json, mti_instrument, mti_serial, mti_version, mti_cal_date, technician_name) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            # La tupla di valori (deve avere 11 elementi corrispondenti)
-            (
-                device_id, 
-                verification_date, 
-                profile_name, 
-                results_json, 
-                overall_status, 
-                visual_json, 
-                mti_data.get('instrument'), 
-                mti_data.get('serial'), 
-                mti_data.get('version'), 
-                mti_data.get('cal_date'),
-                technician_name # <-- VALORE CHE PROBABILMENTE MANCAVA
+        with transaction() as conn:
+            cursor = conn.execute(
+                # La lista delle colonne (11 totali)
+                "INSERT INTO verifications (device_id, verification_date, profile_name, results_json, overall_status, visual_inspection_json, mti_instrument, mti_serial, mti_version, mti_cal_date, technician_name) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                # La tupla di valori (deve avere 11 elementi corrispondenti)
+                (
+                    device_id, 
+                    verification_date, 
+                    profile_name, 
+                    results_json, 
+                    overall_status, 
+                    visual_json, 
+                    mti_data.get('instrument'), 
+                    mti_data.get('serial'), 
+                    mti_data.get('version'), 
+                    mti_data.get('cal_date'),
+                    technician_name # <-- VALORE CHE PROBABILMENTE MANCAVA
+                )
             )
-        )
-        conn.commit()
+            # Nella stessa transazione: la scadenza segue sempre l'ultima verifica salvata
+            recompute_next_verification_dates([device_id])
         logging.info(f"Verifica del {verification_date} salvata con successo per il dispositivo ID: {device_id}")
+        return cursor.lastrowid
     except Exception as e:
         logging.error(f"Errore durante il salvataggio della verifica per il dispositivo ID {device_id}", exc_info=True)
-        conn.rollback()
-    finally:
-        conn.close()
+        return None
 
 def get_all_instruments():
     """Recupera tutti gli strumenti di misura dal database."""
     conn = get_db_connection()
-    instruments = conn.execute("SELECT * FROM mti_instruments ORDER BY instrument_name").fetchall()
-    conn.close()
-    return instruments
+    return conn.execute("SELECT * FROM mti_instruments ORDER BY instrument_name").fetchall()
 
 def add_instrument(name, serial, version, cal_date):
     """Aggiunge un nuovo strumento."""
-    conn = get_db_connection()
-    conn.execute(
-        "INSERT INTO mti_instruments (instrument_name, serial_number, fw_version, calibration_date) VALUES (?, ?, ?, ?)",
-        (name, serial, version, cal_date)
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO mti_instruments (instrument_name, serial_number, fw_version, calibration_date) VALUES (?, ?, ?, ?)",
+            (name, serial, version, cal_date)
+        )
 
 def update_instrument(instrument_id, name, serial, version, cal_date):
     """Aggiorna uno strumento esistente."""
-    conn = get_db_connection()
-    conn.execute(
-        "UPDATE mti_instruments SET instrument_name=?, serial_number=?, fw_version=?, calibration_date=? WHERE id=?",
-        (name, serial, version, cal_date, instrument_id)
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE mti_instruments SET instrument_name=?, serial_number=?, fw_version=?, calibration_date=? WHERE id=?",
+            (name, serial, version, cal_date, instrument_id)
+        )
 
 def delete_instrument(instrument_id):
     """Elimina uno strumento."""
-    conn = get_db_connection()
-    conn.execute("DELETE FROM mti_instruments WHERE id = ?", (instrument_id,))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("DELETE FROM mti_instruments WHERE id = ?", (instrument_id,))
 
 def set_default_instrument(instrument_id):
     """Imposta uno strumento come predefinito."""
-    conn = get_db_connection()
     try:
-        # Resetta tutti gli altri strumenti a non-predefinito
-        conn.execute("UPDATE mti_instruments SET is_default = 0")
-        # Imposta il nuovo strumento come predefinito
-        conn.execute("UPDATE mti_instruments SET is_default = 1 WHERE id = ?", (instrument_id,))
-        conn.commit()
+        with transaction() as conn:
+            # Resetta tutti gli altri strumenti a non-predefinito
+            conn.execute("UPDATE mti_instruments SET is_default = 0")
+            # Imposta il nuovo strumento come predefinito
+            conn.execute("UPDATE mti_instruments SET is_default = 1 WHERE id = ?", (instrument_id,))
     except Exception as e:
         logging.error("Errore nell'impostare lo strumento predefinito.", exc_info=True)
-        conn.rollback()
-    finally:
-        conn.close()
 
 def get_customer_by_id(customer_id):
     conn = get_db_connection()
-    customer = conn.execute("SELECT * FROM customers WHERE id = ?", (customer_id,)).fetchone()
-    conn.close()
-    return customer
+    return conn.execute("SELECT * FROM customers WHERE id = ?", (customer_id,)).fetchone()
 
 def search_device_globally(search_term):
     """
@@ -620,7 +1231,4 @@ def search_device_globally(search_term):
         "SELECT * FROM devices WHERE serial_number = ? OR ams_inventory = ?",
         (search_term, search_term)
     ).fetchone()
-    conn.close()
     return device
-
-migrate_database()
\ No newline at end of file
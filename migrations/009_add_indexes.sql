@@ -0,0 +1,12 @@
+-- Versione 9: Indici per le query più frequenti (dashboard, importazioni, storico verifiche)
+-- Dispositivi di un cliente, già ordinati per descrizione
+CREATE INDEX IF NOT EXISTS idx_devices_customer_description ON devices (customer_id, description);
+-- Scadenze e ricerca rapida per inventario AMS
+CREATE INDEX IF NOT EXISTS idx_devices_next_verification_date ON devices (next_verification_date);
+CREATE INDEX IF NOT EXISTS idx_devices_ams_inventory ON devices (ams_inventory);
+
+-- Storico per dispositivo ordinato per data, controllo duplicati (device_id, data, profilo)
+-- e ricerca delle verifiche collegate per ON DELETE CASCADE
+CREATE INDEX IF NOT EXISTS idx_verifications_device_date_profile ON verifications (device_id, verification_date, profile_name);
+-- Esportazioni per data o intervallo di date e data dell'ultima verifica
+CREATE INDEX IF NOT EXISTS idx_verifications_date ON verifications (verification_date);
\ No newline at end of file
@@ -0,0 +1,51 @@
+-- Versione 10: Indice di ricerca full-text (FTS5) su dispositivi e clienti
+-- Sostituisce le ricerche LIKE '%...%' che non possono usare alcun indice.
+-- Il rowid di ogni riga FTS coincide con l'id del dispositivo / cliente.
+CREATE VIRTUAL TABLE IF NOT EXISTS devices_fts USING fts5(
+    description, serial_number, model, manufacturer, customer_inventory, ams_inventory, customer_name,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS customers_fts USING fts5(
+    name,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+-- Popolamento iniziale con i dati esistenti
+INSERT INTO devices_fts (rowid, description, serial_number, model, manufacturer, customer_inventory, ams_inventory, customer_name)
+    SELECT d.id, d.description, d.serial_number, d.model, d.manufacturer, d.customer_inventory, d.ams_inventory, c.name
+    FROM devices d LEFT JOIN customers c ON c.id = d.customer_id;
+INSERT INTO customers_fts (rowid, name) SELECT id, name FROM customers;
+
+-- Pertinenza (colonna 'rank'): matricola e inventari pesano più della descrizione
+INSERT INTO devices_fts (devices_fts, rank) VALUES ('rank', 'bm25(1.0, 10.0, 2.0, 2.0, 5.0, 5.0, 1.0)');
+
+-- Sincronizzazione automatica: dispositivi
+CREATE TRIGGER IF NOT EXISTS devices_fts_insert AFTER INSERT ON devices BEGIN
+    INSERT INTO devices_fts (rowid, description, serial_number, model, manufacturer, customer_inventory, ams_inventory, customer_name)
+    VALUES (new.id, new.description, new.serial_number, new.model, new.manufacturer, new.customer_inventory, new.ams_inventory,
+            (SELECT name FROM customers WHERE id = new.customer_id));
+END;
+CREATE TRIGGER IF NOT EXISTS devices_fts_delete AFTER DELETE ON devices BEGIN
+    DELETE FROM devices_fts WHERE rowid = old.id;
+END;
+-- Solo i campi indicizzati: gli aggiornamenti di scadenza non toccano l'indice
+CREATE TRIGGER IF NOT EXISTS devices_fts_update
+AFTER UPDATE OF description, serial_number, model, manufacturer, customer_inventory, ams_inventory, customer_id ON devices BEGIN
+    DELETE FROM devices_fts WHERE rowid = old.id;
+    INSERT INTO devices_fts (rowid, description, serial_number, model, manufacturer, customer_inventory, ams_inventory, customer_name)
+    VALUES (new.id, new.description, new.serial_number, new.model, new.manufacturer, new.customer_inventory, new.ams_inventory,
+            (SELECT name FROM customers WHERE id = new.customer_id));
+END;
+
+-- Sincronizzazione automatica: clienti (il nome è indicizzato anche sui loro dispositivi)
+CREATE TRIGGER IF NOT EXISTS customers_fts_insert AFTER INSERT ON customers BEGIN
+    INSERT INTO customers_fts (rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS customers_fts_delete AFTER DELETE ON customers BEGIN
+    DELETE FROM customers_fts WHERE rowid = old.id;
+END;
+CREATE TRIGGER IF NOT EXISTS customers_fts_update AFTER UPDATE OF name ON customers BEGIN
+    UPDATE customers_fts SET name = new.name WHERE rowid = old.id;
+    UPDATE devices_fts SET customer_name = new.name
+    WHERE rowid IN (SELECT id FROM devices WHERE customer_id = new.id);
+END;
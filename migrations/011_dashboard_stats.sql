@@ -0,0 +1,132 @@
+-- Versione 11: Statistiche della dashboard mantenute dai trigger
+-- Evita COUNT/MAX su tabelle intere a ogni aggiornamento della dashboard.
+-- global_stats ha sempre una sola riga (id = 1); customer_stats una riga per cliente.
+CREATE TABLE IF NOT EXISTS global_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    customer_count INTEGER NOT NULL DEFAULT 0,
+    device_count INTEGER NOT NULL DEFAULT 0,
+    verification_count INTEGER NOT NULL DEFAULT 0,
+    passed_count INTEGER NOT NULL DEFAULT 0,
+    failed_count INTEGER NOT NULL DEFAULT 0,
+    last_verification_date TEXT
+);
+CREATE TABLE IF NOT EXISTS customer_stats (
+    customer_id INTEGER PRIMARY KEY,
+    device_count INTEGER NOT NULL DEFAULT 0,
+    verification_count INTEGER NOT NULL DEFAULT 0,
+    passed_count INTEGER NOT NULL DEFAULT 0,
+    failed_count INTEGER NOT NULL DEFAULT 0,
+    last_verification_date TEXT
+);
+
+-- Popolamento iniziale con i dati esistenti
+INSERT OR REPLACE INTO global_stats (id, customer_count, device_count, verification_count, passed_count, failed_count, last_verification_date)
+SELECT 1,
+    (SELECT COUNT(*) FROM customers),
+    (SELECT COUNT(*) FROM devices),
+    (SELECT COUNT(*) FROM verifications),
+    (SELECT COUNT(*) FROM verifications WHERE overall_status = 'PASSATO'),
+    (SELECT COUNT(*) FROM verifications WHERE overall_status = 'FALLITO'),
+    (SELECT MAX(verification_date) FROM verifications);
+INSERT OR REPLACE INTO customer_stats (customer_id, device_count, verification_count, passed_count, failed_count, last_verification_date)
+SELECT c.id,
+    (SELECT COUNT(*) FROM devices d WHERE d.customer_id = c.id),
+    COUNT(v.id),
+    COUNT(CASE WHEN v.overall_status = 'PASSATO' THEN 1 END),
+    COUNT(CASE WHEN v.overall_status = 'FALLITO' THEN 1 END),
+    MAX(v.verification_date)
+FROM customers c
+LEFT JOIN devices d ON d.customer_id = c.id
+LEFT JOIN verifications v ON v.device_id = d.id
+GROUP BY c.id;
+
+-- Clienti
+CREATE TRIGGER IF NOT EXISTS stats_customer_insert AFTER INSERT ON customers BEGIN
+    INSERT OR IGNORE INTO customer_stats (customer_id) VALUES (new.id);
+    UPDATE global_stats SET customer_count = customer_count + 1 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS stats_customer_delete AFTER DELETE ON customers BEGIN
+    DELETE FROM customer_stats WHERE customer_id = old.id;
+    UPDATE global_stats SET customer_count = customer_count - 1 WHERE id = 1;
+END;
+
+-- Dispositivi
+CREATE TRIGGER IF NOT EXISTS stats_device_insert AFTER INSERT ON devices BEGIN
+    UPDATE customer_stats SET device_count = device_count + 1 WHERE customer_id = new.customer_id;
+    UPDATE global_stats SET device_count = device_count + 1 WHERE id = 1;
+END;
+-- Le verifiche vengono eliminate qui, prima del dispositivo, invece che dal ON DELETE CASCADE:
+-- così i loro trigger trovano ancora il dispositivo e sanno a quale cliente scalarle.
+CREATE TRIGGER IF NOT EXISTS stats_device_before_delete BEFORE DELETE ON devices BEGIN
+    DELETE FROM verifications WHERE device_id = old.id;
+END;
+CREATE TRIGGER IF NOT EXISTS stats_device_delete AFTER DELETE ON devices BEGIN
+    UPDATE customer_stats SET device_count = device_count - 1 WHERE customer_id = old.customer_id;
+    UPDATE global_stats SET device_count = device_count - 1 WHERE id = 1;
+END;
+-- Spostamento di un dispositivo (con le sue verifiche) a un altro cliente: operazione rara,
+-- le statistiche dei due clienti vengono ricalcolate.
+CREATE TRIGGER IF NOT EXISTS stats_device_move AFTER UPDATE OF customer_id ON devices
+WHEN old.customer_id IS NOT new.customer_id BEGIN
+    UPDATE customer_stats SET
+        device_count = (SELECT COUNT(*) FROM devices d WHERE d.customer_id = customer_stats.customer_id),
+        verification_count = (SELECT COUNT(*) FROM verifications v JOIN devices d ON d.id = v.device_id WHERE d.customer_id = customer_stats.customer_id),
+        passed_count = (SELECT COUNT(*) FROM verifications v JOIN devices d ON d.id = v.device_id WHERE d.customer_id = customer_stats.customer_id AND v.overall_status = 'PASSATO'),
+        failed_count = (SELECT COUNT(*) FROM verifications v JOIN devices d ON d.id = v.device_id WHERE d.customer_id = customer_stats.customer_id AND v.overall_status = 'FALLITO'),
+        last_verification_date = (SELECT MAX(v.verification_date) FROM verifications v JOIN devices d ON d.id = v.device_id WHERE d.customer_id = customer_stats.customer_id)
+    WHERE customer_id IN (old.customer_id, new.customer_id);
+END;
+
+-- Verifiche
+CREATE TRIGGER IF NOT EXISTS stats_verification_insert AFTER INSERT ON verifications BEGIN
+    UPDATE customer_stats SET
+        verification_count = verification_count + 1,
+        passed_count = passed_count + (new.overall_status = 'PASSATO'),
+        failed_count = failed_count + (new.overall_status = 'FALLITO'),
+        last_verification_date = MAX(COALESCE(last_verification_date, ''), new.verification_date)
+    WHERE customer_id = (SELECT customer_id FROM devices WHERE id = new.device_id);
+    UPDATE global_stats SET
+        verification_count = verification_count + 1,
+        passed_count = passed_count + (new.overall_status = 'PASSATO'),
+        failed_count = failed_count + (new.overall_status = 'FALLITO'),
+        last_verification_date = MAX(COALESCE(last_verification_date, ''), new.verification_date)
+    WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS stats_verification_delete AFTER DELETE ON verifications BEGIN
+    UPDATE customer_stats SET
+        verification_count = verification_count - 1,
+        passed_count = passed_count - (old.overall_status = 'PASSATO'),
+        failed_count = failed_count - (old.overall_status = 'FALLITO'),
+        -- L'ultima data va ricalcolata solo se è stata eliminata proprio l'ultima verifica
+        last_verification_date = CASE WHEN last_verification_date = old.verification_date THEN
+            (SELECT MAX(v.verification_date) FROM verifications v JOIN devices d ON d.id = v.device_id WHERE d.customer_id = customer_stats.customer_id)
+            ELSE last_verification_date END
+    WHERE customer_id = (SELECT customer_id FROM devices WHERE id = old.device_id);
+    UPDATE global_stats SET
+        verification_count = verification_count - 1,
+        passed_count = passed_count - (old.overall_status = 'PASSATO'),
+        failed_count = failed_count - (old.overall_status = 'FALLITO'),
+        last_verification_date = CASE WHEN last_verification_date = old.verification_date THEN
+            (SELECT MAX(verification_date) FROM verifications) ELSE last_verification_date END
+    WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS stats_verification_update AFTER UPDATE OF overall_status, verification_date, device_id ON verifications BEGIN
+    UPDATE customer_stats SET
+        verification_count = verification_count - 1,
+        passed_count = passed_count - (old.overall_status = 'PASSATO'),
+        failed_count = failed_count - (old.overall_status = 'FALLITO')
+    WHERE customer_id = (SELECT customer_id FROM devices WHERE id = old.device_id);
+    UPDATE customer_stats SET
+        verification_count = verification_count + 1,
+        passed_count = passed_count + (new.overall_status = 'PASSATO'),
+        failed_count = failed_count + (new.overall_status = 'FALLITO')
+    WHERE customer_id = (SELECT customer_id FROM devices WHERE id = new.device_id);
+    UPDATE customer_stats SET
+        last_verification_date = (SELECT MAX(v.verification_date) FROM verifications v JOIN devices d ON d.id = v.device_id WHERE d.customer_id = customer_stats.customer_id)
+    WHERE customer_id IN ((SELECT customer_id FROM devices WHERE id = old.device_id), (SELECT customer_id FROM devices WHERE id = new.device_id));
+    UPDATE global_stats SET
+        passed_count = passed_count - (old.overall_status = 'PASSATO') + (new.overall_status = 'PASSATO'),
+        failed_count = failed_count - (old.overall_status = 'FALLITO') + (new.overall_status = 'FALLITO'),
+        last_verification_date = (SELECT MAX(verification_date) FROM verifications)
+    WHERE id = 1;
+END;
@@ -0,0 +1,2 @@
+-- Versione 12: Indice per l'elenco delle verifiche in scadenza raggruppato per cliente
+CREATE INDEX IF NOT EXISTS idx_devices_customer_next_verification ON devices (customer_id, next_verification_date);
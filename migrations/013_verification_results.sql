@@ -0,0 +1,93 @@
+-- Versione 13: Risultati delle verifiche in forma normalizzata
+-- Una riga per ogni misura (test / parte applicata), con valore e limite numerici,
+-- per interrogare i risultati in SQL senza decodificare results_json in Python.
+-- results_json resta la fonte originale e continua a essere scritto e letto come prima.
+CREATE TABLE IF NOT EXISTS verification_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    verification_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    test_name TEXT,
+    parameter TEXT,
+    applied_part TEXT,
+    value REAL,
+    value_text TEXT,
+    limit_value REAL,
+    limit_text TEXT,
+    unit TEXT,
+    passed INTEGER NOT NULL,
+    FOREIGN KEY (verification_id) REFERENCES verifications (id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_verification_results_verification ON verification_results (verification_id, position);
+CREATE INDEX IF NOT EXISTS idx_verification_results_test ON verification_results (test_name, passed);
+
+-- I risultati vengono estratti da results_json dai trigger, quindi ogni percorso di scrittura
+-- (salvataggio, importazione .stm, ripristini) li mantiene allineati. L'estrazione è
+-- definita una sola volta nella vista verification_results_source, usata da entrambi.
+-- I campi strutturati (test, parameter, applied_part, unit, limit_value) sono usati se presenti;
+-- per i record meno recenti vengono ricavati dai testi "Test (parametro)", "Test - P.A.",
+-- "≤ 0.5 mA" e "N/A (misura in mA)".
+CREATE VIEW IF NOT EXISTS verification_results_source AS
+    SELECT r.verification_id, r.position, r.name,
+        COALESCE(r.test,
+            CASE WHEN instr(r.name, ' - ') > 0 THEN substr(r.name, 1, instr(r.name, ' - ') - 1)
+                 WHEN instr(r.name, ' (') > 0 THEN substr(r.name, 1, instr(r.name, ' (') - 1)
+                 ELSE r.name END) AS test_name,
+        COALESCE(r.parameter,
+            CASE WHEN instr(r.name, ' - ') = 0 AND instr(r.name, ' (') > 0 AND r.name LIKE '%)'
+                 THEN substr(r.name, instr(r.name, ' (') + 2, length(r.name) - instr(r.name, ' (') - 2) END) AS parameter,
+        COALESCE(r.applied_part,
+            CASE WHEN instr(r.name, ' - ') > 0 THEN substr(r.name, instr(r.name, ' - ') + 3) END) AS applied_part,
+        CASE WHEN typeof(r.value) IN ('integer', 'real') THEN r.value
+             WHEN r.value_number GLOB '*[0-9]*' AND r.value_number NOT GLOB '*[^0-9.+-]*' THEN CAST(r.value_number AS REAL) END AS value,
+        CAST(r.value AS TEXT) AS value_text,
+        COALESCE(r.limit_value,
+            CASE WHEN r.limit_text LIKE '≤ %' THEN CAST(
+                CASE WHEN instr(substr(r.limit_text, 3), ' ') > 0
+                     THEN substr(substr(r.limit_text, 3), 1, instr(substr(r.limit_text, 3), ' ') - 1)
+                     ELSE substr(r.limit_text, 3) END AS REAL) END) AS limit_value,
+        r.limit_text,
+        COALESCE(r.unit,
+            CASE WHEN r.limit_text LIKE '≤ %' AND instr(substr(r.limit_text, 3), ' ') > 0
+                 THEN substr(substr(r.limit_text, 3), instr(substr(r.limit_text, 3), ' ') + 1)
+                 WHEN r.limit_text LIKE 'N/A (misura in %)'
+                 THEN substr(r.limit_text, 16, length(r.limit_text) - 16) END) AS unit,
+        COALESCE(r.passed, 0) AS passed
+    FROM (
+        SELECT v.id AS verification_id,
+            j.key AS position,
+            COALESCE(json_extract(j.value, '$.name'), '') AS name,
+            json_extract(j.value, '$.test') AS test,
+            json_extract(j.value, '$.parameter') AS parameter,
+            json_extract(j.value, '$.applied_part') AS applied_part,
+            json_extract(j.value, '$.value') AS value,
+            trim(replace(CAST(json_extract(j.value, '$.value') AS TEXT), ',', '.')) AS value_number,
+            json_extract(j.value, '$.limit_value') AS limit_value,
+            json_extract(j.value, '$.limit') AS limit_text,
+            json_extract(j.value, '$.unit') AS unit,
+            json_extract(j.value, '$.passed') AS passed
+        FROM verifications v, json_each(CASE WHEN json_valid(v.results_json) THEN v.results_json ELSE '[]' END) j
+        WHERE j.type = 'object'
+    ) r;
+
+CREATE TRIGGER IF NOT EXISTS verification_results_insert AFTER INSERT ON verifications BEGIN
+    INSERT INTO verification_results (verification_id, position, name, test_name, parameter, applied_part,
+                                      value, value_text, limit_value, limit_text, unit, passed)
+    SELECT verification_id, position, name, test_name, parameter, applied_part,
+           value, value_text, limit_value, limit_text, unit, passed
+    FROM verification_results_source WHERE verification_id = new.id;
+END;
+
+-- Se i risultati di una verifica vengono riscritti, le righe normalizzate vengono rigenerate
+CREATE TRIGGER IF NOT EXISTS verification_results_update AFTER UPDATE OF results_json ON verifications BEGIN
+    DELETE FROM verification_results WHERE verification_id = new.id;
+    INSERT INTO verification_results (verification_id, position, name, test_name, parameter, applied_part,
+                                      value, value_text, limit_value, limit_text, unit, passed)
+    SELECT verification_id, position, name, test_name, parameter, applied_part,
+           value, value_text, limit_value, limit_text, unit, passed
+    FROM verification_results_source WHERE verification_id = new.id;
+END;
+
+-- Popolamento iniziale: riscrivere results_json fa scattare il trigger di aggiornamento
+-- per ogni verifica esistente, con la stessa logica di estrazione.
+UPDATE verifications SET results_json = results_json;